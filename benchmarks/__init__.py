@@ -0,0 +1 @@
+"""db 层性能基准：python -m benchmarks.run"""
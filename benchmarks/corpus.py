@@ -0,0 +1,217 @@
+"""合成测试语料生成器
+
+按固定随机种子在指定目录下生成与真实结构一致的
+  <root>/.claude/projects/<项目目录>/<session>.jsonl
+  <root>/.claude/history.jsonl
+  <root>/.codex/sessions/YYYY/MM/DD/rollout-*.jsonl
+相同参数、相同种子总是生成逐字节相同的语料。
+"""
+import json
+import os
+import random
+import uuid
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+
+@dataclass
+class CorpusSpec:
+    projects: int = 5
+    sessions_per_project: int = 10
+    messages_per_session: int = 40
+    message_chars: int = 300          # 普通消息平均长度
+    tool_noise: float = 0.3           # 每轮附带 tool_use / tool_result 的概率
+    tool_result_chars: int = 2000     # tool_result 平均长度
+    unicode_ratio: float = 0.2        # 中文 / emoji 文本比例
+    codex_sessions: int = 20
+    days: int = 365                   # 时间跨度（截止 END_TIME）
+    seed: int = 0
+
+
+SCALES = {
+    "small": CorpusSpec(projects=5, sessions_per_project=10, messages_per_session=40, codex_sessions=20),
+    "medium": CorpusSpec(projects=20, sessions_per_project=25, messages_per_session=60, codex_sessions=150),
+    "large": CorpusSpec(projects=40, sessions_per_project=50, messages_per_session=80, codex_sessions=600),
+    # 少量超长会话，用于衡量单个会话的解析耗时与内存
+    "longsession": CorpusSpec(projects=1, sessions_per_project=3, messages_per_session=20000, codex_sessions=5),
+}
+
+END_TIME = datetime(2026, 10, 1, tzinfo=timezone.utc)
+MODELS = ["claude-opus-4-1-20250805", "claude-sonnet-4-5-20250929", "claude-haiku-4-5-20251001"]
+CODEX_MODELS = ["gpt-5-codex", "gpt-5"]
+
+_WORDS = (
+    "the race condition appears when worker threads flush the buffer before lock release "
+    "refactor parser module cache invalidation latency throughput regression flaky test "
+    "database migration config endpoint handler retry timeout async queue index schema "
+    "deploy build pipeline memory leak profile optimize benchmark function class method"
+).split()
+_CJK = "数据分析会话消息搜索导出删除项目模型缓存性能优化线程文件目录时间统计界面测试修复问题".replace("", " ").split()
+_EMOJI = ["🚀", "✅", "🐛", "🔥", "📦", "⚡"]
+
+
+def _iso(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + f"{dt.microsecond // 1000:03d}Z"
+
+
+class _Gen:
+    def __init__(self, spec):
+        self.spec = spec
+        self.rng = random.Random(spec.seed)
+
+    def uuid(self):
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def text(self, chars):
+        rng = self.rng
+        n = max(8, int(rng.expovariate(1 / chars)))
+        parts = []
+        size = 0
+        while size < n:
+            if rng.random() < self.spec.unicode_ratio:
+                w = "".join(rng.choice(_CJK) for _ in range(rng.randint(2, 6)))
+                if rng.random() < 0.1:
+                    w += rng.choice(_EMOJI)
+            else:
+                w = rng.choice(_WORDS)
+            parts.append(w)
+            size += len(w) + 1
+            if rng.random() < 0.05:
+                parts.append("\n")
+        return " ".join(parts)
+
+
+def generate(root, spec=None):
+    """在 root 下生成语料，返回 {"claude_dir", "codex_dir", "files", "bytes"}"""
+    spec = spec or CorpusSpec()
+    root = Path(root)
+    claude_dir = root / ".claude"
+    codex_dir = root / ".codex"
+    projects_dir = claude_dir / "projects"
+    projects_dir.mkdir(parents=True, exist_ok=True)
+    g = _Gen(spec)
+
+    history = []
+    files = 0
+    start = END_TIME - timedelta(days=spec.days)
+    for p in range(spec.projects):
+        cwd = f"/home/dev/work/project-{p:03d}"
+        proj_dir = projects_dir / cwd.replace("/", "-")
+        proj_dir.mkdir(exist_ok=True)
+        for _ in range(spec.sessions_per_project):
+            sid = g.uuid()
+            t = start + timedelta(seconds=g.rng.uniform(0, spec.days * 86400))
+            last_t = _write_claude_session(g, proj_dir / f"{sid}.jsonl", sid, cwd, t, history)
+            os.utime(proj_dir / f"{sid}.jsonl", (last_t.timestamp(), last_t.timestamp()))
+            files += 1
+
+    history.sort(key=lambda h: h["timestamp"])
+    with open(claude_dir / "history.jsonl", "w", encoding="utf-8") as f:
+        for h in history:
+            f.write(json.dumps(h, ensure_ascii=False) + "\n")
+
+    for _ in range(spec.codex_sessions):
+        t = start + timedelta(seconds=g.rng.uniform(0, spec.days * 86400))
+        _write_codex_session(g, codex_dir / "sessions", t)
+        files += 1
+
+    total = sum(f.stat().st_size for f in root.rglob("*.jsonl"))
+    return {"claude_dir": claude_dir, "codex_dir": codex_dir, "files": files, "bytes": total,
+            "spec": asdict(spec)}
+
+
+def _write_claude_session(g, path, sid, cwd, t, history):
+    spec, rng = g.spec, g.rng
+    model = rng.choice(MODELS)
+    slug = "-".join(rng.choice(_WORDS) for _ in range(3))
+    parent = None
+    with open(path, "w", encoding="utf-8") as f:
+        def write(obj):
+            f.write(json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+        write({"type": "summary", "summary": g.text(40), "leafUuid": g.uuid()})
+        for i in range(spec.messages_per_session // 2):
+            t += timedelta(seconds=rng.uniform(5, 600))
+            text = g.text(spec.message_chars)
+            uid = g.uuid()
+            base = {"parentUuid": parent, "isSidechain": False, "userType": "external", "cwd": cwd,
+                    "sessionId": sid, "version": "2.0.14", "gitBranch": "main", "slug": slug}
+            write({**base, "type": "user", "message": {"role": "user", "content": text},
+                   "uuid": uid, "timestamp": _iso(t)})
+            if i == 0 or rng.random() < 0.5:
+                history.append({"display": text[:200], "pastedContents": {},
+                                "timestamp": int(t.timestamp() * 1000), "project": cwd, "sessionId": sid})
+            parent = uid
+
+            if rng.random() < spec.tool_noise:
+                tool_id = "toolu_" + g.uuid().replace("-", "")[:24]
+                t += timedelta(seconds=rng.uniform(1, 30))
+                uid = g.uuid()
+                write({**base, "parentUuid": parent, "type": "assistant", "message": {
+                    "id": "msg_" + uid[:8], "type": "message", "role": "assistant", "model": model,
+                    "content": [{"type": "tool_use", "id": tool_id, "name": "Bash",
+                                 "input": {"command": "pytest -q " + rng.choice(_WORDS)}}],
+                    "usage": _usage(rng)}, "uuid": uid, "timestamp": _iso(t)})
+                parent = uid
+                uid = g.uuid()
+                write({**base, "parentUuid": parent, "type": "user", "message": {"role": "user", "content": [
+                    {"type": "tool_result", "tool_use_id": tool_id,
+                     "content": g.text(spec.tool_result_chars)}]},
+                       "uuid": uid, "timestamp": _iso(t)})
+                parent = uid
+
+            t += timedelta(seconds=rng.uniform(2, 120))
+            uid = g.uuid()
+            write({**base, "parentUuid": parent, "type": "assistant", "message": {
+                "id": "msg_" + uid[:8], "type": "message", "role": "assistant", "model": model,
+                "content": [{"type": "text", "text": g.text(spec.message_chars * 2)}],
+                "usage": _usage(rng)}, "uuid": uid, "timestamp": _iso(t)})
+            parent = uid
+    return t
+
+
+def _usage(rng):
+    return {
+        "input_tokens": rng.randint(1, 5000),
+        "output_tokens": rng.randint(10, 3000),
+        "cache_creation_input_tokens": rng.randint(0, 20000),
+        "cache_read_input_tokens": rng.randint(0, 100000),
+    }
+
+
+def _write_codex_session(g, sessions_dir, t):
+    spec, rng = g.spec, g.rng
+    day = t  # 分区按 UTC 日期生成，保证不同时区的机器生成相同语料
+    day_dir = sessions_dir / f"{day.year:04d}" / f"{day.month:02d}" / f"{day.day:02d}"
+    day_dir.mkdir(parents=True, exist_ok=True)
+    sid = g.uuid()
+    path = day_dir / f"rollout-{day.strftime('%Y-%m-%dT%H-%M-%S')}-{sid}.jsonl"
+    cwd = f"/home/dev/work/project-{rng.randrange(max(spec.projects, 1)):03d}"
+    with open(path, "w", encoding="utf-8") as f:
+        def write(obj):
+            f.write(json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+        write({"timestamp": _iso(t), "type": "session_meta",
+               "payload": {"id": sid, "timestamp": _iso(t), "cwd": cwd, "originator": "codex_cli_rs"}})
+        write({"timestamp": _iso(t), "type": "turn_context",
+               "payload": {"cwd": cwd, "model": rng.choice(CODEX_MODELS), "approval_policy": "on-request"}})
+        for _ in range(spec.messages_per_session // 2):
+            t += timedelta(seconds=rng.uniform(5, 600))
+            write({"timestamp": _iso(t), "type": "event_msg",
+                   "payload": {"type": "user_message", "message": g.text(spec.message_chars)}})
+            if rng.random() < spec.tool_noise:
+                write({"timestamp": _iso(t), "type": "response_item",
+                       "payload": {"type": "function_call_output", "call_id": "call_" + sid[:8],
+                                   "output": g.text(spec.tool_result_chars)}})
+            t += timedelta(seconds=rng.uniform(2, 120))
+            write({"timestamp": _iso(t), "type": "event_msg",
+                   "payload": {"type": "agent_message", "message": g.text(spec.message_chars * 2)}})
+            write({"timestamp": _iso(t), "type": "event_msg", "payload": {"type": "token_count", "info": {
+                "last_token_usage": {
+                    "input_tokens": rng.randint(100, 20000),
+                    "cached_input_tokens": rng.randint(0, 15000),
+                    "output_tokens": rng.randint(10, 3000),
+                    "reasoning_output_tokens": rng.randint(0, 2000),
+                }}}})
+    os.utime(path, (t.timestamp(), t.timestamp()))
@@ -0,0 +1,199 @@
+"""db 层基准测试
+
+    python -m benchmarks.run                        # 默认 small,medium 两档，与 baseline 对比
+    python -m benchmarks.run --scales large -r 5
+    python -m benchmarks.run --save-baseline        # 把本次结果保存为基准
+
+每个规模先用 benchmarks.corpus 生成语料，再在独立子进程中运行各项操作
+（通过 CLAUDE_CONFIG_DIR / CODEX_HOME / CLAUDE_CHAT_CACHE_DIR 指向临时目录），
+保证模块级缓存互不干扰。报告墙钟时间（多次取中位数）、吞吐量与峰值内存。
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+from pathlib import Path
+
+from benchmarks.corpus import SCALES, END_TIME, generate
+
+BASELINE_FILE = Path(__file__).resolve().parent / "baseline.json"
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+# ── 子进程：实际运行各项操作 ──────────────────────────────
+
+
+def _file_stats(paths):
+    size = lines = 0
+    for p in paths:
+        with open(p, "rb") as f:
+            for _ in f:
+                lines += 1
+        size += p.stat().st_size
+    return size, lines
+
+
+def _claude_files(roots):
+    return [p for root in roots for p in root.projects_dir.glob("*/*.jsonl")]
+
+
+def _operations(db, roots):
+    """返回 [(名称, 调用, 输入数据类别)]；类别用于计算吞吐量"""
+    since_30d = END_TIME - timedelta(days=30)
+    largest = max(_claude_files(roots), key=lambda p: p.stat().st_size)
+    return [
+        ("list_projects", db.list_projects, "history"),
+        ("list_sessions", db.list_sessions, "history"),
+        ("search_messages[common]", lambda: db.search_messages("race"), "claude"),
+        ("search_messages[rare]", lambda: db.search_messages("no-such-keyword-xyz"), "claude"),
+        ("get_session_detail", lambda: db.get_session_detail(largest.stem), largest),
+        ("message_index", lambda: db.message_index(largest), largest),
+        ("collect_token_stats", db.collect_token_stats, "claude"),
+        ("collect_token_stats[30d]", lambda: db.collect_token_stats(since=since_30d), "claude"),
+        ("collect_session_activity", db.collect_session_activity, "history"),
+        ("search_ranked[common]", lambda: db.search_ranked("race", limit=50), "claude"),
+        ("query_messages[selective]",
+         lambda: db.query_messages("model:opus after:2026-09-01 race"), "claude"),
+        ("list_codex_sessions", db.list_codex_sessions, "codex"),
+        ("collect_codex_token_stats", db.collect_codex_token_stats, "codex"),
+        ("collect_codex_token_stats[30d]", lambda: db.collect_codex_token_stats(since=since_30d), "codex"),
+        ("collect_codex_activity", db.collect_codex_activity, "codex"),
+    ]
+
+
+def run_worker(repeat):
+    from claude_chat import db
+    from claude_chat.config import ROOTS
+
+    # 配置了多个数据根（CLAUDE_CHAT_ROOTS）时，吞吐量按全部数据根的输入计算
+    inputs = {
+        "claude": _file_stats(_claude_files(ROOTS)),
+        "history": _file_stats([r.history_file for r in ROOTS if r.history_file.exists()]),
+        "codex": _file_stats([p for r in ROOTS for p in r.codex_sessions_dir.rglob("*.jsonl")]),
+    }
+    results = {}
+    for name, fn, kind in _operations(db, ROOTS):
+        size, lines = inputs[kind] if isinstance(kind, str) else _file_stats([kind])
+        times = []
+        for _ in range(repeat):
+            db.clear_caches()
+            t0 = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - t0)
+
+        db.clear_caches()
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        wall = statistics.median(times)
+        results[name] = {
+            "wall_s": wall,
+            "min_s": min(times),
+            "bytes": size,
+            "lines": lines,
+            "mb_s": size / 1e6 / wall if wall else 0.0,
+            "lines_s": lines / wall if wall else 0.0,
+            "peak_mb": peak / 1e6,
+        }
+    json.dump(results, sys.stdout)
+
+
+# ── 主进程：生成语料、调度子进程、输出报告 ────────────────
+
+
+def run_scale(scale, repeat, keep_dir=None):
+    spec = SCALES[scale]
+    root = Path(keep_dir) / scale if keep_dir else Path(tempfile.mkdtemp(prefix=f"claude-chat-bench-{scale}-"))
+    try:
+        if not (root / ".claude").exists():
+            t0 = time.perf_counter()
+            info = generate(root, spec)
+            print(f"[{scale}] 生成语料 {info['files']} 个文件, {info['bytes'] / 1e6:.1f} MB, "
+                  f"耗时 {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+        cache_dir = root / "cache"
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        env = dict(os.environ,
+                   CLAUDE_CONFIG_DIR=str(root / ".claude"),
+                   CODEX_HOME=str(root / ".codex"),
+                   CLAUDE_CHAT_CACHE_DIR=str(cache_dir),
+                   PYTHONPATH=os.pathsep.join(filter(None, [str(REPO_ROOT), os.environ.get("PYTHONPATH")])))
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.run", "--worker", "-r", str(repeat)],
+            env=env, cwd=REPO_ROOT, capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            sys.stderr.write(proc.stderr)
+            raise SystemExit(f"[{scale}] 基准子进程失败")
+        return json.loads(proc.stdout)
+    finally:
+        if not keep_dir:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def _fmt_delta(cur, base):
+    if not base:
+        return ""
+    pct = (cur - base) / base * 100
+    return f"{pct:+.0f}%"
+
+
+def print_report(results, baseline):
+    for scale, ops in results.items():
+        base_ops = baseline.get(scale, {})
+        print(f"\n== {scale} ==")
+        print(f"{'操作':<32}{'耗时(ms)':>10}{'MB/s':>9}{'行/s':>11}{'峰值(MB)':>10}{'对比基准':>10}")
+        for name, r in ops.items():
+            b = base_ops.get(name, {})
+            print(f"{name:<32}{r['wall_s'] * 1000:>10.1f}{r['mb_s']:>9.1f}{r['lines_s']:>11.0f}"
+                  f"{r['peak_mb']:>10.1f}{_fmt_delta(r['wall_s'], b.get('wall_s')):>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description="db 层基准测试")
+    parser.add_argument("--scales", default="small,medium", help=f"逗号分隔，可选 {','.join(SCALES)}")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="每项操作重复次数，取中位数")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="将本次结果写入 baseline")
+    parser.add_argument("--keep", metavar="DIR", help="在 DIR 下保留并复用生成的语料")
+    parser.add_argument("--json", action="store_true", help="输出 JSON 而非表格")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        run_worker(args.repeat)
+        return 0
+
+    results = {}
+    for scale in args.scales.split(","):
+        if scale not in SCALES:
+            parser.error(f"未知规模: {scale}")
+        results[scale] = run_scale(scale, args.repeat, args.keep)
+
+    baseline = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(results, baseline)
+
+    if args.save_baseline:
+        merged = {**baseline, **results}
+        args.baseline.write_text(json.dumps(merged, indent=2) + "\n", encoding="utf-8")
+        print(f"\n已保存基准: {args.baseline}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,11 @@
-import threading
 import math
 import tkinter as tk
 from collections import defaultdict, Counter
+from datetime import datetime, timedelta, timezone
 import customtkinter as ctk
-from claude_chat import db
+from claude_chat import perf, tasks, timebucket
+from claude_chat.client import backend
+from claude_chat.config import MULTI_ROOT, TIMEZONE
 
 CHART_COLORS = [
     "#3498db", "#2ecc71", "#e74c3c", "#f39c12",
@@ -19,24 +21,209 @@ def _format_tokens(n):
     return str(n)
 
 
-# ── 图表绘制 ──────────────────────────────────────────────
+# ── 时间范围与降采样 ──────────────────────────────────────
+
+RANGES = {"近 30 天": 30, "近 90 天": 90, "近 1 年": 365, "全部": None}
+MAX_BARS = 60    # 时间序列最多绘制的柱数：超过时改用更粗的分桶（周 / 月），仍超过再降采样
+TOP_ITEMS = 15   # 按项目 / 模型 / 用户分组时最多显示的项数（含「其他」）
+TOP_MODELS = 8
+MIN_BAR_PX = 6   # 每根柱子至少占的像素宽度，画布较窄时据此进一步降采样
+_UNIT_NAMES = {"day": "日", "week": "周", "month": "月"}
+
+
+def pick_unit(days, limit=MAX_BARS):
+    """跨度为 days 天的时间序列的分桶单位：日、周、月中柱数不超过 limit 的最细一级"""
+    if days <= limit:
+        return "day"
+    if days <= limit * 7:
+        return "week"
+    return "month"
+
+
+def downsample(data, limit, value=lambda item: item[1]):
+    """把多于 limit 个点的序列压缩到不超过 limit 个点
+
+    相邻的点按组划分，每组只保留数值最小和最大的两个点（保持原顺序），峰值和低谷不会被平均掉。
+    """
+    limit = max(limit, 2)
+    if len(data) <= limit:
+        return data
+    size = math.ceil(len(data) / (limit // 2))
+    result = []
+    for start in range(0, len(data), size):
+        group = data[start:start + size]
+        values = [value(item) for item in group]
+        lo = values.index(min(values))
+        hi = values.index(max(values))
+        result.extend(group[i] for i in sorted({lo, hi}))
+    return result
+
+
+def group_tail(items, limit):
+    """items 为按重要性降序排列的 (标签, 数值, ...)：超过 limit 项时保留前 limit - 1 项，其余逐列求和合并为「其他」"""
+    if len(items) <= limit:
+        return items
+    head, tail = items[:limit - 1], items[limit - 1:]
+    return head + [("其他",) + tuple(sum(col) for col in zip(*(item[1:] for item in tail)))]
+
+
+def _span(bucketer, keys, since, unit):
+    """时间序列的 (首桶, 末桶)：指定了 since 时为 since 到现在，否则为记录覆盖的范围；没有记录时为 None"""
+    if since:
+        return bucketer.key(since, unit), bucketer.key(datetime.now(timezone.utc), unit)
+    present = [k for k in keys if k is not None]
+    return (min(present), max(present)) if present else None
+
+
+def _summarize(token_records, token_days, token_buckets, activity_hours):
+    """把记录汇总为各页需要的统计；在后台线程执行，窗口只保留汇总结果，不持有记录本身"""
+    sessions = set()
+    total_tokens = 0
+    by_dim = {dim: defaultdict(lambda: [0, 0]) for dim in ("project", "model", "root")}
+    by_time = defaultdict(lambda: [0, 0])
+    bucket_sessions = defaultdict(set)
+    models = Counter()
+    for key, r in zip(token_buckets, token_records):
+        inp, out = r["input_tokens"], r["output_tokens"]
+        sessions.add(r["session_id"])
+        total_tokens += inp + out
+        models[r["model"]] += 1
+        for dim, agg in by_dim.items():
+            agg[r[dim]][0] += inp
+            agg[r[dim]][1] += out
+        if key is not None:
+            by_time[key][0] += inp
+            by_time[key][1] += out
+            bucket_sessions[key].add(r["session_id"])
+    days = set(token_days)
+    days.discard(None)
+    return {
+        "sessions": len(sessions),
+        "messages": len(token_records),
+        "total_tokens": total_tokens,
+        "active_days": len(days),
+        "project": token_records[0]["project"] if token_records else None,
+        # 维度 → [(名称, input, output)]，按合计降序
+        "tokens_by": {dim: sorted(((k, v[0], v[1]) for k, v in agg.items()), key=lambda x: x[1] + x[2], reverse=True)
+                      for dim, agg in by_dim.items()},
+        "tokens_by_time": {k: tuple(v) for k, v in by_time.items()},
+        "bucket_sessions": {k: len(v) for k, v in bucket_sessions.items()},
+        "models": models.most_common(),
+        "hours": Counter(activity_hours),
+    }
+
 
+# ── 图表绘制 ──────────────────────────────────────────────
 
-def draw_bar_chart(canvas, data, title="", bar_color="#3498db", show_values=True):
+RESIZE_DEBOUNCE_MS = 80  # 窗口缩放停止这么久之后才重绘
+_LAYERS = ("line", "rectangle", "arc", "text")  # 图元叠放顺序（自下而上）
+
+
+class Chart:
+    """画布上的一个图表
+
+    <Configure> 只绑定一次并做防抖：连续缩放时只在停下后重绘一次；数据与尺寸都没变时不重绘。
+    重绘时按类型复用已有图元，只更新坐标和变化了的选项，用不到的图元隐藏留待下次使用。
+    draw(chart, 宽, 高, *args, **kwargs) 通过 line / rectangle / text / arc 绘制。
+    """
+
+    def __init__(self, canvas, draw):
+        self.canvas = canvas
+        self._draw = draw
+        self._data = None     # (args, kwargs)
+        self._drawn = None    # 上次绘制时的 (宽, 高, 数据)
+        self._pending = None  # after 任务 id
+        self._items = {kind: [] for kind in _LAYERS}
+        self._options = {}    # 图元 id → 当前选项
+        self._used = {}
+        self._created = False
+        canvas.bind("<Configure>", lambda e: self._schedule(RESIZE_DEBOUNCE_MS))
+
+    def show(self, *args, **kwargs):
+        """设置要绘制的数据；与当前数据相同时什么也不做"""
+        data = (args, kwargs)
+        if data == self._data:
+            return
+        self._data = data
+        self._schedule(0)
+
+    def _schedule(self, delay):
+        if self._pending is not None:
+            self.canvas.after_cancel(self._pending)
+        self._pending = self.canvas.after(delay, self.render)
+
+    def render(self):
+        self._pending = None
+        if self._data is None:
+            return
+        w, h = self.canvas.winfo_width(), self.canvas.winfo_height()
+        state = (w, h, self._data)
+        if state == self._drawn:
+            return
+        self._drawn = state
+        self._used = dict.fromkeys(_LAYERS, 0)
+        self._created = False
+        args, kwargs = self._data
+        self._draw(self, w, h, *args, **kwargs)
+        for kind, items in self._items.items():
+            for item in items[self._used[kind]:]:
+                self._configure(item, {"state": "hidden"})
+        if self._created:
+            for kind in _LAYERS:
+                self.canvas.tag_raise(kind)
+
+    def _item(self, kind, coords, options):
+        options["state"] = "normal"
+        items = self._items[kind]
+        i = self._used[kind]
+        self._used[kind] = i + 1
+        if i < len(items):
+            item = items[i]
+            self.canvas.coords(item, *coords)
+            self._configure(item, options)
+            return item
+        item = getattr(self.canvas, f"create_{kind}")(*coords, tags=kind, **options)
+        items.append(item)
+        self._options[item] = options
+        self._created = True
+        return item
+
+    def _configure(self, item, options):
+        current = self._options[item]
+        changed = {k: v for k, v in options.items() if current.get(k) != v}
+        if changed:
+            self.canvas.itemconfigure(item, **changed)
+            current.update(changed)
+
+    def line(self, *coords, **options):
+        return self._item("line", coords, options)
+
+    def rectangle(self, *coords, **options):
+        return self._item("rectangle", coords, options)
+
+    def arc(self, *coords, **options):
+        return self._item("arc", coords, options)
+
+    def text(self, *coords, **options):
+        options.setdefault("angle", 0)
+        options.setdefault("anchor", "center")
+        return self._item("text", coords, options)
+
+
+@perf.timed()
+def draw_bar_chart(chart, w, h, data, title="", bar_color="#3498db", show_values=True):
     """绘制柱状图。data: [(label, value), ...]"""
-    canvas.delete("all")
-    w = canvas.winfo_width()
-    h = canvas.winfo_height()
     if w < 50 or h < 50 or not data:
         return
 
     left, right, top, bottom = 60, 20, 40, 50
     chart_w = w - left - right
     chart_h = h - top - bottom
+    data = downsample(data, chart_w // MIN_BAR_PX)
 
     if title:
-        canvas.create_text(w // 2, 16, text=title, fill="#cccccc",
-                           font=("", 12, "bold"))
+        chart.text(w // 2, 16, text=title, fill="#cccccc",
+                   font=("", 12, "bold"))
 
     max_val = max(v for _, v in data) or 1
     bar_w = max(4, chart_w // len(data) - 6)
@@ -45,12 +232,12 @@ def draw_bar_chart(canvas, data, title="", bar_color="#3498db", show_values=True
     for i in range(5):
         y = top + chart_h * i // 4
         val = max_val * (4 - i) / 4
-        canvas.create_line(left, y, w - right, y, fill="#3a3a3a")
-        canvas.create_text(left - 5, y, text=_format_tokens(int(val)),
-                           fill="#888888", anchor="e", font=("", 9))
+        chart.line(left, y, w - right, y, fill="#3a3a3a")
+        chart.text(left - 5, y, text=_format_tokens(int(val)),
+                   fill="#888888", anchor="e", font=("", 9))
 
     # 基线
-    canvas.create_line(left, top + chart_h, w - right, top + chart_h, fill="#555555")
+    chart.line(left, top + chart_h, w - right, top + chart_h, fill="#555555")
 
     for i, (label, val) in enumerate(data):
         x = left + (i + 0.5) * chart_w / len(data)
@@ -60,23 +247,21 @@ def draw_bar_chart(canvas, data, title="", bar_color="#3498db", show_values=True
         y1 = top + chart_h - bar_h
         y2 = top + chart_h
 
-        canvas.create_rectangle(x1, y1, x2, y2, fill=bar_color, outline="")
+        chart.rectangle(x1, y1, x2, y2, fill=bar_color, outline="")
 
         if show_values and val > 0:
-            canvas.create_text(x, y1 - 8, text=_format_tokens(int(val)),
-                               fill="#cccccc", font=("", 8))
+            chart.text(x, y1 - 8, text=_format_tokens(int(val)),
+                       fill="#cccccc", font=("", 8))
 
         # X 轴标签（截断过长的）
         display_label = label if len(label) <= 8 else label[:7] + ".."
-        canvas.create_text(x, top + chart_h + 12, text=display_label,
-                           fill="#aaaaaa", font=("", 8), angle=30 if len(data) > 10 else 0)
+        chart.text(x, top + chart_h + 12, text=display_label,
+                   fill="#aaaaaa", font=("", 8), angle=30 if len(data) > 10 else 0)
 
 
-def draw_stacked_bar_chart(canvas, data, legend, colors=None, title=""):
+@perf.timed()
+def draw_stacked_bar_chart(chart, w, h, data, legend, colors=None, title=""):
     """绘制堆叠柱状图。data: [(label, [val1, val2, ...]), ...]"""
-    canvas.delete("all")
-    w = canvas.winfo_width()
-    h = canvas.winfo_height()
     if w < 50 or h < 50 or not data:
         return
 
@@ -85,10 +270,11 @@ def draw_stacked_bar_chart(canvas, data, legend, colors=None, title=""):
 
     chart_w = w - left - right
     chart_h = h - top - bottom
+    data = downsample(data, chart_w // MIN_BAR_PX, value=lambda item: sum(item[1]))
 
     if title:
-        canvas.create_text(w // 2, 16, text=title, fill="#cccccc",
-                           font=("", 12, "bold"))
+        chart.text(w // 2, 16, text=title, fill="#cccccc",
+                   font=("", 12, "bold"))
 
     max_val = max(sum(vals) for _, vals in data) or 1
     bar_w = max(4, chart_w // len(data) - 6)
@@ -97,11 +283,11 @@ def draw_stacked_bar_chart(canvas, data, legend, colors=None, title=""):
     for i in range(5):
         y = top + chart_h * i // 4
         val = max_val * (4 - i) / 4
-        canvas.create_line(left, y, w - right, y, fill="#3a3a3a")
-        canvas.create_text(left - 5, y, text=_format_tokens(int(val)),
-                           fill="#888888", anchor="e", font=("", 9))
+        chart.line(left, y, w - right, y, fill="#3a3a3a")
+        chart.text(left - 5, y, text=_format_tokens(int(val)),
+                   fill="#888888", anchor="e", font=("", 9))
 
-    canvas.create_line(left, top + chart_h, w - right, top + chart_h, fill="#555555")
+    chart.line(left, top + chart_h, w - right, top + chart_h, fill="#555555")
 
     for i, (label, vals) in enumerate(data):
         x = left + (i + 0.5) * chart_w / len(data)
@@ -112,29 +298,27 @@ def draw_stacked_bar_chart(canvas, data, legend, colors=None, title=""):
         for j, v in enumerate(vals):
             seg_h = (v / max_val) * chart_h if max_val else 0
             y_top = y_bottom - seg_h
-            canvas.create_rectangle(x1, y_top, x2, y_bottom,
-                                    fill=colors[j % len(colors)], outline="")
+            chart.rectangle(x1, y_top, x2, y_bottom,
+                            fill=colors[j % len(colors)], outline="")
             y_bottom = y_top
 
         display_label = label if len(label) <= 8 else label[:7] + ".."
-        canvas.create_text(x, top + chart_h + 12, text=display_label,
-                           fill="#aaaaaa", font=("", 8), angle=30 if len(data) > 10 else 0)
+        chart.text(x, top + chart_h + 12, text=display_label,
+                   fill="#aaaaaa", font=("", 8), angle=30 if len(data) > 10 else 0)
 
     # 图例
     lx = left
     for j, name in enumerate(legend):
-        canvas.create_rectangle(lx, h - 18, lx + 12, h - 6,
-                                fill=colors[j % len(colors)], outline="")
-        canvas.create_text(lx + 16, h - 12, text=name, fill="#cccccc",
-                           anchor="w", font=("", 9))
+        chart.rectangle(lx, h - 18, lx + 12, h - 6,
+                        fill=colors[j % len(colors)], outline="")
+        chart.text(lx + 16, h - 12, text=name, fill="#cccccc",
+                   anchor="w", font=("", 9))
         lx += len(name) * 8 + 40
 
 
-def draw_pie_chart(canvas, data, colors=None, title=""):
+@perf.timed()
+def draw_pie_chart(chart, w, h, data, colors=None, title=""):
     """绘制饼图。data: [(label, value), ...]"""
-    canvas.delete("all")
-    w = canvas.winfo_width()
-    h = canvas.winfo_height()
     if w < 50 or h < 50 or not data:
         return
 
@@ -142,8 +326,8 @@ def draw_pie_chart(canvas, data, colors=None, title=""):
     total = sum(v for _, v in data) or 1
 
     if title:
-        canvas.create_text(w // 3, 16, text=title, fill="#cccccc",
-                           font=("", 12, "bold"))
+        chart.text(w // 3, 16, text=title, fill="#cccccc",
+                   font=("", 12, "bold"))
 
     # 饼图区域（左侧 2/3）
     pie_cx = w // 3
@@ -155,7 +339,7 @@ def draw_pie_chart(canvas, data, colors=None, title=""):
     start = 90  # 从 12 点方向开始
     for i, (label, val) in enumerate(data):
         extent = (val / total) * 360
-        canvas.create_arc(
+        chart.arc(
             pie_cx - radius, pie_cy - radius,
             pie_cx + radius, pie_cy + radius,
             start=start, extent=-extent,
@@ -168,12 +352,12 @@ def draw_pie_chart(canvas, data, colors=None, title=""):
     legend_y = 40
     for i, (label, val) in enumerate(data):
         pct = val / total * 100
-        canvas.create_rectangle(legend_x, legend_y, legend_x + 14, legend_y + 14,
-                                fill=colors[i % len(colors)], outline="")
+        chart.rectangle(legend_x, legend_y, legend_x + 14, legend_y + 14,
+                        fill=colors[i % len(colors)], outline="")
         display = label if len(label) <= 20 else label[:18] + ".."
-        canvas.create_text(legend_x + 20, legend_y + 7,
-                           text=f"{display}  {pct:.1f}%",
-                           fill="#cccccc", anchor="w", font=("", 10))
+        chart.text(legend_x + 20, legend_y + 7,
+                   text=f"{display}  {pct:.1f}%",
+                   fill="#cccccc", anchor="w", font=("", 10))
         legend_y += 24
 
 
@@ -181,16 +365,27 @@ def draw_pie_chart(canvas, data, colors=None, title=""):
 
 
 class AnalyticsWindow(ctk.CTkToplevel):
-    def __init__(self, master, project_dirname=None, session_id=None, source="claude"):
+    def __init__(self, master, project_dirname=None, session_id=None, source="claude", root=None):
         super().__init__(master)
         self.geometry("900x650")
         self.transient(master)
 
         self._project_dirname = project_dirname
+        self._root = root  # 项目所在的数据根名；不同数据根下可能有同名项目目录
         self._session_id = session_id
         self._source = source  # "claude" or "codex"
-        self._token_records = []
-        self._activity_records = []
+        # 记录在后台线程中按 self._bucketer 的时区分桶并汇总（见 _summarize），窗口只保留汇总结果
+        try:
+            tz = timebucket.zone(TIMEZONE)
+        except ValueError:
+            tz = None
+        self._bucketer = timebucket.Bucketer(tz)
+        self._summary = None
+        self._range = "全部"
+        self._unit = "day"
+        self._span = None  # 时间序列的 (首桶, 末桶)，没有记录时为 None
+        self._tasks = master.tasks
+        self._ui_built = False
 
         # 窗口标题
         prefix = "Codex" if source == "codex" else "Claude"
@@ -206,15 +401,23 @@ class AnalyticsWindow(ctk.CTkToplevel):
                                             font=ctk.CTkFont(size=16))
         self._loading_label.pack(expand=True)
 
-        threading.Thread(target=self._load_data, daemon=True).start()
+        self._reload()
 
-    def _load_data(self):
+    def _reload(self):
+        """按当前时间范围在后台重新加载；切换范围时取代尚未完成的加载"""
+        days = RANGES[self._range]
+        since = datetime.now(timezone.utc) - timedelta(days=days) if days else None
+        self._tasks.submit(self._load_data, since, priority=tasks.INDEXING, key=("analytics", id(self)),
+                           on_done=lambda result: self._apply(*result))
+
+    def _load_data(self, since):
+        source = backend()
         if self._source == "codex":
-            token_records = db.collect_codex_token_stats()
-            activity_records = db.collect_codex_activity()
+            token_records = source.collect_codex_token_stats(since)
+            activity_records = source.collect_codex_activity(since)
         else:
-            token_records = db.collect_token_stats()
-            activity_records = db.collect_session_activity()
+            token_records = source.collect_token_stats(since)
+            activity_records = source.collect_session_activity(since)
 
         # 按范围过滤
         if self._session_id:
@@ -224,28 +427,67 @@ class AnalyticsWindow(ctk.CTkToplevel):
                                if r["session_id"] == self._session_id]
         elif self._project_dirname:
             token_records = [r for r in token_records
-                            if r.get("project_dirname") == self._project_dirname]
+                            if r.get("project_dirname") == self._project_dirname
+                            and (self._root is None or r.get("root") == self._root)]
             project_names = {r["project"] for r in token_records}
             session_ids = {r["session_id"] for r in token_records}
             activity_records = [r for r in activity_records
                                if r["session_id"] in session_ids
                                or r.get("project") in project_names]
 
-        self._token_records = token_records
-        self._activity_records = activity_records
+        # 时间序列的分桶单位按时间跨度选择，柱数不超过 MAX_BARS
+        bucketer = self._bucketer
+        token_epochs = timebucket.epochs(token_records)
+        token_days = bucketer.buckets(token_epochs, "day")
+        unit, token_buckets = "day", token_days
+        span = _span(bucketer, token_days, since, unit)
+        if span:
+            unit = pick_unit(span[1] - span[0] + 1)
+            if unit != "day":
+                token_buckets = bucketer.buckets(token_epochs, unit)
+                span = _span(bucketer, token_buckets, since, unit)
+        activity_key = "timestamp" if self._source == "codex" else "timestamp_ms"
+        activity_hours = bucketer.hours_of_day(timebucket.epochs(activity_records, activity_key))
+
+        return _summarize(token_records, token_days, token_buckets, activity_hours), unit, span
+
+    def _apply(self, summary, unit, span):
+        if not self.winfo_exists():
+            return
+        self._summary = summary
+        self._unit = unit
+        self._span = span
 
         # 更新窗口标题（用实际项目名）
-        if self._project_dirname and token_records:
-            proj_name = token_records[0]["project"]
-            self.after(0, lambda: self.title(f"数据分析 - {proj_name}"))
+        if self._project_dirname and summary["project"]:
+            self.title(f"数据分析 - {summary['project']}")
+
+        if not self._ui_built:
+            self._build_ui()
+        self._range_status.configure(text="")
+        self._render()
 
-        self.after(0, self._build_ui)
+    def _on_range_change(self, value):
+        self._range = value
+        self._range_status.configure(text="加载中...")
+        self._reload()
 
+    @perf.timed()
     def _build_ui(self):
+        self._ui_built = True
         self._loading_label.destroy()
 
+        bar = ctk.CTkFrame(self, fg_color="transparent")
+        bar.pack(fill="x", padx=10, pady=(10, 0))
+        ctk.CTkSegmentedButton(
+            bar, values=list(RANGES), variable=ctk.StringVar(value=self._range),
+            command=self._on_range_change,
+        ).pack(side="left")
+        self._range_status = ctk.CTkLabel(bar, text="", text_color="gray60")
+        self._range_status.pack(side="left", padx=10)
+
         tabview = ctk.CTkTabview(self)
-        tabview.pack(fill="both", expand=True, padx=10, pady=10)
+        tabview.pack(fill="both", expand=True, padx=10, pady=(0, 10))
 
         self._tab_overview = tabview.add("总览")
         self._tab_tokens = tabview.add("Token 消耗")
@@ -257,6 +499,24 @@ class AnalyticsWindow(ctk.CTkToplevel):
         self._build_models()
         self._build_activity()
 
+    @perf.timed()
+    def _render(self):
+        """用当前数据更新各页（控件只在 _build_ui 中创建一次）"""
+        self._update_overview()
+        self._on_token_dim_change(self._token_dim_var.get())
+        self._update_models()
+        self._update_activity()
+
+    # ── 时间序列 ──
+
+    def _bucket_keys(self):
+        """时间序列的全部桶（含没有记录的空桶）"""
+        return range(self._span[0], self._span[1] + 1) if self._span else range(0)
+
+    def _bucket_label(self, key):
+        label = self._bucketer.label(key, self._unit)
+        return label if self._unit == "month" else label[5:]  # 日、周显示为 MM-DD
+
     # ── 总览 ──
 
     def _build_overview(self):
@@ -264,57 +524,35 @@ class AnalyticsWindow(ctk.CTkToplevel):
         tab.grid_columnconfigure((0, 1, 2, 3), weight=1)
         tab.grid_rowconfigure(1, weight=1)
 
-        # 统计数据
-        sessions = set()
-        total_msgs = len(self._token_records)
-        total_tokens = 0
-        dates = set()
-
-        for r in self._token_records:
-            sessions.add(r["session_id"])
-            total_tokens += r["input_tokens"] + r["output_tokens"]
-            ts = r["timestamp"]
-            if ts:
-                dates.add(ts[:10])
-
-        cards = [
-            ("会话数", str(len(sessions))),
-            ("消息数", str(total_msgs)),
-            ("总 Token", _format_tokens(total_tokens)),
-            ("活跃天数", str(len(dates))),
-        ]
-        for i, (title, value) in enumerate(cards):
-            self._build_stat_card(tab, title, value, 0, i)
-
-        # 按日期会话数柱状图
-        date_sessions = defaultdict(set)
-        for r in self._token_records:
-            ts = r["timestamp"]
-            if ts:
-                date_sessions[ts[:10]].add(r["session_id"])
-
-        chart_data = sorted(
-            [(d, len(sids)) for d, sids in date_sessions.items()]
-        )
-        # 只显示最近 30 天
-        chart_data = chart_data[-30:]
-        # 日期标签简化为 MM-DD
-        chart_data = [(d[5:], v) for d, v in chart_data]
+        self._card_values = [self._build_stat_card(tab, title, 0, i)
+                             for i, title in enumerate(("会话数", "消息数", "总 Token", "活跃天数"))]
 
         canvas = tk.Canvas(tab, bg="#2b2b2b", highlightthickness=0)
         canvas.grid(row=1, column=0, columnspan=4, sticky="nsew", padx=4, pady=4)
-        self._overview_canvas = canvas
-        self._overview_data = chart_data
-        canvas.bind("<Configure>", lambda e: draw_bar_chart(
-            canvas, self._overview_data, title="每日会话数（近 30 天）"))
-
-    def _build_stat_card(self, parent, title, value, row, col):
+        self._overview_chart = Chart(canvas, draw_bar_chart)
+
+    def _update_overview(self):
+        summary = self._summary
+        values = [str(summary["sessions"]), str(summary["messages"]),
+                  _format_tokens(summary["total_tokens"]), str(summary["active_days"])]
+        for label, value in zip(self._card_values, values):
+            label.configure(text=value)
+
+        # 按时间桶会话数柱状图，空桶补 0
+        bucket_sessions = summary["bucket_sessions"]
+        chart_data = [(self._bucket_label(k), bucket_sessions.get(k, 0)) for k in self._bucket_keys()]
+        self._overview_chart.show(downsample(chart_data, MAX_BARS),
+                                  title=f"每{_UNIT_NAMES[self._unit]}会话数（{self._range}）")
+
+    def _build_stat_card(self, parent, title, row, col):
+        """创建统计卡片，返回显示数值的标签"""
         card = ctk.CTkFrame(parent, corner_radius=8)
         card.grid(row=row, column=col, padx=6, pady=6, sticky="nsew")
         ctk.CTkLabel(card, text=title, font=ctk.CTkFont(size=11),
                      text_color="gray60").pack(pady=(10, 2))
-        ctk.CTkLabel(card, text=value,
-                     font=ctk.CTkFont(size=22, weight="bold")).pack(pady=(0, 10))
+        value = ctk.CTkLabel(card, text="", font=ctk.CTkFont(size=22, weight="bold"))
+        value.pack(pady=(0, 10))
+        return value
 
     # ── Token 消耗 ──
 
@@ -326,45 +564,30 @@ class AnalyticsWindow(ctk.CTkToplevel):
 
         self._token_dim_var = ctk.StringVar(value="按项目")
         seg = ctk.CTkSegmentedButton(
-            tab, values=["按项目", "按模型", "按日期"],
+            tab, values=["按项目", "按模型", "按时间"] + (["按用户"] if MULTI_ROOT else []),
             variable=self._token_dim_var,
             command=self._on_token_dim_change,
         )
         seg.grid(row=0, column=0, padx=10, pady=(8, 4), sticky="ew")
 
-        self._token_canvas = tk.Canvas(tab, bg="#2b2b2b", highlightthickness=0)
-        self._token_canvas.grid(row=1, column=0, sticky="nsew", padx=4, pady=4)
+        canvas = tk.Canvas(tab, bg="#2b2b2b", highlightthickness=0)
+        canvas.grid(row=1, column=0, sticky="nsew", padx=4, pady=4)
+        self._token_chart = Chart(canvas, draw_stacked_bar_chart)
 
         self._token_table_frame = ctk.CTkScrollableFrame(tab, height=140)
         self._token_table_frame.grid(row=2, column=0, sticky="ew", padx=4, pady=(0, 4))
 
-        self._on_token_dim_change("按项目")
-
     def _on_token_dim_change(self, dim):
-        if dim == "按项目":
-            agg = self._agg_tokens_by("project")
-        elif dim == "按模型":
-            agg = self._agg_tokens_by("model")
+        if dim == "按时间":
+            agg = downsample(self._agg_tokens_by_time(), MAX_BARS, value=lambda x: x[1] + x[2])
         else:
-            agg = self._agg_tokens_by_date()
-
-        # 限制显示前 15 项
-        agg = agg[:15]
+            key = {"按项目": "project", "按模型": "model", "按用户": "root"}[dim]
+            # 长尾合并为「其他」
+            agg = group_tail(self._summary["tokens_by"][key], TOP_ITEMS)
 
         chart_data = [(label, [inp, out]) for label, inp, out in agg]
-        self._token_chart_data = chart_data
-
-        self._token_canvas.bind("<Configure>", lambda e: draw_stacked_bar_chart(
-            self._token_canvas, self._token_chart_data,
-            legend=["Input", "Output"],
-            colors=["#3498db", "#2ecc71"],
-        ))
-        # 立即绘制一次
-        self._token_canvas.after(50, lambda: draw_stacked_bar_chart(
-            self._token_canvas, self._token_chart_data,
-            legend=["Input", "Output"],
-            colors=["#3498db", "#2ecc71"],
-        ))
+        self._token_chart.show(chart_data, legend=["Input", "Output"],
+                               colors=["#3498db", "#2ecc71"])
 
         # 更新表格
         for w in self._token_table_frame.winfo_children():
@@ -384,59 +607,32 @@ class AnalyticsWindow(ctk.CTkToplevel):
                              font=ctk.CTkFont(size=11)).grid(
                     row=i, column=j, padx=8, pady=1, sticky="w")
 
-    def _agg_tokens_by(self, key):
-        agg = defaultdict(lambda: [0, 0])
-        for r in self._token_records:
-            k = r[key]
-            agg[k][0] += r["input_tokens"]
-            agg[k][1] += r["output_tokens"]
-        result = [(k, v[0], v[1]) for k, v in agg.items()]
-        result.sort(key=lambda x: x[1] + x[2], reverse=True)
-        return result
-
-    def _agg_tokens_by_date(self):
-        agg = defaultdict(lambda: [0, 0])
-        for r in self._token_records:
-            ts = r["timestamp"]
-            if ts:
-                d = ts[:10]
-                agg[d][0] += r["input_tokens"]
-                agg[d][1] += r["output_tokens"]
-        result = [(k, v[0], v[1]) for k, v in agg.items()]
-        result.sort()
-        return result[-30:]  # 最近 30 天
+    def _agg_tokens_by_time(self):
+        agg = self._summary["tokens_by_time"]
+        return [(self._bucket_label(k), *agg.get(k, (0, 0))) for k in self._bucket_keys()]
 
     # ── 模型分布 ──
 
     def _build_models(self):
-        tab = self._tab_models
-
-        counter = Counter()
-        for r in self._token_records:
-            counter[r["model"]] += 1
-
-        chart_data = counter.most_common(8)
-        self._model_data = chart_data
-
-        canvas = tk.Canvas(tab, bg="#2b2b2b", highlightthickness=0)
+        canvas = tk.Canvas(self._tab_models, bg="#2b2b2b", highlightthickness=0)
         canvas.pack(fill="both", expand=True, padx=4, pady=4)
-        canvas.bind("<Configure>", lambda e: draw_pie_chart(
-            canvas, self._model_data, title="模型使用分布"))
+        self._model_chart = Chart(canvas, draw_pie_chart)
+
+    def _update_models(self):
+        chart_data = group_tail(self._summary["models"], TOP_MODELS)
+        self._model_chart.show(chart_data, title=f"模型使用分布（{self._range}）")
 
     # ── 活跃时段 ──
 
     def _build_activity(self):
-        tab = self._tab_activity
+        canvas = tk.Canvas(self._tab_activity, bg="#2b2b2b", highlightthickness=0)
+        canvas.pack(fill="both", expand=True, padx=4, pady=4)
+        self._activity_chart = Chart(canvas, draw_bar_chart)
 
-        counter = Counter()
-        for r in self._activity_records:
-            counter[r["hour"]] += 1
+    def _update_activity(self):
+        counter = self._summary["hours"]
 
         chart_data = [(f"{h}时", counter.get(h, 0)) for h in range(24)]
-        self._activity_data = chart_data
-
-        canvas = tk.Canvas(tab, bg="#2b2b2b", highlightthickness=0)
-        canvas.pack(fill="both", expand=True, padx=4, pady=4)
-        canvas.bind("<Configure>", lambda e: draw_bar_chart(
-            canvas, self._activity_data, title="每日活跃时段分布",
-            bar_color="#f39c12"))
+        zone = timebucket.zone_name(self._bucketer.tz)
+        self._activity_chart.show(chart_data, title=f"每日活跃时段分布（{self._range}，{zone}）",
+                                  bar_color="#f39c12")
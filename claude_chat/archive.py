@@ -0,0 +1,116 @@
+"""冷会话归档：长期未修改的会话文件压缩为 .jsonl.gz / .jsonl.xz，读取时透明解压
+
+压缩文件内容与原 .jsonl 逐字节相同，只是换了一层编码，因此所有按行解析的逻辑不变；
+消息偏移表中的偏移是解压后的偏移。归档保留原文件的 mtime，基于 mtime 的剪枝照常生效。
+"""
+import gzip
+import lzma
+import os
+import zlib
+from pathlib import Path
+
+CODECS = {"gz": gzip.open, "xz": lzma.open}
+ARCHIVE_SUFFIXES = tuple(f".jsonl.{codec}" for codec in CODECS)
+SESSION_SUFFIXES = (".jsonl",) + ARCHIVE_SUFFIXES
+
+_CHUNK = 1 << 20
+
+
+def is_session_file(name):
+    return name.endswith(SESSION_SUFFIXES)
+
+
+def is_archived(path):
+    return str(path).endswith(ARCHIVE_SUFFIXES)
+
+
+def session_id(path):
+    """会话 ID（去掉 .jsonl / .jsonl.gz / .jsonl.xz 后缀的文件名）"""
+    name = Path(path).name
+    for suffix in ARCHIVE_SUFFIXES + (".jsonl",):
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return Path(path).stem
+
+
+def plain_path(path):
+    """归档文件对应的未压缩路径"""
+    path = Path(path)
+    return path.with_name(session_id(path) + ".jsonl")
+
+
+def open_session(path, mode="rb", **kwargs):
+    """按后缀打开会话文件，压缩文件透明解压；mode 只支持读（"rb" / "rt"）"""
+    name = str(path)
+    for codec, opener in CODECS.items():
+        if name.endswith(f".jsonl.{codec}"):
+            return opener(path, mode, **kwargs)
+    return open(path, mode, **kwargs)
+
+
+def _copy(src, dst):
+    """复制数据流，返回 (字节数, crc32)"""
+    size = crc = 0
+    while True:
+        chunk = src.read(_CHUNK)
+        if not chunk:
+            return size, crc
+        dst.write(chunk)
+        size += len(chunk)
+        crc = zlib.crc32(chunk, crc)
+
+
+def _digest(fh):
+    size = crc = 0
+    while True:
+        chunk = fh.read(_CHUNK)
+        if not chunk:
+            return size, crc
+        size += len(chunk)
+        crc = zlib.crc32(chunk, crc)
+
+
+def _replace(src, dst, tmp, opener, stat, expected):
+    """用 opener 读回 tmp 校验内容后替换为 dst 并删除 src；校验失败时删除 tmp 抛出 OSError"""
+    try:
+        with opener(tmp, "rb") as fh:
+            if _digest(fh) != expected:
+                raise OSError(f"校验失败: {dst}")
+        os.utime(tmp, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(tmp, dst)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    src.unlink()
+    return dst
+
+
+def compress(path, codec="gz"):
+    """把 .jsonl 压缩为 .jsonl.<codec>，校验无误后删除原文件，返回归档路径
+
+    原文件在压缩期间被修改（mtime / size 变化）时放弃并抛出 OSError。
+    """
+    path = Path(path)
+    target = path.with_name(path.name + f".{codec}")
+    tmp = target.with_name(target.name + ".tmp")
+    opener = CODECS[codec]
+    with open(path, "rb") as src:
+        stat = os.fstat(src.fileno())
+        with opener(tmp, "wb") as dst:
+            expected = _copy(src, dst)
+    after = path.stat()
+    if (after.st_mtime_ns, after.st_size) != (stat.st_mtime_ns, stat.st_size):
+        tmp.unlink(missing_ok=True)
+        raise OSError(f"压缩期间文件被修改: {path}")
+    return _replace(path, target, tmp, opener, stat, expected)
+
+
+def decompress(path):
+    """把归档还原为 .jsonl（例如需要在 Claude Code 中继续该会话时），返回还原后的路径"""
+    path = Path(path)
+    target = plain_path(path)
+    tmp = target.with_name(target.name + ".tmp")
+    stat = path.stat()
+    with open_session(path) as src, open(tmp, "wb") as dst:
+        expected = _copy(src, dst)
+    return _replace(path, target, tmp, open, stat, expected)
@@ -0,0 +1,216 @@
+"""线程安全的单飞（single-flight）缓存
+
+同一个键同时只计算一次：第一个调用方负责计算，其余并发调用方等待它的结果（计算出错时一起收到该异常）。
+clear() 使 generation 加一：之后的调用方开始新的计算，不会加入清空前启动的计算；
+清空前启动的计算完成后，结果只返回给当时的调用方，不写入缓存，避免刷新后又缓存旧数据。
+每个缓存登记到 memory 的全局内存预算：写入时估算条目大小，超出预算时由 memory 淘汰最久未用的条目，
+spill=True 时改为溢出到磁盘，再次访问时读回。
+"""
+import threading
+from collections import OrderedDict
+
+from . import memory, perf
+
+_MISSING = object()
+
+
+class _Flight:
+    """一次进行中的计算"""
+
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class Cache:
+    """键 → 计算结果；maxsize 不为 None 时按最近使用淘汰（LRU）。name 为内存用量中显示的名称"""
+
+    def __init__(self, maxsize=None, name="cache", spill=False):
+        self.maxsize = maxsize
+        self.name = name
+        self.spill = spill
+        self.generation = 0
+        self.nbytes = 0  # 驻留内存的条目的估算大小之和
+        self._values = OrderedDict()  # 键 → 结果，最久未用的在前
+        self._sizes = {}  # 键 → 估算字节数
+        self._ticks = {}  # 键 → 最近一次访问的 memory.clock
+        self._spilled = {}  # 键 → 溢出文件路径
+        self._flights = {}
+        self._lock = threading.Lock()
+        memory.register(self)
+
+    def __len__(self):
+        return len(self._values)
+
+    def peek(self, key, default=None):
+        """只读取已缓存的结果（记为最近使用，已溢出的从磁盘读回），不触发计算，也不等待进行中的计算"""
+        with self._lock:
+            if key in self._values:
+                self._touch(key)
+                return self._values[key]
+            path = self._spilled.pop(key, None)
+            generation = self.generation
+        if path is None:
+            return default
+        value = memory.load(path, _MISSING)
+        if value is _MISSING:
+            return default
+        self.put(key, value, generation)
+        return value
+
+    def put(self, key, value, generation=None):
+        """写入结果；给出 generation 且缓存已被清空过时放弃写入，返回是否写入"""
+        size = memory.estimate(value)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self._store(key, value, size)
+        memory.enforce(keep=(self, key))
+        return True
+
+    def pop(self, key, default=None):
+        with self._lock:
+            path = self._spilled.pop(key, None)
+            if key not in self._values:
+                value = default
+            else:
+                value = self._values.pop(key)
+                self._forget(key)
+        if path is not None:
+            memory.discard(path)
+        return value
+
+    def clear(self):
+        """清空缓存（含溢出文件）并作废进行中的计算（其结果不再写入），返回新的 generation"""
+        with self._lock:
+            self.generation += 1
+            self._values.clear()
+            self._sizes.clear()
+            self._ticks.clear()
+            self.nbytes = 0
+            self._flights.clear()
+            spilled, self._spilled = self._spilled, {}
+            generation = self.generation
+        for path in spilled.values():
+            memory.discard(path)
+        return generation
+
+    def get(self, key, build):
+        """返回 key 的结果，未缓存时调用 build() 计算；并发的相同请求只计算一次"""
+        return self.get_many([key], lambda keys: [(key, build())])[key]
+
+    def get_many(self, keys, build):
+        """返回 {key: 结果}
+
+        未缓存、也没有其他线程在计算的键一次性交给 build(待计算的键列表)，它应产出 (键, 结果)，
+        便于调用方把多个键的计算合并或并行执行；其他线程正在计算的键等待其结果。
+        """
+        result = {}
+        owned = {}
+        waiting = {}
+        spilled = {}
+        with self._lock:
+            generation = self.generation
+            for key in keys:
+                if key in self._values:
+                    self._touch(key)
+                    result[key] = self._values[key]
+                    perf.count("cache_hits")
+                elif key in self._flights:
+                    waiting[key] = self._flights[key]
+                else:
+                    owned[key] = self._flights[key] = _Flight()
+                    if key in self._spilled:
+                        spilled[key] = self._spilled.pop(key)
+        # 已溢出的键从磁盘读回，读取失败的与其余未缓存的键一起交给 build
+        for key, path in spilled.items():
+            value = memory.load(path, _MISSING)
+            if value is not _MISSING:
+                self._finish(key, owned.pop(key), generation, value)
+                result[key] = value
+                perf.count("cache_hits")
+        if owned:
+            try:
+                for key, value in build(list(owned)):
+                    self._finish(key, owned.pop(key), generation, value)
+                    result[key] = value
+                if owned:
+                    raise KeyError(f"未产出的键: {list(owned)}")
+            except BaseException as e:
+                for key, flight in owned.items():
+                    self._finish(key, flight, generation, error=e)
+                raise
+        for key, flight in waiting.items():
+            result[key] = flight.wait()
+        return result
+
+    def _finish(self, key, flight, generation, value=None, error=None):
+        size = memory.estimate(value) if error is None else 0
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            stored = error is None and generation == self.generation
+            if stored:
+                self._store(key, value, size)
+        flight.value, flight.error = value, error
+        flight.done.set()
+        if stored:
+            memory.enforce(keep=(self, key))
+
+    def _store(self, key, value, size):
+        """须持有 self._lock"""
+        self.nbytes += size - self._sizes.get(key, 0)
+        self._values[key] = value
+        self._sizes[key] = size
+        self._touch(key)
+        old = self._spilled.pop(key, None)
+        if old is not None:
+            memory.discard(old)
+        if self.maxsize is not None:
+            while len(self._values) > self.maxsize:
+                evicted, _ = self._values.popitem(last=False)
+                self._forget(evicted)
+
+    def _touch(self, key):
+        self._values.move_to_end(key)
+        self._ticks[key] = next(memory.clock)
+
+    def _forget(self, key):
+        self.nbytes -= self._sizes.pop(key, 0)
+        self._ticks.pop(key, None)
+
+    # ── 供 memory 淘汰时调用 ──
+
+    def _oldest(self):
+        """(最久未用的键, 其访问时钟)，没有驻留的条目时返回 None"""
+        with self._lock:
+            for key in self._values:
+                return key, self._ticks[key]
+        return None
+
+    def _evict(self, key):
+        """从内存中移除 key：spill=True 时先写入溢出文件（写入期间条目仍可读取），否则直接丢弃"""
+        with self._lock:
+            if key not in self._values:
+                return
+            value, generation = self._values[key], self.generation
+        path = memory.spill(value) if self.spill else None
+        with self._lock:
+            # 溢出期间条目被替换、清空或已淘汰时放弃这次溢出
+            if self._values.get(key, _MISSING) is not value or generation != self.generation:
+                if path is not None:
+                    memory.discard(path)
+                return
+            del self._values[key]
+            self._forget(key)
+            if path is not None:
+                self._spilled[key] = path
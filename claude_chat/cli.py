@@ -0,0 +1,520 @@
+"""命令行入口：python -m claude_chat <命令>
+
+不导入任何 GUI 依赖，可在 cron / SSH 等无显示环境下使用。
+各子命令只在执行时才导入 db / export，保证 --help 等场景的冷启动足够快。
+"""
+import argparse
+import sys
+
+
+# ── 输出 ─────────────────────────────────────────────────
+
+
+class _Output:
+    """按 --format 输出记录。json 以流式数组写出，ndjson 每行一条，text 由调用方提供格式化函数"""
+
+    def __init__(self, fmt, stream=None):
+        self.fmt = fmt
+        self.stream = stream or sys.stdout
+        self._count = 0
+
+    def emit(self, record, text_fn=None):
+        out = self.stream
+        if self.fmt == "text":
+            out.write((text_fn(record) if text_fn else str(record)) + "\n")
+        else:
+            import json
+            data = json.dumps(record, ensure_ascii=False, default=str)
+            if self.fmt == "ndjson":
+                out.write(data + "\n")
+            else:
+                out.write(("[\n" if self._count == 0 else ",\n") + data)
+        self._count += 1
+        # 每条记录立即刷新，下游管道可以边读边处理
+        out.flush()
+
+    def close(self):
+        if self.fmt == "json":
+            self.stream.write("[]\n" if self._count == 0 else "\n]\n")
+        self.stream.flush()
+
+
+def _parse_date(value):
+    from datetime import datetime
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效日期: {value}（应为 YYYY-MM-DD 或 ISO 格式）")
+
+
+def _parse_zone(value):
+    from claude_chat.timebucket import zone
+    try:
+        return zone(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _time_range(args):
+    """从 --since / --until / --days 计算时间范围"""
+    since, until = args.since, args.until
+    if args.days:
+        from datetime import datetime, timedelta
+        since = datetime.now() - timedelta(days=args.days)
+    return since, until
+
+
+def _modified_in_range(modified, since, until):
+    """会话的 modified（本地时间 "YYYY-MM-DD HH:MM"）是否在 [since, until) 内，按分钟比较"""
+    def minute(dt):
+        return (dt.astimezone() if dt.tzinfo else dt).strftime("%Y-%m-%d %H:%M")
+    return (since is None or modified >= minute(since)) and (until is None or modified < minute(until))
+
+
+def _backend(args):
+    """查询后端：--server（默认取 CLAUDE_CHAT_SERVER）可用时为 client.Client，否则为 db 模块"""
+    from claude_chat.client import Client, backend
+    from claude_chat.config import SERVER_URL
+    url = SERVER_URL if args.server is None else args.server
+    source = backend(url)
+    if url and not isinstance(source, Client):
+        print(f"无法连接查询服务 {url}，改为直接读取", file=sys.stderr)
+    return source
+
+
+def _root_prefix(record):
+    """多数据根时文本输出前加上数据根名"""
+    from claude_chat.config import MULTI_ROOT
+    return f"[{record.get('root', '')}] " if MULTI_ROOT else ""
+
+
+# ── 子命令 ───────────────────────────────────────────────
+
+
+def cmd_list(args, out):
+    db = _backend(args)
+    since, until = _time_range(args)
+    ranged = since is not None or until is not None
+    if args.codex:
+        for s in db.list_codex_sessions(since, until):
+            if args.root and s["root"] != args.root:
+                continue
+            out.emit(s, lambda r: f"{r['modified']}  {_root_prefix(r)}{r['session_id']}  {r['title'][:60]}")
+    elif args.sessions or args.project:
+        for s in db.list_sessions(args.project, args.root):
+            if ranged and not _modified_in_range(s["modified"], since, until):
+                continue
+            out.emit(s, lambda r: f"{r['modified']}  {_root_prefix(r)}{r['session_id']}  {r['size_kb']:>8} KB"
+                                  f"{' [归档]' if r['archived'] else ''}  {r['title']}")
+    else:
+        counts = None
+        if ranged:
+            # 给出时间范围时只列出期间有会话修改过的项目，会话数也只计这些会话
+            counts = {}
+            for s in db.list_sessions(None, args.root):
+                if _modified_in_range(s["modified"], since, until):
+                    key = (s["root"], s["project_dirname"])
+                    counts[key] = counts.get(key, 0) + 1
+        for p in db.list_projects():
+            if args.root and p["root"] != args.root:
+                continue
+            if counts is not None:
+                n = counts.get((p["root"], p["dirname"]))
+                if not n:
+                    continue
+                p["session_count"] = n
+            out.emit(p, lambda r: f"{r['session_count']:>5}  {_root_prefix(r)}{r['dirname']}  {r['display_name']}")
+    return 0
+
+
+def cmd_roots(args, out):
+    from claude_chat.config import ROOTS
+    for root in ROOTS:
+        out.emit({"root": root.name, "claude_dir": root.claude_dir, "codex_dir": root.codex_dir,
+                  "cache_dir": root.cache_dir},
+                 lambda r: f"{r['root']:<20}  {r['claude_dir']}  {r['codex_dir']}")
+    return 0
+
+
+def cmd_search(args, out):
+    from claude_chat.query import parse_query, QueryError
+    if args.literal and args.top:
+        print("--top 不能与 --literal 同时使用", file=sys.stderr)
+        return 2
+    db = _backend(args)
+    if args.literal:
+        hits = db.iter_search_messages(args.query)
+    else:
+        try:
+            parse_query(args.query)
+        except QueryError as e:
+            print(f"查询语法错误: {e}", file=sys.stderr)
+            return 2
+        if args.top:
+            page = db.search_ranked(args.query, limit=args.top, offset=args.offset)
+            for hit in page["hits"]:
+                out.emit(hit, lambda r: f"{r['score']:>7.3f}  {_root_prefix(r)}{r['session_id'][:8]}  #{r['ordinal']}  "
+                                        f"[{r['role']}]  {r['snippet']}".replace("\n", " "))
+            if out.fmt == "text" and page["has_more"]:
+                print(f"... 共 {page['total']} 条，用 --offset {args.offset + args.top} 查看下一页",
+                      file=sys.stderr)
+            return 0
+        hits = db.iter_query_messages(args.query)
+    for hit in hits:
+        if not args.full:
+            hit.pop("content", None)
+        out.emit(hit, lambda r: f"{_root_prefix(r)}{r['session_id'][:8]}  [{r['role']}]  "
+                                f"{r['match_preview']}".replace("\n", " "))
+    return 0
+
+
+def _session_records(args):
+    """逐条产出会话内容，首条为元信息；找不到会话时返回 None"""
+    from itertools import chain
+    from pathlib import Path
+    from claude_chat.client import Client
+    source = _backend(args)
+    if isinstance(source, Client):
+        if args.codex:
+            return source.iter_session(path=str(Path(args.session).resolve()))
+        return source.iter_session(args.session)
+    # 通过消息偏移表逐条读取输出，超大会话也不必一次载入全部消息
+    if args.codex:
+        index = source.message_index(args.session, "codex") if Path(args.session).is_file() else None
+    else:
+        index = source.get_session_index(args.session)
+    if index is None:
+        return None
+    meta = dict(index.meta, path=str(index.path), message_count=len(index))
+    return chain([meta], (m.to_dict() for m in index.iter_messages()))
+
+
+def cmd_show(args, out):
+    records = _session_records(args)
+    if records is None:
+        print(f"未找到会话: {args.session}", file=sys.stderr)
+        return 1
+    meta = next(records)
+    if out.fmt == "text":
+        title = meta.get("slug") or meta.get("session_id", "")[:8] or args.session
+        out.stream.write(f"# {title}\n项目: {meta.get('project') or meta.get('cwd') or '未知'}  "
+                         f"模型: {meta.get('model') or '未知'}  消息: {meta['message_count']}\n\n")
+        for msg in records:
+            label = "You" if msg["role"] == "user" else "Assistant"
+            out.stream.write(f"--- {label} ---\n{msg['content']}\n\n")
+        return 0
+    # 结构化输出时逐条输出消息，首条为元信息
+    out.emit(meta)
+    for msg in records:
+        out.emit(msg)
+    return 0
+
+
+def cmd_export(args, out):
+    from claude_chat.client import Client
+    db = _backend(args)
+    if isinstance(db, Client):
+        export_session = db.export_session
+    else:
+        from claude_chat.export import export_session
+    if args.project:
+        session_ids = [s["session_id"] for s in db.list_sessions(args.project, args.root)]
+    else:
+        session_ids = args.sessions
+    if not session_ids:
+        print("没有可导出的会话", file=sys.stderr)
+        return 1
+    failed = 0
+    for sid in session_ids:
+        path = export_session(sid)
+        if path is None:
+            failed += 1
+            print(f"导出失败: {sid}", file=sys.stderr)
+            continue
+        out.emit({"session_id": sid, "path": path}, lambda r: str(r["path"]))
+    return 1 if failed else 0
+
+
+def cmd_stats(args, out):
+    from collections import defaultdict
+    from claude_chat import timebucket
+    tz = args.tz
+    if tz is None and args.by in ("hour", "date", "week", "month"):
+        from claude_chat.config import TIMEZONE
+        try:
+            tz = timebucket.zone(TIMEZONE)
+        except ValueError as e:
+            print(f"环境变量 CLAUDE_CHAT_TZ 无效: {e}", file=sys.stderr)
+            return 2
+    db = _backend(args)
+    since, until = _time_range(args)
+    if args.codex:
+        records = db.collect_codex_token_stats(since, until)
+    else:
+        records = db.collect_token_stats(since, until)
+    if args.root:
+        records = [r for r in records if r["root"] == args.root]
+
+    if args.raw:
+        for r in records:
+            out.emit(r)
+        return 0
+
+    time_keys = None
+    if args.by in ("hour", "date", "week", "month"):
+        bucketer = timebucket.Bucketer(tz)
+        time_keys = bucketer.labels(timebucket.epochs(records), "day" if args.by == "date" else args.by)
+
+    agg = defaultdict(lambda: {"messages": 0, "input_tokens": 0, "output_tokens": 0, "sessions": set()})
+    for i, r in enumerate(records):
+        if time_keys is not None:
+            key = time_keys[i]
+        elif args.by == "total":
+            key = "total"
+        else:
+            key = r.get(args.by) or "unknown"
+        a = agg[key]
+        a["messages"] += 1
+        a["input_tokens"] += r["input_tokens"]
+        a["output_tokens"] += r["output_tokens"]
+        a["sessions"].add(r["session_id"])
+
+    rows = []
+    for key, a in agg.items():
+        rows.append({
+            args.by: key,
+            "sessions": len(a["sessions"]),
+            "messages": a["messages"],
+            "input_tokens": a["input_tokens"],
+            "output_tokens": a["output_tokens"],
+            "total_tokens": a["input_tokens"] + a["output_tokens"],
+        })
+    if time_keys is not None:
+        rows.sort(key=lambda r: r[args.by])
+    else:
+        rows.sort(key=lambda r: r["total_tokens"], reverse=True)
+
+    for row in rows:
+        out.emit(row, lambda r: f"{r[args.by]:<40}  会话 {r['sessions']:>5}  消息 {r['messages']:>7}  "
+                                f"Input {r['input_tokens']:>12}  Output {r['output_tokens']:>12}")
+    return 0
+
+
+def cmd_export_stats(args, out):
+    from pathlib import Path
+    from claude_chat import usage_export
+    path = Path(args.path)
+    since, until = _time_range(args)
+    suffix = path.suffix.lower()
+    try:
+        if suffix == ".csv":
+            table = args.table or "token_usage"
+            counts = {table: usage_export.export_csv(path, table, since, until, args.append)}
+        elif suffix in usage_export.SQLITE_SUFFIXES:
+            tables = [args.table] if args.table else list(usage_export.TABLES)
+            counts = usage_export.export_sqlite(path, tables, since, until, args.append)
+        else:
+            print(f"无法识别的文件类型: {path.name}（应为 .csv 或 {' / '.join(usage_export.SQLITE_SUFFIXES)}）",
+                  file=sys.stderr)
+            return 2
+    except (OSError, ValueError) as e:
+        print(f"导出失败: {e}", file=sys.stderr)
+        return 1
+    for table, n in counts.items():
+        out.emit({"table": table, "rows": n, "path": str(path)},
+                 lambda r: f"{r['table']:<12}  {r['rows']:>8} 行  {r['path']}")
+    return 0
+
+
+def cmd_delete(args, out):
+    from claude_chat import db
+    if not args.yes:
+        if not sys.stdin.isatty():
+            print("非交互环境下删除需要 --yes", file=sys.stderr)
+            return 2
+        answer = input(f"确定删除 {len(args.sessions)} 个会话? [y/N] ")
+        if answer.strip().lower() not in ("y", "yes"):
+            return 1
+    failed = 0
+    for sid in args.sessions:
+        ok = db.delete_codex_session(sid) if args.codex else db.delete_session(sid)
+        if not ok:
+            failed += 1
+            print(f"删除失败: {sid}", file=sys.stderr)
+            continue
+        out.emit({"session_id": sid, "deleted": True}, lambda r: f"已删除 {r['session_id']}")
+    return 1 if failed else 0
+
+
+def cmd_watch(args, out):
+    from claude_chat import watchlist
+    terms = args.terms or None
+    if terms is None and not watchlist.load_terms():
+        print("没有监控词：在命令行给出，或在图形界面的「监控」中设置", file=sys.stderr)
+        return 2
+    result = watchlist.scan(terms)
+    for t in result["terms"]:
+        out.emit(t, lambda r: f"{r['hits']:>7}  {len(r['sessions']):>4} 个会话  {r['term']}")
+    # 有命中时返回 1，便于在 cron / CI 中告警
+    return 1 if any(t["hits"] for t in result["terms"]) else 0
+
+
+def cmd_serve(args, out):
+    from claude_chat import server
+    port = server.SERVER_PORT if args.port is None else args.port
+    refresh = server.REFRESH_SECONDS if args.refresh is None else args.refresh
+    try:
+        server.serve(port, refresh, args.verbose,
+                     ready=lambda url: print(f"查询服务已启动: {url}（Ctrl+C 退出）", file=sys.stderr))
+    except OSError as e:
+        print(f"无法启动查询服务: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_archive(args, out):
+    from claude_chat import db
+    if args.restore:
+        failed = 0
+        for sid in args.restore:
+            path = db.restore_codex_session(sid) if args.codex else db.restore_session(sid)
+            if path is None:
+                failed += 1
+                print(f"未找到归档会话: {sid}", file=sys.stderr)
+                continue
+            out.emit({"session_id": sid, "path": path}, lambda r: f"已还原 {r['path']}")
+        return 1 if failed else 0
+
+    saved = failed = 0
+    for r in db.iter_archive_sessions(args.days, args.codec, codex=args.codex, dry_run=args.dry_run):
+        if r["error"]:
+            failed += 1
+            print(f"归档失败: {r['path']}: {r['error']}", file=sys.stderr)
+            continue
+        if args.dry_run:
+            out.emit(r, lambda r: f"{r['size'] / 1e6:>9.1f} MB  {r['path']}")
+        else:
+            saved += r["size"] - r["archived_size"]
+            out.emit(r, lambda r: f"{r['size'] / 1e6:>9.1f} MB -> {r['archived_size'] / 1e6:>7.1f} MB  {r['archive']}")
+    if not args.dry_run and out.fmt == "text":
+        print(f"共节省 {saved / 1e6:.1f} MB", file=sys.stderr)
+    return 1 if failed else 0
+
+
+# ── 参数解析 ─────────────────────────────────────────────
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m claude_chat",
+                                     description="Claude Code / Codex 会话管理命令行")
+    parser.add_argument("-f", "--format", choices=["text", "json", "ndjson"], default="text",
+                        help="输出格式（默认 text）")
+    parser.add_argument("--perf-trace", metavar="FILE",
+                        help="记录耗时并在结束时写出 Chrome trace-event 文件")
+    parser.add_argument("--server", metavar="URL", default=None,
+                        help="通过本地查询服务查询（默认取环境变量 CLAUDE_CHAT_SERVER；设为空字符串则直接读取）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_range(p):
+        p.add_argument("--since", type=_parse_date, help="起始时间（含），如 2026-09-01")
+        p.add_argument("--until", type=_parse_date, help="结束时间（不含）")
+        p.add_argument("--days", type=int, help="最近 N 天，覆盖 --since")
+
+    p = sub.add_parser("list", help="列出项目或会话",
+                       description="--since / --until / --days 按最后修改时间过滤会话；列出项目时只保留期间有会话修改过的项目")
+    p.add_argument("-p", "--project", help="列出该项目目录下的会话")
+    p.add_argument("-s", "--sessions", action="store_true", help="列出全部会话而非项目")
+    p.add_argument("--codex", action="store_true", help="列出 Codex 会话")
+    p.add_argument("--root", help="只列出该数据根（见 roots 命令）")
+    add_range(p)
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser("roots", help="列出数据根（由 CLAUDE_CHAT_ROOTS 配置）")
+    p.set_defaults(func=cmd_roots)
+
+    p = sub.add_parser("search", help="全文搜索消息",
+                       description="查询语法：普通词、\"短语\"、-排除、a OR b，以及字段 role: project: "
+                                   "model: session: after: before:（如 after:2026-09-01、after:7d）")
+    p.add_argument("query")
+    p.add_argument("--literal", action="store_true", help="把整个查询当作一个普通子串")
+    p.add_argument("--full", action="store_true", help="输出完整消息内容")
+    p.add_argument("-k", "--top", type=int, metavar="K", help="按相关度（BM25）只输出前 K 条")
+    p.add_argument("--offset", type=int, default=0, help="与 --top 一起使用，跳过前 N 条（翻页）")
+    p.set_defaults(func=cmd_search)
+
+    p = sub.add_parser("show", help="显示会话内容")
+    p.add_argument("session", help="会话 ID（支持前缀）；--codex 时为文件路径")
+    p.add_argument("--codex", action="store_true")
+    p.set_defaults(func=cmd_show)
+
+    p = sub.add_parser("export", help="导出会话为 Markdown")
+    p.add_argument("sessions", nargs="*", help="会话 ID（支持前缀）")
+    p.add_argument("-p", "--project", help="导出该项目目录下的全部会话")
+    p.add_argument("--root", help="与 -p 一起使用，只导出该数据根下的项目")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("stats", help="Token 用量统计")
+    p.add_argument("--by", choices=["project", "model", "hour", "date", "week", "month", "session_id", "root", "total"],
+                   default="project", help="分组维度；hour / date / week / month 按 --tz 时区分桶，week 以周一日期标记")
+    p.add_argument("--tz", type=_parse_zone, help="分桶时区（IANA 名称，如 Asia/Shanghai、UTC），默认 CLAUDE_CHAT_TZ 或本机时区")
+    p.add_argument("--raw", action="store_true", help="逐条输出原始记录")
+    p.add_argument("--codex", action="store_true")
+    p.add_argument("--root", help="只统计该数据根")
+    add_range(p)
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser("export-stats", help="导出 token 用量与活动记录到 CSV 或 SQLite（流式分批写入）")
+    p.add_argument("path", help="目标文件：.csv 导出一张表，.db / .sqlite / .sqlite3 导出全部表")
+    p.add_argument("--table", choices=["token_usage", "activity"], help="只导出该表（CSV 默认 token_usage）")
+    p.add_argument("-a", "--append", action="store_true", help="增量追加：只写入比文件中已有记录更新的记录")
+    add_range(p)
+    p.set_defaults(func=cmd_export_stats)
+
+    p = sub.add_parser("watch", help="扫描监控词（增量），有命中时退出码为 1")
+    p.add_argument("terms", nargs="*", help="监控词；省略时使用已保存的监控词")
+    p.set_defaults(func=cmd_watch)
+
+    p = sub.add_parser("archive", help="压缩归档长期未修改的会话（归档后仍可浏览、搜索）")
+    p.add_argument("--days", type=int, default=90, help="归档超过 N 天未修改的会话（默认 90）")
+    p.add_argument("--codec", choices=["gz", "xz"], default="gz", help="gz 解压更快，xz 压缩率更高")
+    p.add_argument("--codex", action="store_true", help="同时归档 Codex 会话；与 --restore 一起使用时还原 Codex 会话")
+    p.add_argument("-n", "--dry-run", action="store_true", help="只列出将被归档的会话")
+    p.add_argument("--restore", nargs="+", metavar="SESSION",
+                   help="还原归档的会话为 .jsonl（在 Claude Code 中继续会话前需要还原）；--codex 时为文件路径")
+    p.set_defaults(func=cmd_archive)
+
+    p = sub.add_parser("serve", help="启动本地查询服务，常驻保持索引与统计缓存（只监听 127.0.0.1）")
+    p.add_argument("--port", type=int, default=None, help="端口（默认 8765 或环境变量 CLAUDE_CHAT_PORT）")
+    p.add_argument("--refresh", type=float, default=None, metavar="SECONDS",
+                   help="检查数据目录变化的间隔秒数（默认 30，0 表示不自动刷新）")
+    p.add_argument("-v", "--verbose", action="store_true", help="输出每个请求的日志")
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser("delete", help="删除会话")
+    p.add_argument("sessions", nargs="+", help="会话 ID（支持前缀）；--codex 时为文件路径")
+    p.add_argument("--codex", action="store_true")
+    p.add_argument("-y", "--yes", action="store_true", help="不询问直接删除")
+    p.set_defaults(func=cmd_delete)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    out = _Output(args.format)
+    if args.perf_trace:
+        from claude_chat import perf
+        perf.enable()
+    try:
+        code = args.func(args, out)
+        out.close()
+    except BrokenPipeError:
+        # 下游（如 head）提前关闭管道时安静退出
+        sys.stderr.close()
+        return 0
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if args.perf_trace:
+            perf.dump_chrome_trace(args.perf_trace)
+    return code
@@ -0,0 +1,211 @@
+"""本地查询服务（claude_chat.server）的客户端
+
+Client 提供与 db 同名的只读查询函数，返回结构相同的记录（path 字段还原为 Path）；
+服务连接失败时自动改为在本进程中直接调用 db。backend() 在配置了 CLAUDE_CHAT_SERVER
+且服务可用时返回 Client，否则返回 db 模块本身，调用方无需区分两种来源。
+"""
+import functools
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+from urllib.error import HTTPError, URLError
+from urllib.parse import unquote, urlencode
+from urllib.request import Request, urlopen
+
+from . import db, export
+from .config import EXPORTS_DIR, SERVER_URL
+from .query import parse_query
+
+TIMEOUT = 600          # 服务冷启动时的全量统计可能较慢
+HEALTH_TIMEOUT = 0.5
+
+
+class ServerError(OSError):
+    """服务返回错误状态"""
+
+
+class ServerUnavailable(ServerError):
+    """无法连接到服务"""
+
+
+def _fallback(local):
+    """服务不可用时改用本进程中的 local 函数（参数相同）"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return fn(self, *args, **kwargs)
+            except ServerUnavailable:
+                return local(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _param(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if value is True:
+        return "1"
+    return str(value)
+
+
+def _with_path(records):
+    for r in records:
+        if r.get("path"):
+            r["path"] = Path(r["path"])
+    return records
+
+
+class Client:
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+
+    def __repr__(self):
+        return f"Client({self.url!r})"
+
+    def _open(self, path, params=None, method="GET", timeout=TIMEOUT):
+        query = urlencode({k: _param(v) for k, v in (params or {}).items() if v is not None and v is not False})
+        url = f"{self.url}{path}" + (f"?{query}" if query else "")
+        try:
+            return urlopen(Request(url, method=method), timeout=timeout)
+        except HTTPError as e:
+            try:
+                message = json.loads(e.read()).get("error")
+            except (ValueError, AttributeError):
+                message = None
+            e.close()
+            raise ServerError(e.code, message or e.reason) from None
+        except URLError as e:
+            raise ServerUnavailable(str(e.reason)) from None
+
+    def _json(self, path, **params):
+        with self._open(path, params) as resp:
+            return json.load(resp)
+
+    def _records(self, path, **params):
+        """打开连接后返回逐行解析的生成器；连接失败在调用时即抛出，便于回退"""
+        resp = self._open(path, params)
+
+        def _iter():
+            with resp:
+                for line in resp:
+                    yield json.loads(line)
+        return _iter()
+
+    def health(self, timeout=HEALTH_TIMEOUT):
+        with self._open("/health", timeout=timeout) as resp:
+            return json.load(resp)
+
+    def refresh(self):
+        with self._open("/refresh", method="POST") as resp:
+            return json.load(resp)["generation"]
+
+    # ── 与 db 同名的查询 ──
+
+    @_fallback(db.list_projects)
+    def list_projects(self):
+        return _with_path(list(self._records("/projects")))
+
+    @_fallback(db.list_sessions)
+    def list_sessions(self, project_dirname=None, root=None):
+        return _with_path(list(self._records("/sessions", project=project_dirname, root=root)))
+
+    @_fallback(db.list_codex_sessions)
+    def list_codex_sessions(self, since=None, until=None):
+        return _with_path(list(self._records("/codex/sessions", since=since, until=until)))
+
+    @_fallback(db.iter_search_messages)
+    def iter_search_messages(self, keyword):
+        return self._records("/search", q=keyword, literal=True, full=True)
+
+    @_fallback(db.iter_query_messages)
+    def iter_query_messages(self, query):
+        """query 为查询字符串；先在本地解析，语法错误时与 db 一样抛出 QueryError"""
+        parse_query(query)
+        return self._records("/search", q=query, full=True)
+
+    @_fallback(db.search_ranked)
+    def search_ranked(self, query, limit=50, offset=0):
+        parse_query(query)
+        return self._json("/search", q=query, k=limit, offset=offset)
+
+    @_fallback(db.collect_token_stats)
+    def collect_token_stats(self, since=None, until=None):
+        return list(self._records("/stats/tokens", since=since, until=until))
+
+    @_fallback(db.collect_session_activity)
+    def collect_session_activity(self, since=None, until=None):
+        return list(self._records("/stats/activity", since=since, until=until))
+
+    @_fallback(db.collect_codex_token_stats)
+    def collect_codex_token_stats(self, since=None, until=None):
+        return list(self._records("/stats/tokens", since=since, until=until, codex=True))
+
+    @_fallback(db.collect_codex_activity)
+    def collect_codex_activity(self, since=None, until=None):
+        return list(self._records("/stats/activity", since=since, until=until, codex=True))
+
+    # ── 会话内容 ──
+
+    def iter_session(self, session_id=None, path=None):
+        """逐条产出会话内容：首条为元信息（含 path / message_count），之后为消息 {"role", "content", "uuid"}
+
+        给出 path 时读取该 Codex 会话文件。找不到会话时返回 None。
+        """
+        params = {"source": "codex", "path": path} if path else {"session": session_id}
+        try:
+            return self._records("/detail", **params)
+        except ServerError as e:
+            if e.errno == 404:
+                return None
+            raise
+
+    @_fallback(export.export_session)
+    def export_session(self, session_id):
+        """由服务生成 Markdown，写入本机导出目录，返回文件路径；找不到会话时返回 None"""
+        try:
+            resp = self._open("/export", {"session": session_id})
+        except ServerError as e:
+            if e.errno == 404:
+                return None
+            raise
+        with resp:
+            disposition = resp.headers.get("Content-Disposition", "")
+            _, _, name = disposition.partition("filename*=UTF-8''")
+            filepath = EXPORTS_DIR / Path(unquote(name) or f"{session_id[:8]}.md").name
+            with open(filepath, "wb") as f:
+                while chunk := resp.read(64 * 1024):
+                    f.write(chunk)
+        return filepath
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def connect(url):
+    """连接服务并检查可用性，不可用时抛出 ServerError"""
+    client = Client(url)
+    client.health()
+    return client
+
+
+def backend(url=None):
+    """查询后端：配置了服务地址且服务可用时为 Client，否则为 db 模块。默认地址的结果在进程内复用"""
+    global _backend
+    if url is not None:
+        return _resolve(url)
+    with _backend_lock:
+        if _backend is None:
+            _backend = _resolve(SERVER_URL)
+        return _backend
+
+
+def _resolve(url):
+    if not url:
+        return db
+    try:
+        return connect(url)
+    except ServerError:
+        return db
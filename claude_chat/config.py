@@ -1,13 +1,106 @@
+import glob
 import os
 from pathlib import Path
 
-CLAUDE_DIR = Path.home() / ".claude"
+# 与 Claude Code / Codex 自身一致，允许通过环境变量改写数据目录
+CLAUDE_DIR = Path(os.environ.get("CLAUDE_CONFIG_DIR") or Path.home() / ".claude")
 PROJECTS_DIR = CLAUDE_DIR / "projects"
 HISTORY_FILE = CLAUDE_DIR / "history.jsonl"
 
-CODEX_DIR = Path.home() / ".codex"
+CODEX_DIR = Path(os.environ.get("CODEX_HOME") or Path.home() / ".codex")
 CODEX_SESSIONS_DIR = CODEX_DIR / "sessions"
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 EXPORTS_DIR = BASE_DIR / "exports"
 EXPORTS_DIR.mkdir(exist_ok=True)
+
+CACHE_DIR = Path(os.environ.get("CLAUDE_CHAT_CACHE_DIR") or BASE_DIR / "cache")
+CACHE_DIR.mkdir(parents=True, exist_ok=True)
+SIDEBAR_SNAPSHOT_FILE = CACHE_DIR / "sidebar.json"
+
+# Tk 主线程卡顿超过该阈值（毫秒）时记录调用栈
+STALL_THRESHOLD_MS = int(os.environ.get("CLAUDE_CHAT_STALL_MS") or 500)
+STALL_LOG_FILE = CACHE_DIR / "stalls.log"
+
+# 敏感词监控：监控词列表与增量扫描状态
+WATCHLIST_FILE = CACHE_DIR / "watchlist.json"
+WATCHLIST_STATE_FILE = CACHE_DIR / "watchlist_state.json"
+
+# 本地查询服务（python -m claude_chat serve）：常驻进程保持索引与统计缓存预热，只监听本机。
+# 设置 CLAUDE_CHAT_SERVER（如 http://127.0.0.1:8765）后 GUI 与命令行优先通过该服务查询，服务不可用时回退为直接读取
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = int(os.environ.get("CLAUDE_CHAT_PORT") or 8765)
+SERVER_URL = os.environ.get("CLAUDE_CHAT_SERVER") or ""
+
+# 进程内缓存（统计记录、映射表、消息偏移表、查询服务的响应等）合计的内存预算（MB），超出时淘汰或溢出到磁盘最久未用的条目；0 表示不限制
+MEMORY_BUDGET_MB = int(os.environ.get("CLAUDE_CHAT_MEMORY_MB") or 512)
+
+# 统计与分析按该时区把时间戳分到小时 / 日 / 周 / 月（IANA 名称，如 Asia/Shanghai、UTC），未设置时使用本机时区
+TIMEZONE = os.environ.get("CLAUDE_CHAT_TZ") or ""
+
+# 多数据根：合并浏览与分析多份 ~/.claude / ~/.codex（如团队共享卷上每位成员同步的历史）。
+# CLAUDE_CHAT_ROOTS 为 os.pathsep 分隔的列表，每项为 [名称=]目录，目录下应有 .claude 和/或 .codex，
+# 可以使用通配符（如 /mnt/history/*），名称默认取目录名。未设置时只有本机一个数据根（即上面的目录）。
+# 每个数据根有自己的缓存目录；多个数据根时扫描按根分发到 CLAUDE_CHAT_WORKERS 个进程并行执行。
+ROOT_WORKERS = int(os.environ.get("CLAUDE_CHAT_WORKERS") or os.cpu_count() or 1)
+
+
+class Root:
+    """一个数据根：Claude Code / Codex 数据目录和它自己的缓存目录"""
+
+    __slots__ = ("name", "claude_dir", "codex_dir", "cache_dir")
+
+    def __init__(self, name, claude_dir, codex_dir, cache_dir):
+        self.name = name
+        self.claude_dir = Path(claude_dir)
+        self.codex_dir = Path(codex_dir)
+        self.cache_dir = Path(cache_dir)
+
+    def __repr__(self):
+        return f"Root({self.name!r}, {str(self.claude_dir)!r}, {str(self.codex_dir)!r})"
+
+    @property
+    def projects_dir(self):
+        return self.claude_dir / "projects"
+
+    @property
+    def history_file(self):
+        return self.claude_dir / "history.jsonl"
+
+    @property
+    def codex_sessions_dir(self):
+        return self.codex_dir / "sessions"
+
+    @property
+    def zone_map_file(self):
+        return self.cache_dir / "zonemap.json"
+
+
+def _parse_roots(spec):
+    roots = []
+    for item in spec.split(os.pathsep):
+        name, sep, path = item.partition("=")
+        if not sep:
+            name, path = "", item
+        path = os.path.expanduser(path.strip())
+        if not path:
+            continue
+        paths = sorted(glob.glob(path)) if glob.has_magic(path) else [path]
+        for p in map(Path, paths):
+            if not p.is_dir():
+                continue
+            # 名称重复（如不同卷上的同名目录）时追加序号
+            base = name.strip() or p.name or str(p)
+            unique, n = base, 1
+            while any(r.name == unique for r in roots):
+                n += 1
+                unique = f"{base}-{n}"
+            roots.append(Root(unique, p / ".claude", p / ".codex", CACHE_DIR / "roots" / unique))
+    return roots
+
+
+ROOTS = _parse_roots(os.environ.get("CLAUDE_CHAT_ROOTS") or "") \
+    or [Root("local", CLAUDE_DIR, CODEX_DIR, CACHE_DIR)]
+MULTI_ROOT = len(ROOTS) > 1
+for _root in ROOTS:
+    _root.cache_dir.mkdir(parents=True, exist_ok=True)
@@ -1,42 +1,176 @@
+import bisect
+import heapq
 import json
+import multiprocessing
+import os
+import sys
+import threading
+import weakref
+import zlib
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from datetime import datetime
-from .config import PROJECTS_DIR, HISTORY_FILE, CODEX_SESSIONS_DIR
-
-
-_session_project_cache = None
-_first_message_cache = None
-_token_stats_cache = None
-_activity_cache = None
+from uuid import UUID
+from datetime import datetime, timedelta, timezone
+from . import archive, fssnapshot, perf, rank, timebucket
+from .cache import Cache
+from .archive import open_session, session_id as _session_id
+from .query import parse_query
+from .config import ROOTS, ROOT_WORKERS
+
+
+# 以下缓存均按数据根名分开存放；并发的相同请求只扫描一次，清空时进行中的扫描结果不再写入。
+# 都计入 memory 的内存预算：超出时淘汰最久未用的条目，全量统计记录重算代价高，溢出到磁盘而不是丢弃
+_session_project_cache = Cache(name="项目映射")
+_first_message_cache = Cache(name="首条消息")
+_token_stats_cache = Cache(name="Token 记录", spill=True)
+_activity_cache = Cache(name="活动记录", spill=True)
+# 数据根名 → {str(path): {"mtime", "size", "min_ts", "max_ts", "models"}}。
+# 扫描与归档时原地更新后写回文件，不能在更新途中被淘汰，因此不放进计入预算的 Cache
+_zone_maps = {}
+_zone_map_lock = threading.Lock()
+_snapshot_cache = Cache(name="目录快照")  # 数据根名 → fssnapshot.Snapshot
+
+
+def clear_caches():
+    """清空所有模块级缓存（刷新时调用）"""
+    _session_project_cache.clear()
+    _first_message_cache.clear()
+    _token_stats_cache.clear()
+    _activity_cache.clear()
+    with _zone_map_lock:
+        _zone_maps.clear()
+    _snapshot_cache.clear()
+    _message_index_cache.clear()
+
+
+# ── 多数据根 ──────────────────────────────────────────────
+
+_thread_pool = None
+_process_pool = None
+_pool_lock = threading.Lock()
+
+
+def _roots(name=None):
+    """全部数据根，或名称为 name 的那一个"""
+    return [r for r in ROOTS if name is None or r.name == name]
+
+
+def _map_roots(fn, *args, roots=None, cpu=False):
+    """在每个数据根上执行 fn(root, *args)，按数据根顺序产出 (root, 结果)
+
+    只有一个数据根时直接在当前线程执行。多个数据根时并发执行：列目录等 I/O 为主的操作用线程池；
+    cpu=True 的扫描（解析 JSON 受 GIL 限制）分发到进程池，按根并行，耗时随核数增加而下降。
+    进程池中的任务不使用模块级缓存（工作进程会被复用，缓存可能已过期），结果由调用方按根缓存。
+    """
+    roots = ROOTS if roots is None else roots
+    if len(roots) <= 1:
+        for root in roots:
+            yield root, fn(root, *args)
+        return
+    global _thread_pool, _process_pool
+    with _pool_lock:
+        if cpu and _process_pool is None:
+            # spawn：GUI 进程中有其他线程，fork 可能继承到被持有的锁
+            _process_pool = ProcessPoolExecutor(ROOT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        elif not cpu and _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(ROOT_WORKERS, thread_name_prefix="roots")
+    if cpu:
+        futures = [_process_pool.submit(_run_root_task, fn, root, args) for root in roots]
+    else:
+        futures = [_thread_pool.submit(fn, root, *args) for root in roots]
+    try:
+        for root, future in zip(roots, futures):
+            result = future.result()
+            if cpu:
+                # 工作进程可能更新了该根的 zone map 文件
+                with _zone_map_lock:
+                    _zone_maps.pop(root.name, None)
+            yield root, result
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def _run_root_task(fn, root, args):
+    clear_caches()
+    return fn(root, *args)
+
+
+def _iter_roots(fn, *args, roots=None):
+    """逐条产出生成器 fn(root, *args) 在各数据根上的结果：单个数据根时流式产出，多个时按根并行收集"""
+    roots = ROOTS if roots is None else roots
+    if len(roots) == 1:
+        yield from fn(roots[0], *args)
+        return
+    for _, items in _map_roots(_listed, fn, *args, roots=roots, cpu=True):
+        yield from items
+
+
+def _listed(root, fn, *args):
+    return list(fn(root, *args))
+
+
+def _snapshot(root):
+    """数据根的文件系统快照（见 fssnapshot），每次刷新后第一次访问时重建"""
+    return _snapshot_cache.get(root.name, lambda: fssnapshot.scan(root))
+
+
+def _cached_roots(cache, fn, *args):
+    """全量结果按数据根缓存：返回 {数据根名: 结果}，未缓存的根一起交给 _map_roots 并行计算
+
+    其他线程正在计算的根等待其结果，不重复扫描。
+    """
+    def build(names):
+        for root, result in _map_roots(fn, *args, roots=[r for r in ROOTS if r.name in names], cpu=True):
+            yield root.name, result
+    return cache.get_many([r.name for r in ROOTS], build)
+
+
+def _iter_json(path):
+    """逐行解析 JSONL 文件，跳过无法解析的行；启用性能采集时上报文件数、字节数和行数
+
+    正在写入的文件末尾可能是半行（甚至半个 UTF-8 字符），按无法解析的行跳过。
+    """
+    lines = 0
+    with open_session(path, "rt", encoding="utf-8", errors="replace") as f:
+        try:
+            for line in f:
+                lines += 1
+                try:
+                    obj = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(obj, dict):
+                    yield obj
+        finally:
+            if perf.enabled:
+                perf.count("files")
+                perf.count("lines", lines)
+                perf.count("bytes", os.fstat(f.fileno()).st_size)
 
 
-def _build_session_project_map():
+def _build_session_project_map(root):
     """从 history.jsonl 建立 sessionId → 真实项目路径的映射"""
-    global _session_project_cache
-    if _session_project_cache is not None:
-        return _session_project_cache
+    return _session_project_cache.get(root.name, lambda: _read_session_project_map(root))
 
-    _session_project_cache = {}
-    if not HISTORY_FILE.exists():
-        return _session_project_cache
 
-    with open(HISTORY_FILE, encoding="utf-8") as f:
-        for line in f:
-            try:
-                obj = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-            sid = obj.get("sessionId", "")
-            proj = obj.get("project", "")
-            if sid and proj and sid not in _session_project_cache:
-                _session_project_cache[sid] = proj
-    return _session_project_cache
+def _read_session_project_map(root):
+    with perf.span("db._build_session_project_map"):
+        mapping = {}
+        if root.history_file.exists():
+            for obj in _iter_json(root.history_file):
+                sid = obj.get("sessionId", "")
+                proj = obj.get("project", "")
+                if sid and proj and sid not in mapping:
+                    mapping[sid] = proj
+    return mapping
 
 
-def _get_project_display(dirname, session_id=None):
+def _get_project_display(root, dirname, session_id=None):
     """获取项目显示名。优先从 history 映射获取，否则从 session 文件的 cwd 获取"""
     if session_id:
-        mapping = _build_session_project_map()
+        mapping = _build_session_project_map(root)
         proj = mapping.get(session_id)
         if proj:
             return proj
@@ -44,6 +178,7 @@ def _get_project_display(dirname, session_id=None):
     return dirname
 
 
+@perf.timed()
 def _parse_session_file(filepath):
     """解析单个 session JSONL 文件，返回消息列表和元信息"""
     messages = []
@@ -51,47 +186,25 @@ def _parse_session_file(filepath):
     slug = None
     cwd = None
 
-    with open(filepath, encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            obj = json.loads(line)
-            msg_type = obj.get("type")
+    for obj in _iter_json(filepath):
+        msg_type = obj.get("type")
 
-            if msg_type not in ("user", "assistant"):
-                continue
+        if msg_type not in ("user", "assistant"):
+            continue
 
-            if not slug:
-                slug = obj.get("slug")
-            if not cwd:
-                cwd = obj.get("cwd")
-
-            msg = obj.get("message", {})
-            role = msg.get("role", msg_type)
-            content = msg.get("content", "")
-
-            # assistant 消息的 content 可能是 list
-            if isinstance(content, list):
-                text_parts = []
-                for block in content:
-                    if block.get("type") == "text":
-                        text_parts.append(block["text"])
-                text = "\n".join(text_parts)
-            else:
-                text = content
+        if not slug:
+            slug = obj.get("slug")
+        if not cwd:
+            cwd = obj.get("cwd")
 
-            if not text.strip():
-                continue
+        message = _claude_message(obj)
+        if message is None:
+            continue
 
-            if msg_type == "assistant" and not model:
-                model = msg.get("model")
+        if msg_type == "assistant" and not model:
+            model = obj.get("message", {}).get("model")
 
-            messages.append({
-                "role": role,
-                "content": text,
-                "uuid": obj.get("uuid"),
-            })
+        messages.append(message)
 
     return {
         "messages": messages,
@@ -101,158 +214,476 @@ def _parse_session_file(filepath):
     }
 
 
+def _claude_parts(obj):
+    """从一行 Claude Code 记录中取出可显示消息的 (角色, 正文)；不是消息或没有文本时返回 None"""
+    msg_type = obj.get("type")
+    if msg_type not in ("user", "assistant"):
+        return None
+    msg = obj.get("message", {})
+    text = _message_text(msg.get("content", ""))
+    if not text.strip():
+        return None
+    return msg.get("role", msg_type), text
+
+
+def _claude_message(obj):
+    parts = _claude_parts(obj)
+    return Message(*parts, obj.get("uuid")) if parts else None
+
+
+class Message:
+    """一条会话消息（role / content / uuid 属性）
+
+    大会话会解析出几十万条消息，因此尽量紧凑：用 __slots__ 去掉每条消息的 dict，
+    角色字符串驻留共享；正文中一个 emoji 就会让整个 str 变成每字符 4 字节，
+    这类正文改存 UTF-8 字节，访问 content 时再解码；uuid 存 16 字节。
+    """
+
+    __slots__ = ("role", "_content", "_uuid")
+
+    def __init__(self, role, content, uuid=None):
+        self.role = sys.intern(role)
+        self._content = _pack_text(content)
+        self._uuid = _pack_uuid(uuid)
+
+    @property
+    def content(self):
+        c = self._content
+        return c.decode("utf-8") if isinstance(c, bytes) else c
+
+    @property
+    def uuid(self):
+        u = self._uuid
+        return str(UUID(bytes=u)) if isinstance(u, bytes) else u
+
+    def to_dict(self):
+        return {"role": self.role, "content": self.content, "uuid": self.uuid}
+
+    def __eq__(self, other):
+        if not isinstance(other, Message):
+            return NotImplemented
+        return (self.role, self._content, self._uuid) == (other.role, other._content, other._uuid)
+
+    def __repr__(self):
+        return f"Message(role={self.role!r}, content={self.content[:40]!r}, uuid={self.uuid!r})"
+
+
+_BYTES_OVERHEAD = sys.getsizeof(b"")
+
+
+def _pack_text(text):
+    """非 ASCII 正文在 UTF-8 字节对象更小时改存字节（str 按最宽字符统一为 1、2 或 4 字节一个字符）"""
+    if text.isascii():
+        return text
+    data = text.encode("utf-8")
+    return data if len(data) + _BYTES_OVERHEAD < sys.getsizeof(text) else text
+
+
+def _pack_uuid(value):
+    if not value:
+        return None
+    # 只有规范的小写 8-4-4-4-12 写法才能无损还原
+    if not isinstance(value, str) or len(value) != 36 or value.count("-") != 4 \
+            or not value[8] == value[13] == value[18] == value[23] == "-":
+        return value
+    digits = value.replace("-", "")
+    try:
+        packed = bytes.fromhex(digits)
+    except ValueError:
+        return value
+    return packed if packed.hex() == digits else value
+
+
+def _dir_display_name(root, dirname, session_ids):
+    """从 session → project 映射反查项目目录的显示名"""
+    mapping = _build_session_project_map(root)
+    for sid in session_ids:
+        if sid in mapping:
+            return mapping[sid]
+    return dirname
+
+
+def _message_text(content):
+    """消息 content 可能是字符串或 block 列表（assistant / tool_result），只取其中的文本块"""
+    if isinstance(content, list):
+        return "\n".join(b.get("text", "") for b in content
+                         if isinstance(b, dict) and b.get("type") == "text")
+    return content if isinstance(content, str) else ""
+
+
+@perf.timed()
 def list_projects():
-    """列出所有项目"""
-    if not PROJECTS_DIR.exists():
-        return []
-
-    # 一次遍历建立 dirname → session_ids
-    dir_sessions = {}
-    for d in sorted(PROJECTS_DIR.iterdir()):
-        if d.is_dir():
-            files = list(d.glob("*.jsonl"))
-            dir_sessions[d.name] = [f.stem for f in files]
-
-    # 从 session → project 映射反查 dirname → display_name
-    mapping = _build_session_project_map()
-    dir_to_real = {}
-    for dirname, sids in dir_sessions.items():
-        for sid in sids:
-            if sid in mapping:
-                dir_to_real[dirname] = mapping[sid]
-                break
+    """列出所有数据根下的项目，每项带 root（数据根名）"""
+    projects = []
+    for _, part in _map_roots(_list_projects):
+        projects.extend(part)
+    return projects
 
+
+def _list_projects(root):
+    snapshot = _snapshot(root)
     projects = []
-    for dirname, sids in dir_sessions.items():
+    for dirname in sorted(snapshot.projects):
+        sids = [_session_id(f.name) for f in snapshot.projects[dirname]]
         projects.append({
+            "root": root.name,
             "dirname": dirname,
-            "display_name": dir_to_real.get(dirname, dirname),
+            "display_name": _dir_display_name(root, dirname, sids),
             "session_count": len(sids),
-            "path": PROJECTS_DIR / dirname,
+            "path": root.projects_dir / dirname,
         })
     return projects
 
 
-def list_sessions(project_dirname=None):
-    """列出会话。可选按项目过滤"""
-    if not PROJECTS_DIR.exists():
-        return []
+@perf.timed()
+def list_sessions(project_dirname=None, root=None):
+    """列出会话，每项带 root。可选按项目目录名和数据根过滤（只给项目时列出所有数据根下的同名项目）"""
+    results = []
+    for _, part in _map_roots(_list_sessions, project_dirname, roots=_roots(root)):
+        results.extend(part)
+    return results
+
 
+def _list_sessions(root, project_dirname):
+    snapshot = _snapshot(root)
     results = []
-    dirs = [PROJECTS_DIR / project_dirname] if project_dirname else sorted(PROJECTS_DIR.iterdir())
+    dirnames = [project_dirname] if project_dirname else sorted(snapshot.projects)
 
-    for proj_dir in dirs:
-        if not proj_dir.is_dir():
-            continue
-        for f in sorted(proj_dir.glob("*.jsonl"), key=lambda p: p.stat().st_mtime, reverse=True):
-            session_id = f.stem
+    for dirname in dirnames:
+        for f in sorted(snapshot.projects.get(dirname, ()), key=lambda f: f.stat().st_mtime, reverse=True):
+            session_id = _session_id(f.name)
             stat = f.stat()
-            first_msg = _get_first_message(session_id)
+            first_msg = _get_first_message(root, session_id)
             results.append({
+                "root": root.name,
                 "session_id": session_id,
-                "project": _get_project_display(proj_dir.name, session_id),
-                "project_dirname": proj_dir.name,
+                "project": _get_project_display(root, dirname, session_id),
+                "project_dirname": dirname,
                 "title": first_msg[:50] if first_msg else session_id[:8],
                 "modified": datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M"),
                 "size_kb": round(stat.st_size / 1024, 1),
-                "path": f,
+                "archived": archive.is_archived(f.name),
+                "path": f.path,
             })
     return results
 
 
-def _build_first_message_map():
+def _build_first_message_map(root):
     """一次性从 history.jsonl 建立 sessionId → 第一条用户消息的映射"""
-    global _first_message_cache
-    if _first_message_cache is not None:
-        return _first_message_cache
-    _first_message_cache = {}
-    if not HISTORY_FILE.exists():
-        return _first_message_cache
-    with open(HISTORY_FILE, encoding="utf-8") as f:
-        for line in f:
-            try:
-                obj = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-            sid = obj.get("sessionId", "")
-            display = obj.get("display", "")
-            if sid and display and not display.startswith("/") and sid not in _first_message_cache:
-                _first_message_cache[sid] = display
-    return _first_message_cache
+    return _first_message_cache.get(root.name, lambda: _read_first_message_map(root))
+
 
+def _read_first_message_map(root):
+    with perf.span("db._build_first_message_map"):
+        mapping = {}
+        if root.history_file.exists():
+            for obj in _iter_json(root.history_file):
+                sid = obj.get("sessionId", "")
+                display = obj.get("display", "")
+                if sid and display and not display.startswith("/") and sid not in mapping:
+                    mapping[sid] = display
+    return mapping
 
-def _get_first_message(session_id):
+
+def _get_first_message(root, session_id):
     """从缓存获取某会话的第一条用户消息"""
-    return _build_first_message_map().get(session_id, "")
+    return _build_first_message_map(root).get(session_id, "")
 
 
+@perf.timed()
 def get_session_detail(session_id):
     """获取会话详情（解析 JSONL）"""
-    filepath = _find_session_file(session_id)
+    root, filepath = _find_session_file(session_id)
     if not filepath:
         return None
     data = _parse_session_file(filepath)
-    full_id = filepath.stem  # 用文件名的完整 UUID 查映射
+    full_id = _session_id(filepath)  # 用文件名的完整 UUID 查映射
     data["session_id"] = full_id
     data["path"] = filepath
-    data["project"] = _get_project_display(filepath.parent.name, full_id)
+    data["root"] = root.name
+    data["project"] = _get_project_display(root, filepath.parent.name, full_id)
     return data
 
 
-def _find_session_file(session_id):
-    """根据 session_id 查找 JSONL 文件（支持前缀匹配）"""
-    if not PROJECTS_DIR.exists():
+def get_session_index(session_id):
+    """获取会话的消息偏移表（正文按需读取），meta 中含 session_id / path / root / project / model / slug / cwd"""
+    root, filepath = _find_session_file(session_id)
+    if not filepath:
         return None
-    for proj_dir in PROJECTS_DIR.iterdir():
-        if not proj_dir.is_dir():
-            continue
-        exact = proj_dir / f"{session_id}.jsonl"
-        if exact.exists():
-            return exact
-        # 前缀匹配
-        for f in proj_dir.glob("*.jsonl"):
-            if f.stem.startswith(session_id):
-                return f
-    return None
+    index = message_index(filepath)
+    full_id = _session_id(filepath)
+    index.meta["session_id"] = full_id
+    index.meta["path"] = filepath
+    index.meta["root"] = root.name
+    index.meta["project"] = _get_project_display(root, filepath.parent.name, full_id)
+    return index
 
 
+@perf.timed()
+def _find_session_file(session_id):
+    """根据 session_id 在各数据根中查找 JSONL 文件（支持前缀匹配，包括已归档的压缩文件）
+
+    在快照中二分查找；找不到时可能是上次刷新后新建的会话，重建一次快照再找。
+    返回 (数据根, 路径)，找不到时返回 (None, None)。
+    """
+    for attempt in range(2):
+        for root in ROOTS:
+            found = _snapshot(root).find(session_id)
+            if found:
+                return root, found[1].path
+        if attempt == 0:
+            _snapshot_cache.clear()
+    return None, None
+
+
+@perf.timed()
 def search_messages(keyword):
     """在所有会话中搜索关键词"""
+    return list(iter_search_messages(keyword))
+
+
+def iter_search_messages(keyword):
+    """逐条产出搜索结果，供命令行等需要流式输出的场景使用"""
+    return _iter_roots(_search_root, keyword)
+
+
+def _search_root(root, keyword):
     keyword_lower = keyword.lower()
-    results = []
 
-    if not PROJECTS_DIR.exists():
-        return results
+    for dirname, files in _snapshot(root).projects.items():
+        for f in files:
+            session_id = _session_id(f.name)
+            for obj in _iter_json(f.path):
+                if obj.get("type") not in ("user", "assistant"):
+                    continue
+                msg = obj.get("message", {})
+                content = msg.get("content", "")
+                if isinstance(content, list):
+                    text = " ".join(b.get("text", "") for b in content if b.get("type") == "text")
+                else:
+                    text = content
+
+                if keyword_lower in text.lower():
+                    yield {
+                        "root": root.name,
+                        "session_id": session_id,
+                        "project": _get_project_display(root, dirname, session_id),
+                        "role": obj.get("type"),
+                        "content": text,
+                        "match_preview": _extract_match_context(text, keyword_lower),
+                    }
 
-    for proj_dir in PROJECTS_DIR.iterdir():
-        if not proj_dir.is_dir():
-            continue
-        for f in proj_dir.glob("*.jsonl"):
-            session_id = f.stem
-            with open(f, encoding="utf-8") as fh:
-                for line in fh:
-                    try:
-                        obj = json.loads(line)
-                    except json.JSONDecodeError:
+
+@perf.timed()
+def query_messages(query):
+    """按查询语言搜索消息，语法见 claude_chat.query"""
+    return list(iter_query_messages(query))
+
+
+def iter_query_messages(query):
+    """逐条产出查询结果。query 为查询字符串或 Query，语法错误时抛出 QueryError"""
+    if isinstance(query, str):
+        query = parse_query(query)
+    return _iter_roots(_query_root, query, roots=_query_roots(query))
+
+
+def _query_roots(query):
+    return [r for r in ROOTS if query.match_root(r.name)]
+
+
+def _query_root(root, query):
+    for _, session_id, project, offset, role, ts, text, text_lower in _scan_query(root, query):
+        spans = query.match_spans(text_lower)
+        yield {
+            "root": root.name,
+            "session_id": session_id,
+            "project": project,
+            "role": role,
+            "timestamp": ts,
+            "offset": offset,
+            "content": text,
+            "match_preview": _context_at(text, *spans[0]) if spans else text[:150],
+            "matches": spans,
+        }
+
+
+def _scan_query(root, query, scan=None):
+    """按查询扫描会话文件，产出 (路径, 会话 ID, 项目, 字节偏移, 角色, 时间, 文本, 小写文本)
+
+    过滤按代价从低到高依次下推：
+    1. 文件级：项目 / 会话 ID 只看目录与文件名；after / before 先比较文件 mtime，再查 zone map；
+       model 查 zone map 中的模型集合。缺少 zone 条目的文件在带时间或模型条件时完整解析一次并补建条目
+    2. 行级：未解析 JSON 前检查原始行是否包含所有必需的词
+    3. 消息级：解析后匹配角色、时间和文本
+
+    scan 为 dict 时累加扫描过的行数（"lines"），供排序估计语料规模。
+    """
+    since_iso, until_iso = _iso_utc(query.after), _iso_utc(query.before)
+    ranged = since_iso is not None or until_iso is not None
+    since_mtime = query.after.timestamp() if query.after else None
+    needs_zone = ranged or query.has_model_filter
+    zone_map = _load_zone_map(root)
+    dirty = False
+
+    try:
+        for dirname, files in _snapshot(root).projects.items():
+            if not query.match_project(dirname,
+                                       _dir_display_name(root, dirname, [_session_id(f.name) for f in files])):
+                continue
+            for entry in files:
+                session_id = _session_id(entry.name)
+                if not query.match_session(session_id):
+                    continue
+                f = entry.path
+                stat = entry.stat()
+                if since_mtime is not None and stat.st_mtime < since_mtime:
+                    continue
+                zone = _valid_zone(zone_map, str(f), stat)
+                if zone and "models" not in zone:
+                    zone = None  # 旧版条目没有模型信息
+                if zone:
+                    if ranged and not _zone_overlaps(zone, since_iso, until_iso):
                         continue
-                    if obj.get("type") not in ("user", "assistant"):
+                    if query.has_model_filter and not query.match_models(zone["models"]):
                         continue
-                    msg = obj.get("message", {})
-                    content = msg.get("content", "")
-                    if isinstance(content, list):
-                        text = " ".join(b.get("text", "") for b in content if b.get("type") == "text")
-                    else:
-                        text = content
-
-                    if keyword_lower in text.lower():
-                        results.append({
-                            "session_id": session_id,
-                            "project": _get_project_display(proj_dir.name, session_id),
-                            "role": obj.get("type"),
-                            "content": text,
-                            "match_preview": _extract_match_context(text, keyword_lower),
-                        })
-    return results
+                # 没有可用 zone 条目时完整解析并补建，否则按行预过滤
+                zone_stats = _ZoneStats() if needs_zone and not zone else None
+                project = _get_project_display(root, dirname, session_id)
+                hits = []
+                with open_session(f) as fh:
+                    lines = 0
+                    pos = 0
+                    for raw in fh:
+                        offset = pos
+                        pos += len(raw)
+                        lines += 1
+                        line = raw.decode("utf-8", "replace")
+                        if zone_stats is None and not query.line_may_match(line.lower()):
+                            continue
+                        try:
+                            obj = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        if not isinstance(obj, dict):
+                            continue
+                        if zone_stats is not None:
+                            zone_stats.observe(obj)
+                        msg_type = obj.get("type")
+                        if msg_type not in ("user", "assistant"):
+                            continue
+                        msg = obj.get("message", {})
+                        role = msg.get("role", msg_type)
+                        if not query.match_role(role):
+                            continue
+                        ts = obj.get("timestamp", "")
+                        if ranged and not _ts_in_range(ts, since_iso, until_iso):
+                            continue
+                        text = _message_text(msg.get("content", ""))
+                        text_lower = text.lower()
+                        if not text.strip() or not query.match_text(text_lower):
+                            continue
+                        hits.append((f, session_id, project, offset, role, ts, text, text_lower))
+                    if scan is not None:
+                        scan["lines"] = scan.get("lines", 0) + lines
+                    if perf.enabled:
+                        perf.count("files")
+                        perf.count("lines", lines)
+                        perf.count("bytes", stat.st_size)
+                if zone_stats is not None:
+                    zone_map[str(f)] = zone_stats.entry(stat)
+                    dirty = True
+                    if query.has_model_filter and not query.match_models(zone_stats.models):
+                        continue
+                yield from hits
+    finally:
+        if dirty:
+            _save_zone_map(root, zone_map)
+
+
+@perf.timed()
+def search_ranked(query, limit=50, offset=0):
+    """按 BM25 相关度返回第 offset 起的 limit 条命中（无搜索词时按时间倒序）
+
+    扫描时每条命中只保留紧凑的排序键（见 rank），不用有界堆：idf 要到扫描结束才能确定，
+    提前按不含 idf 的分数截断会丢掉多词查询的真正前几名。内存与命中数成正比（不含正文）。
+    全部扫描完、得到最终 idf 后统一打分，再只读取结果页中各条的正文生成摘要。
+    返回 {"hits": [...], "total": 命中总数, "has_more": 是否还有下一页}；
+    每条命中含 root、session_id、project、role、timestamp、ordinal（消息序号，与会话详情的消息下标一致）、
+    offset（该行在文件中的字节偏移）、snippet、score，以及 matches：消息文本中所有命中的 [(start, end)]。
+    多个数据根时各根并行扫描，再合并排序键与文档频率。
+    """
+    if isinstance(query, str):
+        query = parse_query(query)
+    stats = rank.BM25Stats(query.terms)
+    parts = []
+    for root, (files, candidates, df, docs) in _map_roots(_rank_root, query, roots=_query_roots(query), cpu=True):
+        parts.append((root, files, candidates))
+        stats.merge(df, docs)
+    total = sum(len(candidates) for _, _, candidates in parts)
+
+    idf = stats.idf()
+
+    def keyed():
+        for part, (_, files, candidates) in enumerate(parts):
+            times, docs, offsets = candidates.times, candidates.docs, candidates.offsets
+            for i, score in enumerate(candidates.scores(idf)):
+                yield (score, times[i], files[docs[i]][1], offsets[i]), part, i
+
+    page = heapq.nlargest(offset + limit, keyed(), key=lambda x: x[0])[offset:]
+
+    # 结果页各条的正文从所在文件的消息偏移表读取（偏移表按文件缓存，打开命中所在会话时直接复用）
+    indexes = {}
+    hits = []
+    for (score, _, session_id, pos), part, i in page:
+        root, files, candidates = parts[part]
+        path, _, project = files[candidates.docs[i]]
+        if path not in indexes:
+            try:
+                indexes[path] = message_index(path)
+            except OSError:
+                indexes[path] = None
+        index = indexes[path]
+        ordinal = index.ordinal_at(pos) if index is not None else None
+        if ordinal is None:
+            continue  # 扫描后文件被改写或删除
+        text = index.read(ordinal).content
+        spans = query.match_spans(text.lower())
+        hits.append({
+            "root": root.name,
+            "session_id": session_id,
+            "project": project,
+            "role": index.role(ordinal),
+            "timestamp": index.timestamp(ordinal),
+            "ordinal": ordinal,
+            "offset": pos,
+            "snippet": _context_at(text, *spans[0]) if spans else text[:150],
+            "score": round(score, 4),
+            "matches": spans,
+        })
+    return {"hits": hits, "total": total, "has_more": total > offset + limit}
+
+
+def _rank_root(root, query):
+    """在一个数据根上收集全部命中的排序键，返回 ([(路径, 会话 ID, 项目)], rank.Candidates, 各词文档频率, 扫描行数)"""
+    terms = query.terms
+    scan = {}
+    stats = rank.BM25Stats(terms)
+    candidates = rank.Candidates(len(terms))
+    files = []
+    doc = None
+    stamps = []  # 当前文件各命中的时间戳，换文件时一起解析（同一文件的时间集中，按分钟缓存的命中率高）
+    for path, session_id, project, pos, role, ts, text, text_lower in _scan_query(root, query, scan):
+        if doc is None or files[doc][0] != path:
+            candidates.times.extend(timebucket.parse_iso(stamps))
+            stamps.clear()
+            doc = len(files)
+            files.append((path, session_id, project))
+        tfs = rank.term_counts(text_lower, terms)
+        stats.add(tfs)
+        candidates.add(doc, pos, rank.tf_weights(tfs, len(text)))
+        stamps.append(ts)
+    candidates.times.extend(timebucket.parse_iso(stamps))
+    return files, candidates, stats.df, scan.get("lines", 0)
 
 
 def _extract_match_context(text, keyword_lower, context_chars=80):
@@ -260,8 +691,13 @@ def _extract_match_context(text, keyword_lower, context_chars=80):
     idx = text.lower().find(keyword_lower)
     if idx == -1:
         return text[:150]
-    start = max(0, idx - context_chars)
-    end = min(len(text), idx + len(keyword_lower) + context_chars)
+    return _context_at(text, idx, idx + len(keyword_lower), context_chars)
+
+
+def _context_at(text, match_start, match_end, context_chars=80):
+    """提取 text[match_start:match_end] 周围的上下文片段"""
+    start = max(0, match_start - context_chars)
+    end = min(len(text), match_end + context_chars)
     snippet = text[start:end]
     if start > 0:
         snippet = "..." + snippet
@@ -270,109 +706,588 @@ def _extract_match_context(text, keyword_lower, context_chars=80):
     return snippet
 
 
+@perf.timed()
 def delete_session(session_id):
     """删除会话文件"""
-    filepath = _find_session_file(session_id)
+    _, filepath = _find_session_file(session_id)
     if not filepath:
         return False
-    companion_dir = filepath.with_suffix("")
+    companion_dir = filepath.parent / _session_id(filepath)
     filepath.unlink()
+    _snapshot_cache.clear()
     if companion_dir.exists() and companion_dir.is_dir():
         import shutil
         shutil.rmtree(companion_dir)
     return True
 
 
+# ── 冷会话归档 ────────────────────────────────────────────
+
+ARCHIVE_AFTER_DAYS = 90
+
+
+def iter_archive_sessions(older_than_days=ARCHIVE_AFTER_DAYS, codec="gz", codex=False, dry_run=False):
+    """把各数据根中超过 older_than_days 天未修改的 .jsonl 会话压缩归档，逐个产出
+    {"root", "path", "archive", "size", "archived_size", "error"}
+
+    归档前确保文件有 zone 条目（没有时先扫描补建），归档后条目随文件迁移到新路径：
+    内容不变，按时间 / 模型过滤的扫描和统计因此可以直接跳过归档文件而无需解压。
+    """
+    for root in ROOTS:
+        yield from _archive_root(root, older_than_days, codec, codex, dry_run)
+
+
+def _archive_root(root, older_than_days, codec, codex, dry_run):
+    cutoff = datetime.now().timestamp() - older_than_days * 86400
+    snapshot = _snapshot(root)
+    # (快照中未归档的 .jsonl, 是否为 Claude 会话)
+    candidates = [(f, True) for files in snapshot.projects.values() for f in files if not archive.is_archived(f.name)]
+    if codex:
+        candidates += [(f, False) for _, f in snapshot.codex if not archive.is_archived(f.name)]
+    zone_map = _load_zone_map(root)
+    dirty = False
+    try:
+        for entry, claude in candidates:
+            f = entry.path
+            stat = entry.stat()
+            if stat.st_mtime >= cutoff:
+                continue
+            result = {"root": root.name, "path": f, "archive": None, "size": stat.st_size,
+                      "archived_size": None, "error": None}
+            if dry_run:
+                yield result
+                continue
+            key = str(f)
+            zone = None
+            if claude:
+                zone = _valid_zone(zone_map, key, stat)
+                if not zone or "models" not in zone:
+                    zone_stats = _ZoneStats()
+                    for obj in _iter_json(f):
+                        zone_stats.observe(obj)
+                    zone = zone_stats.entry(stat)
+            try:
+                target = archive.compress(f, codec)
+            except OSError as e:
+                result["error"] = str(e)
+                yield result
+                continue
+            _move_cached(zone_map, key, target, zone)
+            dirty = True
+            result["archive"] = target
+            result["archived_size"] = target.stat().st_size
+            yield result
+    finally:
+        if dirty:
+            _save_zone_map(root, zone_map)
+
+
+def restore_session(session_id):
+    """把归档的会话还原为 .jsonl（在 Claude Code 中继续该会话前需要还原），返回还原后的路径；
+    会话不存在或未归档时返回 None"""
+    root, filepath = _find_session_file(session_id)
+    if not filepath or not archive.is_archived(filepath):
+        return None
+    zone_map = _load_zone_map(root)
+    zone = zone_map.get(str(filepath))
+    target = archive.decompress(filepath)
+    _move_cached(zone_map, str(filepath), target, zone)
+    _save_zone_map(root, zone_map)
+    return target
+
+
+def restore_codex_session(filepath):
+    """还原归档的 Codex 会话文件，返回还原后的路径；不是归档文件时返回 None"""
+    p = Path(filepath)
+    if not p.exists() or not archive.is_archived(p):
+        return None
+    target = archive.decompress(p)
+    _move_cached({}, str(p), target, None)
+    return target
+
+
+def _move_cached(zone_map, key, target, zone):
+    """文件被压缩或解压后（内容不变）把 zone 条目迁移到新路径，并丢弃旧路径的消息偏移表与过期的快照"""
+    _snapshot_cache.clear()
+    zone_map.pop(key, None)
+    if zone:
+        stat = target.stat()
+        zone_map[str(target)] = dict(zone, mtime=stat.st_mtime, size=stat.st_size)
+    _message_index_cache.pop(key, None)
+
+
+# ── 消息偏移表 ────────────────────────────────────────────
+
+MESSAGE_INDEX_CACHE_SIZE = 32
+_ROLES = ["user", "assistant"]  # 角色按下标存储
+_message_index_cache = Cache(MESSAGE_INDEX_CACHE_SIZE, name="消息偏移表")  # str(path) → MessageIndex
+_message_index_lock = threading.Lock()
+# str(path) → 建立该文件偏移表时持有的锁；没有线程在建立时自动回收
+_message_index_builds = weakref.WeakValueDictionary()
+
+
+class MessageIndex:
+    """会话文件的消息偏移表：序号 → (字节偏移, 行长度, 角色, 时间戳)，序号与会话详情的消息下标一致
+
+    一次扫描建立，正文不驻留内存，读取时按偏移 seek；文件只是追加时在原表基础上继续扫描。
+    """
+
+    __slots__ = ("path", "source", "mtime", "size", "end", "head",
+                 "offsets", "lengths", "roles", "timestamps", "meta")
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = source
+        self.mtime = self.size = self.end = 0
+        self.head = None
+        self.offsets = array("q")
+        self.lengths = array("l")
+        self.roles = bytearray()
+        self.timestamps = []
+        self.meta = {}
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def role(self, i):
+        return _ROLES[self.roles[i]]
+
+    def timestamp(self, i):
+        return self.timestamps[i]
+
+    def ordinal_at(self, offset):
+        """字节偏移 → 消息序号；该偏移不是消息行时返回 None"""
+        i = bisect.bisect_left(self.offsets, offset)
+        return i if i < len(self.offsets) and self.offsets[i] == offset else None
+
+    def read(self, i):
+        return next(self.iter_messages(i, i + 1), None)
+
+    def iter_messages(self, start=0, stop=None):
+        """按序号读取 [start, stop) 的消息，只打开一次文件"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        parse = _codex_message if self.source == "codex" else _claude_message
+        with open_session(self.path) as fh:
+            for i in range(max(start, 0), stop):
+                fh.seek(self.offsets[i])
+                message = parse(json.loads(fh.read(self.lengths[i])))
+                yield message
+
+    def _scan(self, fh):
+        """从 self.end 继续扫描到最后一个完整行
+
+        文件末尾没有换行的行能解析时照常收录（写完最后一行但没有补换行的文件）；
+        解析失败的视为正在写入的半行，停在它之前，下次从这里续建。
+        """
+        claude = self.source != "codex"
+        meta = self.meta
+        offset = self.end
+        fh.seek(offset)
+        lines = 0
+        for raw in fh:
+            try:
+                obj = json.loads(raw)
+            except ValueError:
+                if not raw.endswith(b"\n"):
+                    break
+                obj = None
+            pos = offset
+            offset += len(raw)
+            lines += 1
+            if not isinstance(obj, dict):
+                continue
+            # 建表只需要角色，不构造 Message
+            if claude:
+                parts = _claude_parts(obj)
+                if obj.get("type") in ("user", "assistant"):
+                    if not meta.get("slug"):
+                        meta["slug"] = obj.get("slug")
+                    if not meta.get("cwd"):
+                        meta["cwd"] = obj.get("cwd")
+                    if parts and obj["type"] == "assistant" and not meta.get("model"):
+                        meta["model"] = obj.get("message", {}).get("model")
+            else:
+                parts = _codex_parts(obj)
+                if obj.get("type") == "session_meta":
+                    meta["cwd"] = obj.get("payload", {}).get("cwd", "")
+                elif obj.get("type") == "turn_context" and not meta.get("model"):
+                    meta["model"] = obj.get("payload", {}).get("model", "")
+            if parts is None:
+                continue
+            role = parts[0]
+            if role not in _ROLES:
+                _ROLES.append(role)
+            self.offsets.append(pos)
+            self.lengths.append(len(raw))
+            self.roles.append(_ROLES.index(role))
+            self.timestamps.append(obj.get("timestamp", ""))
+        self.end = offset
+        if perf.enabled:
+            perf.count("lines", lines)
+
+
+def _head_crc(fh, n):
+    fh.seek(0)
+    return zlib.crc32(fh.read(min(n, 1024)))
+
+
+@perf.timed()
+def message_index(filepath, source="claude"):
+    """获取（必要时建立或续建）会话文件的消息偏移表，最近使用的若干个缓存在内存中"""
+    key = str(filepath)
+    # 扫描在按文件区分的锁内进行，建立一个大文件的偏移表时不阻塞其他会话
+    with _message_index_lock:
+        build_lock = _message_index_builds.get(key)
+        if build_lock is None:
+            build_lock = _message_index_builds[key] = threading.Lock()
+    with build_lock:
+        index = _message_index_cache.peek(key)
+        with open_session(filepath) as fh:
+            stat = os.fstat(fh.fileno())
+            if index is not None and stat.st_mtime == index.mtime and stat.st_size == index.size:
+                perf.count("cache_hits")
+                return index
+            # 文件只是追加（开头未变）时接着上次的位置扫描，否则重建；归档文件不会追加
+            if index is None or archive.is_archived(filepath) or stat.st_size < index.end \
+                    or _head_crc(fh, index.end) != index.head:
+                index = MessageIndex(filepath, source)
+            index._scan(fh)
+            index.head = _head_crc(fh, index.end)
+            index.mtime, index.size = stat.st_mtime, stat.st_size
+            if perf.enabled:
+                perf.count("files")
+                perf.count("bytes", stat.st_size)
+        _message_index_cache.put(key, index)
+    return index
+
+
 # ── 数据分析采集 ──────────────────────────────────────────
 
 
-def collect_token_stats():
-    """遍历所有 JSONL，提取每条 assistant 消息的 token 用量"""
-    global _token_stats_cache
-    if _token_stats_cache is not None:
-        return _token_stats_cache
+@perf.timed()
+def collect_token_stats(since=None, until=None):
+    """遍历所有 JSONL，提取每条 assistant 消息的 token 用量。可选只统计 [since, until) 内的记录
+
+    指定时间范围时，借助文件 mtime 和 zone map（每个文件的最小/最大时间戳）跳过不可能命中的文件。
+    每条记录带 root；全量结果按数据根缓存，多个数据根时只有未缓存的根参与（并行）扫描。
+    """
+    since_iso, until_iso = _iso_utc(since), _iso_utc(until)
+    if since_iso is None and until_iso is None:
+        parts = _cached_roots(_token_stats_cache, _collect_token_stats, None, None)
+    else:
+        # 时间范围查询不写缓存：已缓存的根从缓存中过滤，其余按范围扫描
+        parts = {}
+        pending = []
+        for root in ROOTS:
+            cached = _token_stats_cache.peek(root.name)
+            if cached is None:
+                pending.append(root)
+                continue
+            perf.count("cache_hits")
+            parts[root.name] = [r for r in cached if _ts_in_range(r["timestamp"], since_iso, until_iso)]
+        for root, records in _map_roots(_collect_token_stats, since, until, roots=pending, cpu=True):
+            parts[root.name] = records
+    if len(ROOTS) == 1:
+        return parts[ROOTS[0].name]
+    return [r for root in ROOTS for r in parts[root.name]]
+
+
+def iter_token_stats(since=None, until=None, root=None):
+    """逐条产出 token 用量记录（字段同 collect_token_stats），可选只取名为 root 的数据根
+
+    已缓存全量结果的数据根从缓存中过滤，其余边扫描边产出（不写入缓存），内存占用与单个文件相当。
+    """
+    since_iso, until_iso = _iso_utc(since), _iso_utc(until)
+    for r in _roots(root):
+        cached = _token_stats_cache.peek(r.name)
+        if cached is None:
+            yield from _iter_token_stats(r, since, until)
+        else:
+            yield from (x for x in cached if _ts_in_range(x["timestamp"], since_iso, until_iso))
+
+
+def _collect_token_stats(root, since, until):
+    return list(_iter_token_stats(root, since, until))
+
+
+def _iter_token_stats(root, since, until):
+    since_iso, until_iso = _iso_utc(since), _iso_utc(until)
+    ranged = since_iso is not None or until_iso is not None
+    if not root.projects_dir.exists():
+        return
+
+    zone_map = _load_zone_map(root)
+    since_mtime = since.timestamp() if since else None
+    seen = set()
+    dirty = False
+    for dirname, files in _snapshot(root).projects.items():
+        for entry in files:
+            f = entry.path
+            key = str(f)
+            seen.add(key)
+            stat = entry.stat()
+            # 文件最后修改早于 since 时，其中不可能有更晚的记录
+            if since_mtime is not None and stat.st_mtime < since_mtime:
+                continue
+            zone = _valid_zone(zone_map, key, stat)
+            if zone and ranged and not _zone_overlaps(zone, since_iso, until_iso):
+                continue
+            session_id = _session_id(entry.name)
+            project = _get_project_display(root, dirname, session_id)
+            zone_stats = _ZoneStats()
+            for obj in _iter_json(f):
+                zone_stats.observe(obj)
+                if obj.get("type") != "assistant":
+                    continue
+                msg = obj.get("message", {})
+                usage = msg.get("usage")
+                if not usage:
+                    continue
+                ts = obj.get("timestamp", "")
+                if not _ts_in_range(ts, since_iso, until_iso):
+                    continue
+                yield {
+                    "root": root.name,
+                    "session_id": session_id,
+                    "project": project,
+                    "project_dirname": dirname,
+                    "model": msg.get("model", "unknown"),
+                    "timestamp": ts,
+                    "input_tokens": usage.get("input_tokens", 0),
+                    "output_tokens": usage.get("output_tokens", 0),
+                    "cache_creation_input_tokens": usage.get("cache_creation_input_tokens", 0),
+                    "cache_read_input_tokens": usage.get("cache_read_input_tokens", 0),
+                }
+            zone = zone_stats.entry(stat)
+            if zone_map.get(key) != zone:
+                zone_map[key] = zone
+                dirty = True
+
+    if not ranged:
+        # 全量扫描时顺便清理已删除文件的条目
+        for key in [k for k in zone_map if k not in seen]:
+            del zone_map[key]
+            dirty = True
+    if dirty:
+        _save_zone_map(root, zone_map)
+
+
+@perf.timed()
+def collect_session_activity(since=None, until=None):
+    """从各数据根的 history.jsonl 提取活动时间线，每条记录带 root。可选只保留 [since, until) 内的记录"""
+    since_ms = since.timestamp() * 1000 if since else None
+    until_ms = until.timestamp() * 1000 if until else None
+    if since_ms is None and until_ms is None:
+        parts = _cached_roots(_activity_cache, _collect_session_activity, None, None)
+    else:
+        parts = {}
+        pending = []
+        for root in ROOTS:
+            cached = _activity_cache.peek(root.name)
+            if cached is None:
+                pending.append(root)
+                continue
+            perf.count("cache_hits")
+            parts[root.name] = [r for r in cached if _ms_in_range(r["timestamp_ms"], since_ms, until_ms)]
+        for root, records in _map_roots(_collect_session_activity, since_ms, until_ms, roots=pending, cpu=True):
+            parts[root.name] = records
+    if len(ROOTS) == 1:
+        return parts[ROOTS[0].name]
+    return [r for root in ROOTS for r in parts[root.name]]
 
-    if not PROJECTS_DIR.exists():
-        return []
 
-    records = []
-    for proj_dir in PROJECTS_DIR.iterdir():
-        if not proj_dir.is_dir():
-            continue
-        for f in proj_dir.glob("*.jsonl"):
-            session_id = f.stem
-            project = _get_project_display(proj_dir.name, session_id)
-            with open(f, encoding="utf-8") as fh:
-                for line in fh:
-                    try:
-                        obj = json.loads(line)
-                    except json.JSONDecodeError:
-                        continue
-                    if obj.get("type") != "assistant":
-                        continue
-                    msg = obj.get("message", {})
-                    usage = msg.get("usage")
-                    if not usage:
-                        continue
-                    records.append({
-                        "session_id": session_id,
-                        "project": project,
-                        "project_dirname": proj_dir.name,
-                        "model": msg.get("model", "unknown"),
-                        "timestamp": obj.get("timestamp", ""),
-                        "input_tokens": usage.get("input_tokens", 0),
-                        "output_tokens": usage.get("output_tokens", 0),
-                        "cache_creation_input_tokens": usage.get("cache_creation_input_tokens", 0),
-                        "cache_read_input_tokens": usage.get("cache_read_input_tokens", 0),
-                    })
-    _token_stats_cache = records
-    return records
+def iter_session_activity(since=None, until=None, root=None):
+    """逐条产出活动记录（字段同 collect_session_activity），可选只取名为 root 的数据根"""
+    since_ms = since.timestamp() * 1000 if since else None
+    until_ms = until.timestamp() * 1000 if until else None
+    for r in _roots(root):
+        cached = _activity_cache.peek(r.name)
+        if cached is None:
+            yield from _iter_session_activity(r, since_ms, until_ms)
+        else:
+            yield from (x for x in cached if _ms_in_range(x["timestamp_ms"], since_ms, until_ms))
 
 
-def collect_session_activity():
-    """从 history.jsonl 提取活动时间线"""
-    global _activity_cache
-    if _activity_cache is not None:
-        return _activity_cache
+def _collect_session_activity(root, since_ms, until_ms):
+    return list(_iter_session_activity(root, since_ms, until_ms))
 
-    if not HISTORY_FILE.exists():
-        return []
 
-    records = []
-    for line in open(HISTORY_FILE, encoding="utf-8"):
-        try:
-            obj = json.loads(line)
-        except json.JSONDecodeError:
-            continue
+def _iter_session_activity(root, since_ms, until_ms):
+    if not root.history_file.exists():
+        return
+
+    for obj in _iter_json(root.history_file):
         ts = obj.get("timestamp")
         if not ts:
             continue
-        dt = datetime.fromtimestamp(ts / 1000)
-        records.append({
+        if not _ms_in_range(ts, since_ms, until_ms):
+            continue
+        yield {
+            "root": root.name,
             "session_id": obj.get("sessionId", ""),
             "project": obj.get("project", ""),
             "timestamp_ms": ts,
-            "hour": dt.hour,
-            "date": dt.strftime("%Y-%m-%d"),
-        })
-    _activity_cache = records
-    return records
+        }
+
+
+def _ms_in_range(ts_ms, since_ms, until_ms):
+    """判断毫秒时间戳是否落在 [since, until) 内"""
+    if since_ms is not None and ts_ms < since_ms:
+        return False
+    if until_ms is not None and ts_ms >= until_ms:
+        return False
+    return True
+
+
+# ── Zone map ─────────────────────────────────────────────
+
+
+def _load_zone_map(root):
+    """读取数据根持久化的 zone map（每个会话文件的 mtime / size / 最小与最大时间戳）"""
+    with _zone_map_lock:
+        zone_map = _zone_maps.get(root.name)
+        if zone_map is None:
+            zone_map = _zone_maps[root.name] = _read_zone_map(root)
+    return zone_map
+
+
+def _read_zone_map(root):
+    if root.zone_map_file.exists():
+        try:
+            with open(root.zone_map_file, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+
+def _save_zone_map(root, zone_map):
+    """原子写回调用方更新过的 zone map，写失败时静默忽略（下次重新扫描即可）"""
+    # 临时文件按进程和线程区分，并发保存同一个数据根时不会互相覆盖写到一半的内容
+    tmp = root.zone_map_file.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            # 先复制：其他线程的扫描可能正在更新同一个 zone map
+            json.dump(dict(zone_map), f, ensure_ascii=False)
+        tmp.replace(root.zone_map_file)
+    except OSError:
+        pass
+
+
+def _valid_zone(zone_map, key, stat):
+    """返回与文件当前 mtime / size 一致的 zone 条目，文件已变化则返回 None"""
+    zone = zone_map.get(key)
+    if zone and zone["mtime"] == stat.st_mtime and zone["size"] == stat.st_size:
+        return zone
+    return None
+
+
+class _ZoneStats:
+    """扫描文件时顺带统计 zone 条目：最小 / 最大时间戳和出现过的模型"""
+    __slots__ = ("min_ts", "max_ts", "models")
+
+    def __init__(self):
+        self.min_ts = None
+        self.max_ts = None
+        self.models = set()
+
+    def observe(self, obj):
+        ts = obj.get("timestamp")
+        if ts and isinstance(ts, str):
+            if self.min_ts is None or ts < self.min_ts:
+                self.min_ts = ts
+            if self.max_ts is None or ts > self.max_ts:
+                self.max_ts = ts
+        if obj.get("type") == "assistant":
+            msg = obj.get("message")
+            if isinstance(msg, dict) and msg.get("model"):
+                self.models.add(msg["model"])
+
+    def entry(self, stat):
+        return {"mtime": stat.st_mtime, "size": stat.st_size,
+                "min_ts": self.min_ts, "max_ts": self.max_ts, "models": sorted(self.models)}
+
+
+def _zone_overlaps(zone, since_iso, until_iso):
+    """zone 的 [min_ts, max_ts] 是否可能与 [since, until) 相交"""
+    if zone["min_ts"] is None:
+        return False
+    if since_iso is not None and zone["max_ts"][:19] < since_iso:
+        return False
+    if until_iso is not None and zone["min_ts"][:19] >= until_iso:
+        return False
+    return True
+
+
+# ── 时间范围 ──────────────────────────────────────────────
+
+
+def _iso_utc(dt):
+    """datetime → UTC ISO 字符串（秒精度），可与 JSONL 中的 timestamp 前 19 位直接比较。naive 视为本地时间"""
+    if dt is None:
+        return None
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def _ts_in_range(ts, since_iso, until_iso):
+    """判断 ISO timestamp 是否落在 [since, until) 内；无时间戳的记录仅在不限范围时保留"""
+    if since_iso is None and until_iso is None:
+        return True
+    if not ts:
+        return False
+    t = ts[:19]
+    if since_iso is not None and t < since_iso:
+        return False
+    if until_iso is not None and t >= until_iso:
+        return False
+    return True
 
 
 # ── Codex 会话管理 ──────────────────────────────────────────
 
+# 会话可能跨越午夜、分区按本地日期命名而时间戳是 UTC，因此 since 侧多保留一天的分区
+CODEX_PARTITION_SLACK_DAYS = 1
+
+
+def _iter_codex_files(root, since=None, until=None):
+    """产出数据根快照中的 Codex 会话文件（fssnapshot.File），按 sessions/YYYY/MM/DD 分区剪枝，范围外的分区不会被打开
 
-def list_codex_sessions():
-    """列出所有 Codex 会话文件"""
-    if not CODEX_SESSIONS_DIR.exists():
-        return []
+    since / until 为 datetime（naive 视为本地时间）。不符合分区结构的目录中的文件总是包含。
+    注意：超过 CODEX_PARTITION_SLACK_DAYS 后才被续写的旧会话不会出现在 since 之后的结果中。
+    """
+    lo = hi = None
+    if since:
+        d = (since.astimezone() - timedelta(days=CODEX_PARTITION_SLACK_DAYS)).date()
+        lo = (d.year, d.month, d.day)
+    if until:
+        d = until.astimezone().date()
+        hi = (d.year, d.month, d.day)
+    yield from _snapshot(root).codex_files(lo, hi)
 
+
+@perf.timed()
+def list_codex_sessions(since=None, until=None):
+    """列出 Codex 会话文件，每项带 root，按修改时间倒序。可选按时间范围过滤（会话起始分区 ≤ until 且最后修改 ≥ since）"""
+    results = []
+    for _, part in _map_roots(_list_codex_sessions, since, until):
+        results.extend(part)
+    if len(ROOTS) > 1:
+        results.sort(key=lambda r: r["modified"], reverse=True)
+    return results
+
+
+def _list_codex_sessions(root, since, until):
+    since_ts = since.timestamp() if since else None
     results = []
-    for f in sorted(CODEX_SESSIONS_DIR.rglob("*.jsonl"), key=lambda p: p.stat().st_mtime, reverse=True):
-        session_id = f.stem
-        stat = f.stat()
+    for entry in sorted(_iter_codex_files(root, since, until), key=lambda f: f.stat().st_mtime, reverse=True):
+        f = entry.path
+        session_id = _session_id(entry.name)
+        stat = entry.stat()
+        if since_ts is not None and stat.st_mtime < since_ts:
+            continue
         meta = _parse_codex_meta(f)
         results.append({
+            "root": root.name,
             "session_id": session_id,
             "path": f,
             "cwd": meta.get("cwd", ""),
@@ -380,6 +1295,7 @@ def list_codex_sessions():
             "title": meta.get("first_user_msg", session_id[:30]),
             "modified": datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M"),
             "size_kb": round(stat.st_size / 1024, 1),
+            "archived": archive.is_archived(f),
         })
     return results
 
@@ -387,59 +1303,42 @@ def list_codex_sessions():
 def _parse_codex_meta(filepath):
     """快速解析 Codex session 文件的元信息"""
     meta = {}
-    with open(filepath, encoding="utf-8") as f:
-        for line in f:
-            try:
-                obj = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-            if obj.get("type") == "session_meta":
-                payload = obj.get("payload", {})
-                meta["cwd"] = payload.get("cwd", "")
-                meta["id"] = payload.get("id", "")
-            if obj.get("type") == "turn_context":
-                payload = obj.get("payload", {})
-                meta["model"] = payload.get("model", "")
-            if obj.get("type") == "event_msg":
-                payload = obj.get("payload", {})
-                if payload.get("type") == "user_message" and "first_user_msg" not in meta:
-                    msg = payload.get("message", "")
-                    if msg and not msg.startswith("/"):
-                        meta["first_user_msg"] = msg[:80]
-            if "cwd" in meta and "model" in meta and "first_user_msg" in meta:
-                break
+    for obj in _iter_json(filepath):
+        if obj.get("type") == "session_meta":
+            payload = obj.get("payload", {})
+            meta["cwd"] = payload.get("cwd", "")
+            meta["id"] = payload.get("id", "")
+        if obj.get("type") == "turn_context":
+            payload = obj.get("payload", {})
+            meta["model"] = payload.get("model", "")
+        if obj.get("type") == "event_msg":
+            payload = obj.get("payload", {})
+            if payload.get("type") == "user_message" and "first_user_msg" not in meta:
+                msg = payload.get("message", "")
+                if msg and not msg.startswith("/"):
+                    meta["first_user_msg"] = msg[:80]
+        if "cwd" in meta and "model" in meta and "first_user_msg" in meta:
+            break
     return meta
 
 
+@perf.timed()
 def get_codex_session_detail(filepath):
     """解析 Codex session 文件，返回消息列表和元信息"""
     messages = []
     model = None
     cwd = None
 
-    with open(filepath, encoding="utf-8") as f:
-        for line in f:
-            try:
-                obj = json.loads(line)
-            except json.JSONDecodeError:
-                continue
+    for obj in _iter_json(filepath):
+        if obj.get("type") == "session_meta":
+            cwd = obj.get("payload", {}).get("cwd", "")
 
-            if obj.get("type") == "session_meta":
-                cwd = obj.get("payload", {}).get("cwd", "")
-
-            if obj.get("type") == "turn_context" and not model:
-                model = obj.get("payload", {}).get("model", "")
+        if obj.get("type") == "turn_context" and not model:
+            model = obj.get("payload", {}).get("model", "")
 
-            if obj.get("type") == "event_msg":
-                payload = obj.get("payload", {})
-                if payload.get("type") == "user_message":
-                    text = payload.get("message", "")
-                    if text.strip():
-                        messages.append({"role": "user", "content": text})
-                elif payload.get("type") == "agent_message":
-                    text = payload.get("message", "")
-                    if text.strip():
-                        messages.append({"role": "assistant", "content": text})
+        message = _codex_message(obj)
+        if message is not None:
+            messages.append(message)
 
     return {
         "messages": messages,
@@ -449,86 +1348,121 @@ def get_codex_session_detail(filepath):
     }
 
 
+def _codex_parts(obj):
+    """从一行 Codex 记录中取出用户 / 助手消息的 (角色, 正文)；其他记录返回 None"""
+    if obj.get("type") != "event_msg":
+        return None
+    payload = obj.get("payload", {})
+    role = {"user_message": "user", "agent_message": "assistant"}.get(payload.get("type"))
+    text = payload.get("message", "")
+    if role is None or not isinstance(text, str) or not text.strip():
+        return None
+    return role, text
+
+
+def _codex_message(obj):
+    parts = _codex_parts(obj)
+    return Message(*parts) if parts else None
+
+
 def delete_codex_session(filepath):
     """删除 Codex 会话文件"""
     p = Path(filepath)
     if p.exists():
         p.unlink()
+        _snapshot_cache.clear()
         return True
     return False
 
 
-def collect_codex_token_stats():
-    """遍历所有 Codex JSONL，提取每次请求的 token 用量"""
-    if not CODEX_SESSIONS_DIR.exists():
-        return []
-
+@perf.timed()
+def collect_codex_token_stats(since=None, until=None):
+    """遍历各数据根的 Codex JSONL，提取每次请求的 token 用量（带 root）。可选只统计 [since, until) 内的记录"""
     records = []
-    for f in CODEX_SESSIONS_DIR.rglob("*.jsonl"):
-        session_id = f.stem
-        model = None
-        cwd = None
-        with open(f, encoding="utf-8") as fh:
-            for line in fh:
-                try:
-                    obj = json.loads(line)
-                except json.JSONDecodeError:
-                    continue
-                if obj.get("type") == "session_meta":
-                    cwd = obj.get("payload", {}).get("cwd", "")
-                if obj.get("type") == "turn_context" and not model:
-                    model = obj.get("payload", {}).get("model", "")
-                if obj.get("type") == "event_msg":
-                    payload = obj.get("payload", {})
-                    if payload.get("type") == "token_count":
-                        info = payload.get("info")
-                        if not info:
-                            continue
-                        usage = info.get("last_token_usage", {})
-                        if not usage or usage.get("input_tokens", 0) == 0:
-                            continue
-                        ts = obj.get("timestamp", "")
-                        records.append({
-                            "session_id": session_id,
-                            "project": cwd or "",
-                            "model": model or "unknown",
-                            "timestamp": ts,
-                            "input_tokens": usage.get("input_tokens", 0),
-                            "output_tokens": usage.get("output_tokens", 0),
-                            "cached_input_tokens": usage.get("cached_input_tokens", 0),
-                            "reasoning_output_tokens": usage.get("reasoning_output_tokens", 0),
-                        })
+    for _, part in _map_roots(_collect_codex_token_stats, since, until, cpu=True):
+        records.extend(part)
     return records
 
 
-def collect_codex_activity():
-    """从 Codex session 文件提取活动时间线"""
-    if not CODEX_SESSIONS_DIR.exists():
-        return []
+def iter_codex_token_stats(since=None, until=None, root=None):
+    """逐条产出 Codex token 用量记录（字段同 collect_codex_token_stats），可选只取名为 root 的数据根"""
+    for r in _roots(root):
+        yield from _iter_codex_token_stats(r, since, until)
+
+
+def _collect_codex_token_stats(root, since, until):
+    return list(_iter_codex_token_stats(root, since, until))
+
+
+def _iter_codex_token_stats(root, since, until):
+    since_iso, until_iso = _iso_utc(since), _iso_utc(until)
+    for entry in _iter_codex_files(root, since, until):
+        f = entry.path
+        session_id = _session_id(entry.name)
+        model = None
+        cwd = None
+        for obj in _iter_json(f):
+            if obj.get("type") == "session_meta":
+                cwd = obj.get("payload", {}).get("cwd", "")
+            if obj.get("type") == "turn_context" and not model:
+                model = obj.get("payload", {}).get("model", "")
+            if obj.get("type") == "event_msg":
+                payload = obj.get("payload", {})
+                if payload.get("type") == "token_count":
+                    info = payload.get("info")
+                    if not info:
+                        continue
+                    usage = info.get("last_token_usage", {})
+                    if not usage or usage.get("input_tokens", 0) == 0:
+                        continue
+                    ts = obj.get("timestamp", "")
+                    if not _ts_in_range(ts, since_iso, until_iso):
+                        continue
+                    yield {
+                        "root": root.name,
+                        "session_id": session_id,
+                        "project": cwd or "",
+                        "model": model or "unknown",
+                        "timestamp": ts,
+                        "input_tokens": usage.get("input_tokens", 0),
+                        "output_tokens": usage.get("output_tokens", 0),
+                        "cached_input_tokens": usage.get("cached_input_tokens", 0),
+                        "reasoning_output_tokens": usage.get("reasoning_output_tokens", 0),
+                    }
 
+
+@perf.timed()
+def collect_codex_activity(since=None, until=None):
+    """从各数据根的 Codex session 文件提取活动时间线（带 root）。可选只保留 [since, until) 内的记录"""
     records = []
-    for f in CODEX_SESSIONS_DIR.rglob("*.jsonl"):
-        session_id = f.stem
-        with open(f, encoding="utf-8") as fh:
-            for line in fh:
-                try:
-                    obj = json.loads(line)
-                except json.JSONDecodeError:
-                    continue
-                if obj.get("type") == "event_msg":
-                    payload = obj.get("payload", {})
-                    if payload.get("type") == "user_message":
-                        ts = obj.get("timestamp", "")
-                        if ts:
-                            # ISO 格式: 2026-02-23T08:14:26.822Z
-                            try:
-                                dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-                                records.append({
-                                    "session_id": session_id,
-                                    "timestamp": ts,
-                                    "hour": dt.hour,
-                                    "date": dt.strftime("%Y-%m-%d"),
-                                })
-                            except (ValueError, AttributeError):
-                                continue
+    for _, part in _map_roots(_collect_codex_activity, since, until, cpu=True):
+        records.extend(part)
     return records
+
+
+def iter_codex_activity(since=None, until=None, root=None):
+    """逐条产出 Codex 活动记录（字段同 collect_codex_activity），可选只取名为 root 的数据根"""
+    for r in _roots(root):
+        yield from _iter_codex_activity(r, since, until)
+
+
+def _collect_codex_activity(root, since, until):
+    return list(_iter_codex_activity(root, since, until))
+
+
+def _iter_codex_activity(root, since, until):
+    since_iso, until_iso = _iso_utc(since), _iso_utc(until)
+    for entry in _iter_codex_files(root, since, until):
+        session_id = _session_id(entry.name)
+        for obj in _iter_json(entry.path):
+            if obj.get("type") == "event_msg":
+                payload = obj.get("payload", {})
+                if payload.get("type") == "user_message":
+                    ts = obj.get("timestamp", "")
+                    # ISO 格式: 2026-02-23T08:14:26.822Z，按时区分桶由 timebucket 统一处理
+                    if ts and isinstance(ts, str) and _ts_in_range(ts, since_iso, until_iso):
+                        yield {
+                            "root": root.name,
+                            "session_id": session_id,
+                            "timestamp": ts,
+                        }
@@ -1,41 +1,49 @@
+from . import perf
 from .config import EXPORTS_DIR
-from .db import get_session_detail
+from .db import get_session_index
 
 
-def export_session(session_id):
-    """导出会话为 Markdown 文件"""
-    data = get_session_detail(session_id)
-    if not data:
-        return None
+def markdown_filename(session_id, meta):
+    """导出文件名：会话 ID 前 8 位加标题，去掉文件系统不允许的字符"""
+    title = meta.get("slug") or session_id[:8]
+    filename = f"{session_id[:8]}_{title}.md"
+    for ch in r'<>:"/\|?*':
+        filename = filename.replace(ch, "_")
+    return filename
+
 
-    messages = data["messages"]
-    title = data.get("slug") or session_id[:8]
-    model = data.get("model") or "unknown"
-    project = data.get("project") or "unknown"
+def iter_markdown(index, session_id):
+    """逐段产出会话的 Markdown 文本，按消息偏移表逐条读取"""
+    meta = index.meta
+    title = meta.get("slug") or session_id[:8]
+    model = meta.get("model") or "unknown"
+    project = meta.get("project") or "unknown"
 
-    lines = [
+    header = [
         f"# {title}",
         "",
         f"> Project: {project}",
         f"> Model: {model}",
-        f"> Messages: {len(messages)}",
+        f"> Messages: {len(index)}",
         "",
         "---",
     ]
+    yield "\n".join(header)
+    for msg in index.iter_messages():
+        role_label = "User" if msg.role == "user" else "Assistant"
+        yield f"\n\n## {role_label}\n\n{msg.content}\n\n---"
+    yield "\n"
 
-    for msg in messages:
-        role_label = "User" if msg["role"] == "user" else "Assistant"
-        lines.append("")
-        lines.append(f"## {role_label}")
-        lines.append("")
-        lines.append(msg["content"])
-        lines.append("")
-        lines.append("---")
 
-    content = "\n".join(lines) + "\n"
-    filename = f"{session_id[:8]}_{title}.md"
-    for ch in r'<>:"/\|?*':
-        filename = filename.replace(ch, "_")
-    filepath = EXPORTS_DIR / filename
-    filepath.write_text(content, encoding="utf-8")
+@perf.timed()
+def export_session(session_id):
+    """导出会话为 Markdown 文件。按消息偏移表逐条读取并写出，内存占用与单条消息大小相当"""
+    index = get_session_index(session_id)
+    if index is None:
+        return None
+
+    filepath = EXPORTS_DIR / markdown_filename(session_id, index.meta)
+    with open(filepath, "w", encoding="utf-8") as f:
+        for part in iter_markdown(index, session_id):
+            f.write(part)
     return filepath
@@ -0,0 +1,118 @@
+"""数据根的文件系统快照
+
+用 os.scandir 一次遍历 projects/ 与 Codex sessions/，记下每个会话文件的目录项，
+db 的列表、查找、搜索、统计与归档都从快照取文件清单，不再各自 iterdir / glob / exists。
+文件的 stat（大小、mtime、inode）第一次用到时取得并随快照复用，之后不再重复 stat；
+Windows 上 scandir 的目录项自带 stat 信息，不需要额外的系统调用。网络挂载的家目录上收益最明显。
+
+快照由 db 按数据根缓存，刷新（db.clear_caches）时丢弃、下次访问时重建，
+因此期间新建或修改的会话要到刷新后才反映在列表中（按会话 ID 查找不到时 db 会重建一次快照）。
+"""
+import bisect
+import os
+from pathlib import Path
+
+from . import archive, perf
+
+# Codex 分区目录 sessions/YYYY/MM/DD 各层的取值范围
+_PARTITION_RANGES = ((1, 9999), (1, 12), (1, 31))
+
+
+class File:
+    """快照中的一个会话文件"""
+
+    __slots__ = ("path", "name", "_entry")
+
+    def __init__(self, entry):
+        self.path = Path(entry.path)
+        self.name = entry.name
+        self._entry = entry
+
+    def __repr__(self):
+        return f"File({str(self.path)!r})"
+
+    def stat(self):
+        """文件的 os.stat_result，第一次调用后缓存在目录项中"""
+        return self._entry.stat()
+
+
+def _scandir(path):
+    """目录下的全部目录项；目录不存在或无法读取时视为空"""
+    try:
+        with os.scandir(path) as it:
+            return list(it)
+    except OSError:
+        return []
+
+
+class Snapshot:
+    """一个数据根的快照"""
+
+    def __init__(self, root):
+        self.root = root
+        self.projects = {}  # 项目目录名 → [File]，均为目录遍历顺序
+        self.codex = []  # [(分区前缀, File)]，分区前缀为 (年, 月, 日) 中由目录确定的部分
+        self._ids = None  # 按会话 ID 排序的 ID 列表与对应的 (项目目录名, File)，查找时才建立
+        self._found = None
+        for entry in _scandir(root.projects_dir):
+            if entry.is_dir():
+                self.projects[entry.name] = [File(e) for e in _scandir(entry.path)
+                                             if archive.is_session_file(e.name)]
+        self._walk_codex(root.codex_sessions_dir, (), True)
+
+    def _walk_codex(self, path, prefix, partitioned):
+        """递归遍历 Codex 目录；不符合 YYYY/MM/DD 结构的目录及其子目录沿用上层已确定的前缀"""
+        depth = len(prefix)
+        for entry in _scandir(path):
+            if entry.is_dir():
+                if partitioned and depth < 3:
+                    low, high = _PARTITION_RANGES[depth]
+                    n = int(entry.name) if entry.name.isdigit() else None
+                    if n is not None and low <= n <= high:
+                        self._walk_codex(entry.path, prefix + (n,), True)
+                        continue
+                self._walk_codex(entry.path, prefix, False)
+            elif archive.is_session_file(entry.name):
+                self.codex.append((prefix, File(entry)))
+
+    def files(self):
+        """全部会话文件（Claude 与 Codex）"""
+        for files in self.projects.values():
+            yield from files
+        for _, f in self.codex:
+            yield f
+
+    def codex_files(self, lo=None, hi=None):
+        """Codex 会话文件，按分区 (年, 月, 日) 只保留 [lo, hi] 内的；不在分区目录中的文件总是保留"""
+        for prefix, f in self.codex:
+            n = len(prefix)
+            if (lo and prefix < lo[:n]) or (hi and prefix > hi[:n]):
+                continue
+            yield f
+
+    def find(self, session_id):
+        """按会话 ID 查找，完全匹配优先，其次取 ID 最小的前缀匹配；返回 (项目目录名, File) 或 None
+
+        同一会话同时存在未压缩与归档文件时按 archive.SESSION_SUFFIXES 的顺序优先。
+        """
+        if self._ids is None:
+            items = sorted(
+                ((archive.session_id(f.name), _suffix_rank(f.name), i, dirname, f)
+                 for i, (dirname, f) in enumerate((d, f) for d, files in self.projects.items() for f in files)),
+                key=lambda x: x[:3])
+            self._found = [(dirname, f) for _, _, _, dirname, f in items]
+            self._ids = [x[0] for x in items]
+        i = bisect.bisect_left(self._ids, session_id)
+        if i < len(self._ids) and self._ids[i].startswith(session_id):
+            return self._found[i]
+        return None
+
+
+def _suffix_rank(name):
+    return next(i for i, s in enumerate(archive.SESSION_SUFFIXES) if name.endswith(s))
+
+
+@perf.timed()
+def scan(root):
+    """遍历数据根，返回新的 Snapshot"""
+    return Snapshot(root)
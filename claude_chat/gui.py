@@ -1,11 +1,57 @@
-import threading
+import json
+import os
 import subprocess
 import sys
 from pathlib import Path
 import tkinter as tk
 import customtkinter as ctk
-from claude_chat import db
+from claude_chat import archive, db, memory, perf, tasks
+from claude_chat.client import Client, backend
+from claude_chat.config import MULTI_ROOT, SIDEBAR_SNAPSHOT_FILE
 from claude_chat.export import export_session
+from claude_chat.query import parse_query, QueryError
+from claude_chat.watchdog import StallWatchdog, tracked
+
+SEARCH_PAGE_SIZE = 50
+DETAIL_PAGE = 200  # 详情每次渲染 / 加载的消息条数
+DETAIL_MAX_WINDOW = 600  # 详情中同时保留的最多消息条数
+FOLLOW_POLL_MS = 1000  # 跟随模式的轮询间隔，也是界面追加新消息的最高频率
+MEMORY_POLL_MS = 2000  # 状态栏缓存内存用量的刷新间隔
+
+
+def _session_matches(messages, query):
+    """按顺序遍历 messages，计算会话中所有命中 [(消息序号, 起始, 结束)]，偏移换算为 Tk 文本的字符单位"""
+    result = []
+    for i, msg in enumerate(messages):
+        text = msg.content
+        spans = query.match_spans(text.lower())
+        if spans and tk.TkVersion < 9 and not text.isascii():
+            spans = _utf16_spans(text, spans)
+        result.extend((i, a, b) for a, b in spans)
+    return result
+
+
+def _utf16_spans(text, spans):
+    """Tk 8.6 内部按 UTF-16 计数，BMP 以外的字符（如 emoji）占两个位置"""
+    out = []
+    extra = pos = 0
+    for a, b in spans:
+        extra += sum(1 for c in text[pos:a] if ord(c) > 0xFFFF)
+        a2 = a + extra
+        extra += sum(1 for c in text[a:b] if ord(c) > 0xFFFF)
+        out.append((a2, b + extra))
+        pos = b
+    return out
+
+
+def _project_key(project):
+    """项目的唯一标识：不同数据根下可能有同名项目目录"""
+    return project.get("root"), project["dirname"]
+
+
+def _root_prefix(record):
+    """多数据根时在列表标签前显示数据根名"""
+    return f"[{record.get('root', '')}] " if MULTI_ROOT else ""
 
 
 class App(ctk.CTk):
@@ -32,11 +78,20 @@ class App(ctk.CTk):
         ctk.set_appearance_mode("dark")
         ctk.set_default_color_theme("blue")
 
-        self._current_project = None
+        self._current_project = None  # 选中项目的 (数据根名, 目录名)
         self._current_session_id = None
         self._current_codex_path = None  # Codex 选中的文件路径
         self._project_buttons = []
         self._session_buttons = []
+        self._projects = []  # 最近一次渲染的 Claude 项目列表，退出时写入快照
+        self._sessions = []  # 当前项目的会话列表
+        self._more_button = None  # 搜索结果末尾的"加载更多"
+        self._search_seq = 0  # 每次新搜索递增，丢弃过期的结果页
+        # 后台任务：同一 key 的新任务取代旧任务，过期结果不会覆盖新结果。
+        # key "sidebar" 为项目 / Codex 会话列表，"sessions" 为会话列表与搜索结果，"detail" 为详情
+        self.tasks = tasks.Scheduler(self)
+        self._detail = None  # 当前详情对应的 (文件路径, "claude" / "codex")
+        self._follow = None  # 跟随模式状态：{"path", "source", "offset", "seen", "busy"}
         self._source = "claude"  # "claude" or "codex"
 
         self.grid_rowconfigure(1, weight=1)
@@ -49,13 +104,85 @@ class App(ctk.CTk):
         self._build_statusbar()
 
         self.bind("<Control-f>", lambda e: self._search_entry.focus_set())
+        self.bind("<F3>", lambda e: self._step_match(1))
+        self.bind("<Shift-F3>", lambda e: self._step_match(-1))
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+
+        # 主线程卡顿监测，超过阈值时把调用栈写入日志
+        self._watchdog = StallWatchdog(self)
+        self._watchdog.start()
+
+        # 先用上次退出时的快照渲染侧边栏，再在后台与磁盘对账
+        snapshot = self._read_snapshot()
+        if snapshot:
+            self._render_projects(snapshot["projects"])
+            project = snapshot.get("current_project")
+            project = tuple(project) if isinstance(project, list) else None
+            if project and any(_project_key(p) == project for p in snapshot["projects"]):
+                self._highlight_project(project)
+                self._current_project = project
+                self._render_sessions(snapshot.get("sessions", []))
+            self._status_label.configure(text="同步中...")
+        else:
+            self._status_label.configure(text="加载中...")
+        self.tasks.submit(self._initial_load, self._current_project, key="sidebar",
+                          on_done=lambda result: self._apply_initial_load(*result))
 
-        self._status_label.configure(text="加载中...")
-        threading.Thread(target=self._initial_load, daemon=True).start()
+    def _initial_load(self, project):
+        projects = backend().list_projects()
+        sessions = backend().list_sessions(project[1], project[0]) if project else None
+        return projects, project, sessions
 
-    def _initial_load(self):
-        projects = db.list_projects()
-        self.after(0, lambda: self._render_projects(projects))
+    @tracked
+    def _apply_initial_load(self, projects, project, sessions):
+        self._render_projects(projects)
+        if sessions is not None and self._current_project == project:
+            if any(_project_key(p) == project for p in projects):
+                self._render_sessions(sessions)
+            else:
+                self._current_project = None
+                self._render_sessions([])
+
+    # ── 侧边栏快照 ────────────────────────────────────────
+
+    def _read_snapshot(self):
+        """读取上次退出时保存的侧边栏快照，不存在或损坏时返回 None"""
+        try:
+            with open(SIDEBAR_SNAPSHOT_FILE, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(snapshot, dict) or not isinstance(snapshot.get("projects"), list):
+            return None
+        return snapshot
+
+    def _write_snapshot(self):
+        """保存当前项目列表和选中项目的会话列表（只保留渲染所需字段）"""
+        snapshot = {
+            "projects": [
+                {k: p.get(k) for k in ("root", "dirname", "display_name", "session_count")}
+                for p in self._projects
+            ],
+            "current_project": self._current_project if self._source == "claude" else None,
+            "sessions": [
+                {k: s[k] for k in ("session_id", "title")}
+                for s in self._sessions
+            ] if self._source == "claude" and self._current_project else [],
+        }
+        tmp = SIDEBAR_SNAPSHOT_FILE.with_suffix(".tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            tmp.replace(SIDEBAR_SNAPSHOT_FILE)
+        except OSError:
+            pass
+
+    def _on_close(self):
+        self._watchdog.stop()
+        self.tasks.shutdown()
+        if self._projects:
+            self._write_snapshot()
+        self.destroy()
 
     # ── UI 构建 ──────────────────────────────────────────
 
@@ -72,7 +199,7 @@ class App(ctk.CTk):
         self._source_switch.set("Claude Code")
         self._source_switch.grid(row=0, column=0, padx=(5, 8), pady=5)
 
-        self._search_entry = ctk.CTkEntry(toolbar, placeholder_text="搜索消息内容...")
+        self._search_entry = ctk.CTkEntry(toolbar, placeholder_text="搜索消息内容...  支持 \"短语\" -排除 OR role: project: model: after: before:")
         self._search_entry.grid(row=0, column=1, sticky="ew", padx=(2, 2), pady=5)
         self._search_entry.bind("<Return>", lambda e: self._on_search())
 
@@ -81,6 +208,8 @@ class App(ctk.CTk):
             ("导出", self._on_export),
             ("删除", self._on_delete),
             ("分析", self._on_analytics),
+            ("监控", self._on_watchlist),
+            ("性能", self._on_perf),
             ("刷新", self._on_refresh),
         ], start=2):
             ctk.CTkButton(toolbar, text=text, width=60, command=cmd).grid(
@@ -122,24 +251,64 @@ class App(ctk.CTk):
         )
         self._info_label.grid(row=0, column=0, sticky="ew", padx=8, pady=(6, 2))
 
+        # 搜索命中导航（有命中时显示）
+        self._match_bar = ctk.CTkFrame(content, fg_color="transparent")
+        self._match_bar.grid(row=0, column=1, sticky="e", padx=8, pady=(6, 2))
+        self._match_label = ctk.CTkLabel(self._match_bar, text="", font=ctk.CTkFont(size=11))
+        self._match_label.pack(side="left", padx=(0, 6))
+        for text, step in (("▲", -1), ("▼", 1)):
+            ctk.CTkButton(self._match_bar, text=text, width=28, height=24,
+                          command=lambda d=step: self._step_match(d)).pack(side="left", padx=1)
+        self._match_bar.grid_remove()
+
+        self._follow_var = ctk.BooleanVar(value=False)
+        ctk.CTkSwitch(content, text="跟随", variable=self._follow_var, width=60,
+                      font=ctk.CTkFont(size=11), command=self._on_follow_toggle).grid(
+            row=0, column=2, sticky="e", padx=8, pady=(6, 2))
+        self._matches = []  # [(起始 index, 结束 index)]，Tk 文本索引
+        self._match_pos = 0
+
         # 消息内容
         self._textbox = ctk.CTkTextbox(content, wrap="word", state="disabled",
                                         font=ctk.CTkFont(size=13))
-        self._textbox.grid(row=1, column=0, sticky="nsew", padx=4, pady=(0, 4))
+        self._textbox.grid(row=1, column=0, columnspan=3, sticky="nsew", padx=4, pady=(0, 4))
 
         # 配置角色颜色 tag
         tw = self._textbox._textbox
         tw.tag_configure("role_user", foreground="#5dade2", font=("Consolas", 13, "bold"))
         tw.tag_configure("role_assistant", foreground="#58d68d", font=("Consolas", 13, "bold"))
         tw.tag_configure("separator", foreground="#555555")
+        tw.tag_configure("match", background="#7d6608")
+        tw.tag_configure("match_current", background="#d68910", foreground="black")
+        tw.tag_raise("match_current", "match")
+        for tag, step in (("load_prev", -1), ("load_next", 1)):
+            tw.tag_configure(tag, foreground="#5dade2", underline=True)
+            tw.tag_bind(tag, "<Button-1>", lambda e, d=step: self._shift_window(d))
+            tw.tag_bind(tag, "<Enter>", lambda e: self._textbox._textbox.configure(cursor="hand2"))
+            tw.tag_bind(tag, "<Leave>", lambda e: self._textbox._textbox.configure(cursor=""))
 
     def _build_statusbar(self):
-        self._status_label = ctk.CTkLabel(self, text="就绪", anchor="w",
+        bar = ctk.CTkFrame(self, fg_color="transparent")
+        bar.grid(row=2, column=0, columnspan=2, sticky="ew", padx=10, pady=(0, 4))
+        self._status_label = ctk.CTkLabel(bar, text="就绪", anchor="w",
+                                           font=ctk.CTkFont(size=11))
+        self._status_label.pack(side="left", fill="x", expand=True)
+        # 本进程缓存的估算内存用量与预算（见 claude_chat.memory）
+        self._memory_label = ctk.CTkLabel(bar, text="", anchor="e", text_color="gray60",
                                            font=ctk.CTkFont(size=11))
-        self._status_label.grid(row=2, column=0, columnspan=2, sticky="ew", padx=10, pady=(0, 4))
+        self._memory_label.pack(side="right")
+        self._update_memory_label()
+
+    def _update_memory_label(self):
+        used, limit = memory.total() >> 20, memory.budget() >> 20
+        text = f"缓存 {used} / {limit} MB" if limit else f"缓存 {used} MB"
+        if self._memory_label.cget("text") != text:
+            self._memory_label.configure(text=text)
+        self.after(MEMORY_POLL_MS, self._update_memory_label)
 
     # ── 数据源切换 ────────────────────────────────────────
 
+    @tracked
     def _on_source_switch(self, value):
         self._clear_content()
         if value == "Claude Code":
@@ -155,16 +324,18 @@ class App(ctk.CTk):
             self._current_session_id = None
             self._current_codex_path = None
             self._status_label.configure(text="加载 Codex 会话...")
-            threading.Thread(target=self._load_codex_sessions, daemon=True).start()
+            self._load_codex_sessions()
 
     def _clear_content(self):
         """清空侧边栏和内容区"""
+        self._cancel_loads()
         for btn in self._project_buttons:
             btn.destroy()
         self._project_buttons.clear()
         for btn in self._session_buttons:
             btn.destroy()
         self._session_buttons.clear()
+        self._set_more_button(None)
         self._current_project = None
         self._current_session_id = None
         self._current_codex_path = None
@@ -172,88 +343,246 @@ class App(ctk.CTk):
         self._textbox.configure(state="normal")
         self._textbox.delete("1.0", "end")
         self._textbox.configure(state="disabled")
+        self._set_matches(())
+        self._stop_follow()
+        self._detail = None
+
+    def _cancel_loads(self):
+        """丢弃尚未渲染的会话列表与详情加载，避免旧结果出现在清空后的界面上"""
+        for key in ("sessions", "detail", "follow", "prefetch"):
+            self.tasks.cancel(key)
 
     # ── Claude Code 数据加载 ──────────────────────────────
 
     def _load_projects(self):
-        projects = db.list_projects()
-        self._render_projects(projects)
+        self.tasks.submit(lambda: backend().list_projects(), key="sidebar", on_done=self._render_projects)
 
+    @perf.timed()
     def _render_projects(self, projects):
-
-        for btn in self._project_buttons:
-            btn.destroy()
-        self._project_buttons.clear()
-
-        for p in projects:
-            label = f"{p['display_name']}  ({p['session_count']})"
-            btn = ctk.CTkButton(
-                self._project_frame, text=label, anchor="w",
-                fg_color="transparent", hover_color=("gray75", "gray30"),
-                font=ctk.CTkFont(size=12),
-                command=lambda d=p["dirname"]: self._on_project_select(d),
-            )
-            btn.pack(fill="x", padx=2, pady=1)
-            btn._dirname = p["dirname"]
-            btn.bind("<Button-3>", lambda e, d=p["dirname"]: self._show_project_menu(e, d))
-            self._project_buttons.append(btn)
+        self._projects = projects
+        self._reconcile_buttons(
+            self._project_buttons, projects, "_project", _project_key,
+            label_of=lambda p: f"{_root_prefix(p)}{p['display_name']}  ({p['session_count']})",
+            make_button=self._make_project_button,
+        )
 
         total_sessions = sum(p["session_count"] for p in projects)
         self._status_label.configure(text=f"共 {len(projects)} 个项目, {total_sessions} 个会话")
 
-    def _load_sessions(self, dirname):
-        sessions = db.list_sessions(dirname)
+    def _make_project_button(self, p, label):
+        btn = ctk.CTkButton(
+            self._project_frame, text=label, anchor="w",
+            fg_color="transparent", hover_color=("gray75", "gray30"),
+            font=ctk.CTkFont(size=12),
+            command=lambda k=_project_key(p): self._on_project_select(k),
+        )
+        btn._project = _project_key(p)
+        btn.bind("<Button-3>", lambda e, k=btn._project: self._show_project_menu(e, k))
+        return btn
+
+    def _load_sessions(self, project):
+        root, dirname = project
+        self.tasks.submit(lambda: backend().list_sessions(dirname, root), key="sessions",
+                          on_done=self._on_sessions_loaded)
+
+    def _on_sessions_loaded(self, sessions):
+        self._render_sessions(sessions)
+        if sessions:
+            # 预取最近的会话的消息偏移表，用户多半会先打开它
+            self.tasks.submit(db.get_session_index, sessions[0]["session_id"],
+                              priority=tasks.PREFETCH, key="prefetch")
+
+    @perf.timed()
+    def _render_sessions(self, sessions):
+        self._sessions = sessions
+        self._set_more_button(None)
+        self._reconcile_buttons(
+            self._session_buttons, sessions, "_session_id", lambda s: s["session_id"],
+            label_of=lambda s: f"{s['session_id'][:8]}  {s['title']}",
+            make_button=self._make_session_button,
+        )
 
-        for btn in self._session_buttons:
+    def _make_session_button(self, s, label):
+        btn = ctk.CTkButton(
+            self._session_frame, text=label, anchor="w",
+            fg_color="transparent", hover_color=("gray75", "gray30"),
+            font=ctk.CTkFont(size=11),
+            command=lambda sid=s["session_id"]: self._on_session_select(sid),
+        )
+        btn._session_id = s["session_id"]
+        btn.bind("<Button-3>", lambda e, sid=s["session_id"]: self._show_session_menu(e, sid))
+        return btn
+
+    def _reconcile_buttons(self, buttons, items, attr, key_of, label_of, make_button):
+        """对比现有按钮与最新数据，只新建、销毁或改写有变化的按钮，顺序变化时重新 pack
+
+        由本方法创建的按钮记下 (attr, key_of(item)) 作为复用键，只有同类按钮才会被复用并改写文字；
+        其他方式创建的按钮（如搜索结果，点击命令绑定了命中与查询）与重复的键一律销毁重建。
+        """
+        existing = {}
+        stale = []
+        for b in buttons:
+            key = getattr(b, "_reuse_key", None)
+            if key is None or key in existing:
+                stale.append(b)
+            else:
+                existing[key] = b
+        old_order = list(buttons)
+        new_order = []
+        for item in items:
+            label = label_of(item)
+            key = (attr, key_of(item))
+            btn = existing.pop(key, None)
+            if btn is None:
+                btn = make_button(item, label)
+                btn._reuse_key = key
+            elif btn.cget("text") != label:
+                btn.configure(text=label)
+            new_order.append(btn)
+        stale.extend(existing.values())
+        for btn in stale:
             btn.destroy()
-        self._session_buttons.clear()
 
-        for s in sessions:
-            label = f"{s['session_id'][:8]}  {s['title']}"
-            btn = ctk.CTkButton(
-                self._session_frame, text=label, anchor="w",
-                fg_color="transparent", hover_color=("gray75", "gray30"),
-                font=ctk.CTkFont(size=11),
-                command=lambda sid=s["session_id"]: self._on_session_select(sid),
-            )
+        removed = set(map(id, stale))
+        kept = [b for b in old_order if id(b) not in removed]
+        if new_order[:len(kept)] == kept:
+            # 原有顺序不变，只需把新按钮追加到末尾
+            tail = new_order[len(kept):]
+        else:
+            for btn in kept:
+                btn.pack_forget()
+            tail = new_order
+        for btn in tail:
             btn.pack(fill="x", padx=2, pady=1)
-            btn._session_id = s["session_id"]
-            btn.bind("<Button-3>", lambda e, sid=s["session_id"]: self._show_session_menu(e, sid))
-            self._session_buttons.append(btn)
+        buttons[:] = new_order
 
     def _load_detail(self, session_id):
-        data = db.get_session_detail(session_id)
-        if not data:
+        self._info_label.configure(text="加载中...")
+        self.tasks.submit(db.get_session_index, session_id, key="detail",
+                          on_done=self._render_detail, on_error=lambda e: self._render_detail(None))
+
+    @perf.timed()
+    def _render_detail(self, index, matches=(), focus=0):
+        """渲染会话详情（index 为消息偏移表）。matches 为 [(消息序号, 起始, 结束)]（Tk 字符单位），
+        高亮并跳到第 focus 个；没有命中时从第一条消息开始显示"""
+        self._stop_follow()
+        if index is None:
             self._info_label.configure(text="无法加载会话")
+            self._detail = None
+            self._set_matches(())
             return
 
-        title = data.get("slug") or session_id[:8]
-        project = data.get("project") or "未知"
-        model = data.get("model") or "未知"
-        msg_count = len(data["messages"])
+        meta = index.meta
+        title = meta.get("slug") or meta["session_id"][:8]
+        project = meta.get("project") or "未知"
+        model = meta.get("model") or "未知"
         self._info_label.configure(
-            text=f"{title}  |  项目: {project}  |  模型: {model}  |  消息: {msg_count}"
+            text=f"{title}  |  项目: {project}  |  模型: {model}  |  消息: {len(index)}"
         )
+        self._show_detail(index, "Claude", matches, focus)
+
+    def _show_detail(self, index, assistant_label, matches=(), focus=0):
+        self._detail = {"index": index, "label": assistant_label, "lo": 0, "hi": 0, "starts": {}}
+        self._matches = list(matches)
+        if self._matches:
+            self._goto_match(focus)
+        else:
+            self._match_bar.grid_remove()
+            self._render_window(0, min(len(index), DETAIL_PAGE))
 
+    def _render_window(self, lo, hi):
+        """只渲染 [lo, hi) 范围内的消息，正文按偏移表从文件读取；首尾放可点击的"加载更多"提示行"""
+        d = self._detail
+        index = d["index"]
+        tw = self._textbox._textbox
         self._textbox.configure(state="normal")
         self._textbox.delete("1.0", "end")
-        tw = self._textbox._textbox
+        if lo > 0:
+            tw.insert("end", f"▲ 加载前面的消息（还有 {lo} 条）\n\n", "load_prev")
+        starts = {}
+        self._append_messages(index.iter_messages(lo, hi), d["label"], starts, lo)
+        if hi < len(index):
+            tw.insert("end", f"▼ 加载后面的消息（还有 {len(index) - hi} 条）\n", "load_next")
+        self._textbox.configure(state="disabled")
+        d.update(lo=lo, hi=hi, starts=starts)
 
-        for msg in data["messages"]:
-            role_label = "You" if msg["role"] == "user" else "Claude"
-            tag = "role_user" if msg["role"] == "user" else "role_assistant"
+        # 为窗口内的命中打 tag，一次 tag_add 调用添加所有区间
+        ranges = [i for o, a, b in self._matches if o in starts
+                  for i in (f"{starts[o]}+{a}c", f"{starts[o]}+{b}c")]
+        if ranges:
+            tw.tag_add("match", *ranges)
+
+    def _append_messages(self, messages, assistant_label, starts=None, first=0):
+        """把消息追加到详情文本框末尾（调用方负责切换 state）；starts 记录 序号 → 正文起始位置"""
+        tw = self._textbox._textbox
+        for i, msg in enumerate(messages, start=first):
+            role_label = "You" if msg.role == "user" else assistant_label
+            tag = "role_user" if msg.role == "user" else "role_assistant"
 
             tw.insert("end", f"--- {role_label} ---\n", tag)
-            tw.insert("end", msg["content"] + "\n\n")
+            if starts is not None:
+                starts[i] = tw.index("end-1c")
+            tw.insert("end", msg.content + "\n\n")
+
+    def _shift_window(self, direction):
+        """向前或向后多加载一页；窗口超过 DETAIL_MAX_WINDOW 条时丢弃另一端"""
+        d = self._detail
+        if d is None:
+            return
+        lo, hi, n = d["lo"], d["hi"], len(d["index"])
+        if direction > 0:
+            anchor = hi
+            hi = min(n, hi + DETAIL_PAGE)
+            lo = max(lo, hi - DETAIL_MAX_WINDOW)
+        else:
+            anchor = lo - 1
+            lo = max(0, lo - DETAIL_PAGE)
+            hi = min(hi, lo + DETAIL_MAX_WINDOW)
+        self._render_window(lo, hi)
+        tw = self._textbox._textbox
+        start = d["starts"].get(anchor)
+        if start:
+            tw.see(f"{start}-1l")
+        if self._matches:
+            ordinal, a, b = self._matches[self._match_pos]
+            start = d["starts"].get(ordinal)
+            if start:
+                tw.tag_add("match_current", f"{start}+{a}c", f"{start}+{b}c")
+
+    def _set_matches(self, matches, focus=0):
+        self._matches = list(matches)
+        if not self._matches:
+            self._match_bar.grid_remove()
+            return
+        self._goto_match(focus)
 
-        self._textbox.configure(state="disabled")
+    def _goto_match(self, pos):
+        d = self._detail
+        tw = self._textbox._textbox
+        self._match_pos = pos % len(self._matches)
+        ordinal, a, b = self._matches[self._match_pos]
+        if ordinal not in d["starts"]:
+            # 命中不在当前窗口内：以它为中心重新渲染一页
+            lo = max(0, ordinal - DETAIL_PAGE // 2)
+            self._render_window(lo, min(len(d["index"]), lo + DETAIL_PAGE))
+        start = d["starts"][ordinal]
+        tw.tag_remove("match_current", "1.0", "end")
+        tw.tag_add("match_current", f"{start}+{a}c", f"{start}+{b}c")
+        tw.see(f"{start}+{a}c")
+        self._match_bar.grid()
+        self._match_label.configure(text=f"{self._match_pos + 1} / {len(self._matches)}")
+
+    def _step_match(self, delta):
+        if self._matches:
+            self._goto_match(self._match_pos + delta)
 
     # ── Codex 数据加载 ────────────────────────────────────
 
     def _load_codex_sessions(self):
-        sessions = db.list_codex_sessions()
-        self.after(0, lambda: self._render_codex_sessions(sessions))
+        self.tasks.submit(lambda: backend().list_codex_sessions(), key="sidebar",
+                          on_done=self._render_codex_sessions)
 
+    @perf.timed()
     def _render_codex_sessions(self, sessions):
         for btn in self._project_buttons:
             btn.destroy()
@@ -261,10 +590,11 @@ class App(ctk.CTk):
         for btn in self._session_buttons:
             btn.destroy()
         self._session_buttons.clear()
+        self._set_more_button(None)
 
         for s in sessions:
             title = s["title"][:45]
-            label = f"{s['modified']}  {title}"
+            label = f"{s['modified']}  {_root_prefix(s)}{title}"
             path = s["path"]
             btn = ctk.CTkButton(
                 self._project_frame, text=label, anchor="w",
@@ -279,6 +609,7 @@ class App(ctk.CTk):
 
         self._status_label.configure(text=f"Codex: 共 {len(sessions)} 个会话")
 
+    @tracked
     def _on_codex_session_select(self, filepath):
         self._current_codex_path = filepath
 
@@ -292,30 +623,133 @@ class App(ctk.CTk):
         self._load_codex_detail(filepath)
 
     def _load_codex_detail(self, filepath):
-        data = db.get_codex_session_detail(filepath)
-        if not data:
+        self._set_matches(())
+        self._stop_follow()
+        self._info_label.configure(text="加载中...")
+        self.tasks.submit(db.message_index, filepath, "codex", key="detail",
+                          on_done=self._render_codex_detail, on_error=lambda e: self._render_codex_detail(None))
+
+    @perf.timed()
+    def _render_codex_detail(self, index):
+        if index is None:
             self._info_label.configure(text="无法加载 Codex 会话")
+            self._detail = None
             return
 
-        model = data.get("model") or "未知"
-        cwd = data.get("cwd") or "未知"
-        msg_count = len(data["messages"])
+        model = index.meta.get("model") or "未知"
+        cwd = index.meta.get("cwd") or "未知"
         self._info_label.configure(
-            text=f"Codex  |  目录: {cwd}  |  模型: {model}  |  消息: {msg_count}"
+            text=f"Codex  |  目录: {cwd}  |  模型: {model}  |  消息: {len(index)}"
         )
+        self._show_detail(index, "Codex")
 
-        self._textbox.configure(state="normal")
-        self._textbox.delete("1.0", "end")
-        tw = self._textbox._textbox
-
-        for msg in data["messages"]:
-            role_label = "You" if msg["role"] == "user" else "Codex"
-            tag = "role_user" if msg["role"] == "user" else "role_assistant"
-
-            tw.insert("end", f"--- {role_label} ---\n", tag)
-            tw.insert("end", msg["content"] + "\n\n")
+    # ── 跟随模式 ──────────────────────────────────────────
 
+    @tracked
+    def _on_follow_toggle(self):
+        if not self._follow_var.get():
+            self._stop_follow()
+            return
+        if self._detail is None:
+            self._follow_var.set(False)
+            self._status_label.configure(text="请先选择一个会话")
+            return
+        # 显示最后一页，之后只追加新消息
+        index = self._detail["index"]
+        self._set_matches(())
+        self._render_window(max(0, len(index) - DETAIL_PAGE), len(index))
+        self._textbox._textbox.see("end")
+        self._follow = {"index": index, "seen": index.size, "count": len(index), "busy": False}
+        self._status_label.configure(text="跟随中...")
+        self._follow_tick(self._follow)
+
+    def _stop_follow(self):
+        self._follow = None
+        self._follow_var.set(False)
+
+    def _follow_tick(self, follow):
+        """定时检查文件大小，有变化时在后台续建偏移表并读取新消息（标准库没有跨平台的文件变更通知，只能轮询）"""
+        if follow is not self._follow:
+            return
+        if not follow["busy"]:
+            try:
+                size = os.stat(follow["index"].path).st_size
+            except OSError:
+                self._stop_follow()
+                self._status_label.configure(text="会话文件已不存在，停止跟随")
+                return
+            if size != follow["seen"]:
+                follow["seen"] = size
+                follow["busy"] = True
+                self.tasks.submit(self._follow_read, follow, follow["count"], key="follow",
+                                  on_done=lambda result: self._follow_apply(follow, result),
+                                  on_error=lambda e: self._follow_apply(follow, None))
+        self.after(FOLLOW_POLL_MS, lambda: self._follow_tick(follow))
+
+    def _follow_read(self, follow, count):
+        """续建偏移表并读取第 count 条之后的新消息；文件被改写（偏移表重建）时不读取，由主线程重新渲染"""
+        old = follow["index"]
+        try:
+            # 文件只是追加时 message_index 在原表上续建并返回同一个对象，否则重建
+            index = db.message_index(old.path, old.source)
+            reset = index is not old
+            total = len(index)
+            messages = [] if reset else list(index.iter_messages(count, total))
+        except (OSError, ValueError):
+            return None
+        return index, reset, count, total, messages
+
+    @perf.timed()
+    def _follow_apply(self, follow, result):
+        follow["busy"] = False
+        if follow is not self._follow or result is None:
+            return
+        index, reset, count, total, messages = result
+        follow["count"] = total
+        d = self._detail
+        tw = self._textbox._textbox
+        if reset:
+            follow["index"] = d["index"] = index
+            self._render_window(max(0, total - DETAIL_PAGE), total)
+            tw.see("end")
+            self._status_label.configure(text="跟随中：会话文件已改写，重新加载")
+            return
+        if not messages:
+            return
+        self._textbox.configure(state="normal")
+        ranges = tw.tag_ranges("load_next")
+        if not ranges and count <= d["hi"]:
+            # 窗口在末尾：追加窗口之后的新消息，超过 DETAIL_MAX_WINDOW 条时丢弃最前面的
+            # 只有原本停在末尾时才自动滚动，避免打断正在往上翻阅的用户
+            at_bottom = tw.yview()[1] >= 0.999
+            self._append_messages(messages[d["hi"] - count:], d["label"], d["starts"], d["hi"])
+            d["hi"] = total
+            if d["hi"] - d["lo"] > DETAIL_MAX_WINDOW:
+                self._drop_front(d["hi"] - DETAIL_MAX_WINDOW)
+            if at_bottom:
+                tw.see("end")
+        else:
+            # 用户已翻到前面：不追加，只更新"加载后面"提示行中的条数
+            if ranges:
+                tw.delete(*ranges[:2])
+            tw.insert(ranges[0] if ranges else "end", f"▼ 加载后面的消息（还有 {total - d['hi']} 条）\n", "load_next")
         self._textbox.configure(state="disabled")
+        self._status_label.configure(text=f"跟随中：新增 {len(messages)} 条消息")
+
+    def _drop_front(self, lo):
+        """丢弃详情中第 lo 条之前的消息（调用方负责切换 state），其余消息不重新读取，只平移记录的正文位置"""
+        d = self._detail
+        tw = self._textbox._textbox
+        header = int(d["starts"][lo].split(".")[0]) - 1  # 第 lo 条消息的角色行
+        tw.delete("1.0", f"{header}.0")
+        tw.insert("1.0", f"▲ 加载前面的消息（还有 {lo} 条）\n\n", "load_prev")
+        shift = 3 - header  # 提示行占两行，角色行移到第 3 行
+        starts = {}
+        for i, pos in d["starts"].items():
+            if i >= lo:
+                line, col = pos.split(".")
+                starts[i] = f"{int(line) + shift}.{col}"
+        d.update(lo=lo, starts=starts)
 
     def _show_codex_menu(self, event, filepath):
         menu = tk.Menu(self, tearoff=0)
@@ -323,7 +757,7 @@ class App(ctk.CTk):
                        activeforeground="white", relief="flat")
         menu.add_command(label="删除", command=lambda: self._delete_codex_session(filepath))
         menu.add_separator()
-        session_id = Path(filepath).stem
+        session_id = archive.session_id(filepath)
         menu.add_command(label="分析", command=lambda: self._analyze_codex_session(session_id))
         menu.tk_popup(event.x_root, event.y_root)
 
@@ -332,12 +766,13 @@ class App(ctk.CTk):
         AnalyticsWindow(self, session_id=session_id, source="codex")
 
     def _delete_codex_session(self, filepath):
-        name = Path(filepath).stem[:30]
+        name = archive.session_id(filepath)[:30]
         self._show_confirm_dialog(
             f"确定删除 Codex 会话 {name}... ?",
             lambda: self._do_delete_codex_session(filepath),
         )
 
+    @tracked
     def _do_delete_codex_session(self, filepath):
         ok = db.delete_codex_session(filepath)
         if ok:
@@ -348,37 +783,43 @@ class App(ctk.CTk):
                 self._textbox.configure(state="normal")
                 self._textbox.delete("1.0", "end")
                 self._textbox.configure(state="disabled")
-            threading.Thread(target=self._load_codex_sessions, daemon=True).start()
+                self._set_matches(())
+                self._stop_follow()
+                self._detail = None
+            self._load_codex_sessions()
         else:
             self._status_label.configure(text="删除失败")
 
     # ── 交互事件 ──────────────────────────────────────────
 
-    def _on_project_select(self, dirname):
-        self._current_project = dirname
+    @tracked
+    def _on_project_select(self, project):
+        self._current_project = project
         self._current_session_id = None
+        self._highlight_project(project)
+        self._load_sessions(project)
 
-        # 高亮选中项目
+    def _highlight_project(self, project):
         for btn in self._project_buttons:
-            if btn._dirname == dirname:
+            if btn._project == project:
                 btn.configure(fg_color=("gray70", "gray35"))
             else:
                 btn.configure(fg_color="transparent")
 
-        self._load_sessions(dirname)
-
+    @tracked
     def _on_session_select(self, session_id):
         self._current_session_id = session_id
+        self._highlight_session(session_id)
+        self._load_detail(session_id)
 
-        # 高亮选中会话
+    def _highlight_session(self, session_id):
         for btn in self._session_buttons:
             if btn._session_id == session_id:
                 btn.configure(fg_color=("gray70", "gray35"))
             else:
                 btn.configure(fg_color="transparent")
 
-        self._load_detail(session_id)
-
+    @tracked
     def _on_search(self):
         if self._source == "codex":
             self._status_label.configure(text="Codex 暂不支持搜索")
@@ -387,48 +828,103 @@ class App(ctk.CTk):
         keyword = self._search_entry.get().strip()
         if not keyword:
             return
+        try:
+            query = parse_query(keyword)
+        except QueryError as e:
+            self._status_label.configure(text=f"查询语法错误: {e}")
+            return
 
+        self._search_seq += 1
         self._status_label.configure(text=f"搜索 \"{keyword}\" 中...")
+        self._fetch_search_page(self._search_seq, query, keyword, 0)
+
+    def _fetch_search_page(self, seq, query, keyword, offset):
+        self.tasks.submit(
+            lambda: backend().search_ranked(keyword, limit=SEARCH_PAGE_SIZE, offset=offset),
+            priority=tasks.SEARCH, key="sessions",
+            on_done=lambda page: self._show_search_results(seq, query, keyword, offset, page),
+            on_error=lambda e: self._status_label.configure(text=f"搜索失败: {e}"),
+        )
 
-        def _do_search():
-            results = db.search_messages(keyword)
-            self.after(0, lambda: self._show_search_results(results, keyword))
-
-        threading.Thread(target=_do_search, daemon=True).start()
-
-    def _show_search_results(self, results, keyword):
-        self._status_label.configure(text=f"搜索 \"{keyword}\": 找到 {len(results)} 条结果")
-
-        # 清空会话列表，显示搜索结果
-        for btn in self._session_buttons:
-            btn.destroy()
-        self._session_buttons.clear()
-
-        # 去重：同一会话只显示一次
-        seen = set()
-        for r in results:
-            sid = r["session_id"]
-            if sid in seen:
-                continue
-            seen.add(sid)
+    @perf.timed()
+    @tracked
+    def _show_search_results(self, seq, query, keyword, offset, page):
+        if seq != self._search_seq:
+            return  # 已有更新的搜索
+        hits = page["hits"]
+        shown = offset + len(hits)
+        self._status_label.configure(
+            text=f"搜索 \"{keyword}\": 共 {page['total']} 条结果，按相关度显示前 {shown} 条")
+
+        if offset == 0:
+            # 清空会话列表，显示搜索结果
+            for btn in self._session_buttons:
+                btn.destroy()
+            self._session_buttons.clear()
+            # 取消项目高亮
+            for btn in self._project_buttons:
+                btn.configure(fg_color="transparent")
+            self._current_project = None
+        self._set_more_button(None)
 
-            label = f"{sid[:8]}  {r['match_preview'][:40]}"
+        for h in hits:
+            sid = h["session_id"]
+            snippet = " ".join(h["snippet"].lstrip(".").split())
+            label = f"{_root_prefix(h)}{sid[:8]}  {snippet[:40]}"
             btn = ctk.CTkButton(
                 self._session_frame, text=label, anchor="w",
                 fg_color="transparent", hover_color=("gray75", "gray30"),
                 font=ctk.CTkFont(size=11),
-                command=lambda s=sid: self._on_session_select(s),
+                command=lambda h=h: self._on_search_hit(h, query),
             )
             btn.pack(fill="x", padx=2, pady=1)
             btn._session_id = sid
             btn.bind("<Button-3>", lambda e, s=sid: self._show_session_menu(e, s))
             self._session_buttons.append(btn)
 
-        # 取消项目高亮
-        for btn in self._project_buttons:
-            btn.configure(fg_color="transparent")
-        self._current_project = None
+        if page["has_more"]:
+            self._set_more_button(lambda: self._on_search_more(seq, query, keyword, shown))
+
+    @tracked
+    def _on_search_hit(self, hit, query):
+        """打开命中所在的会话：后台加载并计算全部命中位置，主线程只负责插入文本和打 tag"""
+        session_id = hit["session_id"]
+        self._current_session_id = session_id
+        self._highlight_session(session_id)
+        self._info_label.configure(text="加载中...")
+
+        def _do_load():
+            # 逐条读取正文计算命中位置，不在内存中保留整个会话
+            index = db.get_session_index(session_id)
+            matches = _session_matches(index.iter_messages(), query) if index else []
+            # 定位到被点击的那条消息的第一个命中
+            focus = next((i for i, m in enumerate(matches) if m[0] == hit.get("ordinal")), 0)
+            return index, matches, focus
+
+        self.tasks.submit(_do_load, key="detail", on_done=lambda result: self._render_detail(*result),
+                          on_error=lambda e: self._render_detail(None))
+
+    @tracked
+    def _on_search_more(self, seq, query, keyword, offset):
+        if seq != self._search_seq:
+            return  # 新的搜索已经开始，旧结果页不再翻页
+        self._more_button.configure(state="disabled", text="加载中...")
+        self._fetch_search_page(seq, query, keyword, offset)
+
+    def _set_more_button(self, command):
+        """在会话列表末尾显示"加载更多"按钮；command 为 None 时移除"""
+        if self._more_button is not None:
+            self._more_button.destroy()
+            self._more_button = None
+        if command is not None:
+            self._more_button = ctk.CTkButton(
+                self._session_frame, text="加载更多", height=24,
+                fg_color=("gray80", "gray25"), hover_color=("gray70", "gray35"),
+                font=ctk.CTkFont(size=11), command=command,
+            )
+            self._more_button.pack(fill="x", padx=2, pady=(4, 2))
 
+    @tracked
     def _on_export(self):
         if self._source == "codex":
             self._status_label.configure(text="Codex 暂不支持导出")
@@ -438,6 +934,7 @@ class App(ctk.CTk):
             return
         self._export_session(self._current_session_id)
 
+    @tracked
     def _on_delete(self):
         if self._source == "codex":
             if self._current_codex_path:
@@ -450,6 +947,7 @@ class App(ctk.CTk):
             return
         self._delete_session(self._current_session_id)
 
+    @tracked
     def _on_analytics(self):
         if self._source == "codex":
             from claude_chat.analytics import AnalyticsWindow
@@ -458,28 +956,45 @@ class App(ctk.CTk):
         from claude_chat.analytics import AnalyticsWindow
         AnalyticsWindow(self)
 
+    def _on_watchlist(self):
+        from claude_chat.watchview import WatchlistWindow
+        WatchlistWindow(self)
+
+    def _on_perf(self):
+        from claude_chat.perfview import PerfWindow
+        PerfWindow(self)
+
+    @tracked
     def _on_refresh(self):
         if self._source == "codex":
             self._clear_content()
             self._status_label.configure(text="加载 Codex 会话...")
-            threading.Thread(target=self._load_codex_sessions, daemon=True).start()
+            self._load_codex_sessions()
             return
 
-        db._session_project_cache = None
-        db._first_message_cache = None
-        db._token_stats_cache = None
-        db._activity_cache = None
+        source = backend()
+        if isinstance(source, Client):
+            try:
+                source.refresh()
+            except OSError:
+                pass
+        db.clear_caches()
+        self._cancel_loads()
         self._current_project = None
         self._current_session_id = None
 
         for btn in self._session_buttons:
             btn.destroy()
         self._session_buttons.clear()
+        self._set_more_button(None)
 
         self._info_label.configure(text="选择一个会话查看详情")
         self._textbox.configure(state="normal")
         self._textbox.delete("1.0", "end")
         self._textbox.configure(state="disabled")
+        self._set_matches(())
+        self._stop_follow()
+        self._detail = None
 
         self._load_projects()
         self._status_label.configure(text="已刷新")
@@ -496,24 +1011,26 @@ class App(ctk.CTk):
         menu.add_command(label="分析", command=lambda: self._analyze_session(session_id))
         menu.tk_popup(event.x_root, event.y_root)
 
-    def _show_project_menu(self, event, dirname):
+    def _show_project_menu(self, event, project):
         menu = tk.Menu(self, tearoff=0)
         menu.configure(bg="#2b2b2b", fg="white", activebackground="#3a7ebf",
                        activeforeground="white", relief="flat")
-        menu.add_command(label="导出所有会话", command=lambda: self._export_project(dirname))
-        menu.add_command(label="删除所有会话", command=lambda: self._delete_project(dirname))
+        menu.add_command(label="导出所有会话", command=lambda: self._export_project(project))
+        menu.add_command(label="删除所有会话", command=lambda: self._delete_project(project))
         menu.add_separator()
-        menu.add_command(label="分析", command=lambda: self._analyze_project(dirname))
+        menu.add_command(label="分析", command=lambda: self._analyze_project(project))
         menu.tk_popup(event.x_root, event.y_root)
 
     def _analyze_session(self, session_id):
         from claude_chat.analytics import AnalyticsWindow
         AnalyticsWindow(self, session_id=session_id)
 
-    def _analyze_project(self, dirname):
+    def _analyze_project(self, project):
         from claude_chat.analytics import AnalyticsWindow
-        AnalyticsWindow(self, project_dirname=dirname)
+        root, dirname = project
+        AnalyticsWindow(self, project_dirname=dirname, root=root)
 
+    @tracked
     def _export_session(self, session_id):
         filepath = export_session(session_id)
         if filepath:
@@ -529,6 +1046,7 @@ class App(ctk.CTk):
             lambda: self._do_delete_session(session_id),
         )
 
+    @tracked
     def _do_delete_session(self, session_id):
         ok = db.delete_session(session_id)
         if ok:
@@ -539,14 +1057,19 @@ class App(ctk.CTk):
                 self._textbox.configure(state="normal")
                 self._textbox.delete("1.0", "end")
                 self._textbox.configure(state="disabled")
+                self._set_matches(())
+                self._stop_follow()
+                self._detail = None
             if self._current_project:
                 self._load_sessions(self._current_project)
             self._load_projects()
         else:
             self._status_label.configure(text="删除失败")
 
-    def _export_project(self, dirname):
-        sessions = db.list_sessions(dirname)
+    @tracked
+    def _export_project(self, project):
+        root, dirname = project
+        sessions = backend().list_sessions(dirname, root)
         if not sessions:
             self._status_label.configure(text="该项目没有会话")
             return
@@ -561,18 +1084,20 @@ class App(ctk.CTk):
         if last_path and sys.platform == "win32":
             subprocess.Popen(["explorer", "/select,", str(last_path)])
 
-    def _delete_project(self, dirname):
-        sessions = db.list_sessions(dirname)
+    def _delete_project(self, project):
+        root, dirname = project
+        sessions = backend().list_sessions(dirname, root)
         count = len(sessions)
         if not count:
             self._status_label.configure(text="该项目没有会话")
             return
         self._show_confirm_dialog(
             f"确定删除该项目下全部 {count} 个会话?",
-            lambda: self._do_delete_project(dirname, sessions),
+            lambda: self._do_delete_project(project, sessions),
         )
 
-    def _do_delete_project(self, dirname, sessions):
+    @tracked
+    def _do_delete_project(self, project, sessions):
         deleted = 0
         for s in sessions:
             if db.delete_session(s["session_id"]):
@@ -583,10 +1108,14 @@ class App(ctk.CTk):
         self._textbox.configure(state="normal")
         self._textbox.delete("1.0", "end")
         self._textbox.configure(state="disabled")
-        if self._current_project == dirname:
+        self._set_matches(())
+        self._stop_follow()
+        self._detail = None
+        if self._current_project == project:
             for btn in self._session_buttons:
                 btn.destroy()
             self._session_buttons.clear()
+            self._set_more_button(None)
             self._current_project = None
         self._load_projects()
 
@@ -0,0 +1,157 @@
+"""进程内缓存的内存预算
+
+db 与查询服务的缓存（cache.Cache）创建时登记到这里，写入条目时估算其大小（递归 sys.getsizeof，大容器抽样外推）。
+所有缓存合计超过 MEMORY_BUDGET_MB 时，在全部缓存中按最近使用时间淘汰最久未用的条目：
+spill=True 的缓存（全量扫描得到、重算代价高的结果）把条目 pickle 到缓存目录下的临时目录，再次访问时读回，
+不必重新扫描；其余缓存直接丢弃，下次访问时重新计算。刚写入的条目即使单独超出预算也会保留。
+溢出文件只属于当前进程，进程正常退出时删除；被强制结束的进程留下的溢出目录由之后的进程清理。
+"""
+import itertools
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from array import array
+from pathlib import Path
+
+from . import perf
+from .config import CACHE_DIR, MEMORY_BUDGET_MB
+
+SAMPLE = 32  # 顶层容器超过该元素数时抽样估算，每深一层抽样数降为 1/4（至少 4 个）
+STALE_SPILL_SECONDS = 86400  # 超过该时间未变化的溢出目录视为已退出进程遗留
+_MAX_DEPTH = 6
+_ATOMIC = (str, bytes, bytearray, int, float, bool, type(None), array, Path)
+
+_caches = weakref.WeakSet()
+_enforce_lock = threading.Lock()
+_spill_dir = None
+_spill_seq = itertools.count()
+
+# 全局访问时钟：缓存条目每次写入或命中时取一个新值，淘汰时比较各缓存最旧条目的时钟
+clock = itertools.count()
+
+
+def register(cache):
+    _caches.add(cache)
+
+
+def budget():
+    """预算（字节），0 表示不限制"""
+    return MEMORY_BUDGET_MB << 20
+
+
+def usage():
+    """{缓存名: 驻留内存的估算字节数}，按大小降序"""
+    sizes = {}
+    for cache in list(_caches):
+        sizes[cache.name] = sizes.get(cache.name, 0) + cache.nbytes
+    return dict(sorted(sizes.items(), key=lambda x: x[1], reverse=True))
+
+
+def total():
+    return sum(cache.nbytes for cache in list(_caches))
+
+
+def enforce(keep=None):
+    """合计超出预算时淘汰或溢出最久未用的条目；keep 为 (缓存, 键)，该条目不被淘汰"""
+    limit = budget()
+    if not limit or total() <= limit:
+        return
+    with _enforce_lock, perf.span("memory.enforce"):
+        while total() > limit:
+            oldest = None
+            for cache in list(_caches):
+                entry = cache._oldest()
+                if entry is not None and (cache, entry[0]) != keep and (oldest is None or entry[1] < oldest[2]):
+                    oldest = (cache, entry[0], entry[1])
+            if oldest is None:
+                return
+            cache, key, _ = oldest
+            cache._evict(key)
+            perf.count("evictions")
+
+
+# ── 大小估算 ─────────────────────────────────────────────
+
+
+def estimate(obj, _depth=0):
+    """估算 obj 占用的字节数（含引用的对象）；元素较多的容器按等距抽样的平均大小外推
+
+    嵌套在容器中的 dict 不计字符串键：记录的键通常是各条共享的同一组字符串。
+    """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, _ATOMIC) or _depth >= _MAX_DEPTH:
+        return size
+    sample = max(SAMPLE >> 2 * _depth, 4)
+    if isinstance(obj, dict):
+        n = len(obj)
+        if not n:
+            return size
+        items = list(itertools.islice(obj.items(), sample)) if n > sample else obj.items()
+        inner = sum(estimate(v, _depth + 1) + (0 if _depth and isinstance(k, str) else estimate(k, _depth + 1))
+                    for k, v in items)
+        return size + inner * n // len(items)
+    if isinstance(obj, (list, tuple)):
+        n = len(obj)
+        if not n:
+            return size
+        items = obj[::n // sample] if n > sample else obj
+        return size + sum(estimate(x, _depth + 1) for x in items) * n // len(items)
+    if isinstance(obj, (set, frozenset)):
+        return size + sum(estimate(x, _depth + 1) for x in obj)
+    names = getattr(obj, "__dict__", None) or {}
+    inner = sum(estimate(v, _depth + 1) for v in names.values())
+    for name in getattr(type(obj), "__slots__", ()):
+        inner += estimate(getattr(obj, name, None), _depth + 1)
+    return size + inner
+
+
+# ── 溢出到磁盘 ───────────────────────────────────────────
+
+
+def spill(value):
+    """把 value 写入溢出文件，返回路径；写失败时返回 None（调用方改为直接丢弃）"""
+    global _spill_dir
+    try:
+        if _spill_dir is None:
+            _remove_stale_spills()
+            _spill_dir = tempfile.TemporaryDirectory(prefix="spill-", dir=CACHE_DIR)
+        path = Path(_spill_dir.name) / f"{next(_spill_seq)}.pickle"
+        with open(path, "wb") as f:
+            pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+        perf.count("spilled_bytes", path.stat().st_size)
+        return path
+    except (OSError, pickle.PicklingError, TypeError, AttributeError):
+        return None
+
+
+def _remove_stale_spills():
+    """删除长时间未变化的溢出目录；仍在运行的进程即使溢出文件被误删，读取失败时也会重新计算"""
+    cutoff = time.time() - STALE_SPILL_SECONDS
+    for path in CACHE_DIR.glob("spill-*"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+
+def load(path, default=None):
+    """读回溢出的条目并删除文件；读取失败时返回 default"""
+    try:
+        with open(path, "rb") as f:
+            value = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        value = default
+    discard(path)
+    return value
+
+
+def discard(path):
+    try:
+        path.unlink()
+    except OSError:
+        pass
@@ -0,0 +1,157 @@
+"""轻量性能埋点
+
+用 @timed 装饰或 with span(...) 包裹热点代码，记录耗时以及期间处理的文件数、字节数、行数、缓存命中等计数。
+未启用时装饰器只多一次布尔判断，count() 直接返回，几乎没有开销。
+设置环境变量 CLAUDE_CHAT_PERF=1 或调用 enable() 开启采集。
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+enabled = os.environ.get("CLAUDE_CHAT_PERF") == "1"
+
+MAX_EVENTS = 20000
+
+_events = deque(maxlen=MAX_EVENTS)  # (name, start_ns, dur_ns, thread_id, counters)
+_recorded = 0  # 累计记录的事件数（环形缓冲写满后仍递增），用于判断是否有新数据
+_local = threading.local()
+_origin_ns = time.perf_counter_ns()
+
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+
+def clear():
+    _events.clear()
+
+
+class _Span:
+    __slots__ = ("name", "start", "counters")
+
+    def __init__(self, name):
+        self.name = name
+        self.counters = {}
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        global _recorded
+        dur = time.perf_counter_ns() - self.start
+        _local.stack.pop()
+        _events.append((self.name, self.start, dur, threading.get_ident(), self.counters))
+        _recorded += 1
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name):
+    """返回记录耗时的上下文管理器；未启用时返回空实现"""
+    if not enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def timed(name=None):
+    """装饰器：记录每次调用的耗时。name 默认取函数的模块名 + 限定名"""
+    def decorator(fn):
+        label = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__qualname__}"
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            with _Span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(key, n=1):
+    """为当前线程上所有进行中的 span 累加计数（files / bytes / lines / cache_hits 等）"""
+    if not enabled:
+        return
+    for s in getattr(_local, "stack", ()):
+        s.counters[key] = s.counters.get(key, 0) + n
+
+
+# ── 汇总与导出 ───────────────────────────────────────────
+
+
+def events():
+    return list(_events)
+
+
+def recorded():
+    return _recorded
+
+
+def summary():
+    """按名称聚合：次数、总 / 平均 / 最大耗时（毫秒）以及各计数之和，按总耗时降序"""
+    agg = {}
+    for name, _, dur, _, counters in list(_events):
+        a = agg.get(name)
+        if a is None:
+            a = agg[name] = {"name": name, "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "counters": {}}
+        ms = dur / 1e6
+        a["calls"] += 1
+        a["total_ms"] += ms
+        if ms > a["max_ms"]:
+            a["max_ms"] = ms
+        for k, v in counters.items():
+            a["counters"][k] = a["counters"].get(k, 0) + v
+    rows = list(agg.values())
+    for a in rows:
+        a["avg_ms"] = a["total_ms"] / a["calls"]
+    rows.sort(key=lambda a: a["total_ms"], reverse=True)
+    return rows
+
+
+def dump_json(path):
+    """写出聚合结果和原始事件"""
+    data = {
+        "summary": summary(),
+        "events": [
+            {"name": name, "start_ms": (start - _origin_ns) / 1e6, "dur_ms": dur / 1e6,
+             "thread": tid, "counters": counters}
+            for name, start, dur, tid, counters in list(_events)
+        ],
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    return path
+
+
+def dump_chrome_trace(path):
+    """写出 Chrome trace-event 格式，可在 chrome://tracing 或 Perfetto 中打开"""
+    pid = os.getpid()
+    trace = [
+        {"name": name, "ph": "X", "ts": (start - _origin_ns) / 1000, "dur": dur / 1000,
+         "pid": pid, "tid": tid, "args": counters}
+        for name, start, dur, tid, counters in list(_events)
+    ]
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+    return path
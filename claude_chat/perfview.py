@@ -0,0 +1,120 @@
+from datetime import datetime
+import customtkinter as ctk
+from claude_chat import perf
+from claude_chat.config import EXPORTS_DIR
+from claude_chat.analytics import _format_tokens
+
+REFRESH_MS = 1000
+
+COLUMNS = [
+    ("名称", lambda r: r["name"]),
+    ("次数", lambda r: str(r["calls"])),
+    ("总耗时", lambda r: f"{r['total_ms']:.1f} ms"),
+    ("平均", lambda r: f"{r['avg_ms']:.2f} ms"),
+    ("最大", lambda r: f"{r['max_ms']:.1f} ms"),
+    ("文件", lambda r: str(r["counters"].get("files", ""))),
+    ("字节", lambda r: _format_bytes(r["counters"].get("bytes"))),
+    ("行", lambda r: _format_tokens(r["counters"]["lines"]) if "lines" in r["counters"] else ""),
+    ("缓存命中", lambda r: str(r["counters"].get("cache_hits", ""))),
+]
+
+
+def _format_bytes(n):
+    if not n:
+        return ""
+    if n >= 1 << 20:
+        return f"{n / (1 << 20):.1f} MB"
+    if n >= 1 << 10:
+        return f"{n / (1 << 10):.1f} KB"
+    return f"{n} B"
+
+
+class PerfWindow(ctk.CTkToplevel):
+    """性能面板：按名称汇总 perf 采集到的耗时与计数，可导出 JSON / Chrome trace"""
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.title("性能")
+        self.geometry("960x480")
+        self.transient(master)
+
+        bar = ctk.CTkFrame(self, fg_color="transparent")
+        bar.pack(fill="x", padx=10, pady=(10, 4))
+
+        self._enabled_var = ctk.BooleanVar(value=perf.enabled)
+        ctk.CTkSwitch(bar, text="采集", variable=self._enabled_var,
+                      command=self._on_toggle).pack(side="left", padx=(0, 10))
+        for text, cmd in [
+            ("清空", self._on_clear),
+            ("导出 JSON", self._on_dump_json),
+            ("导出 Trace", self._on_dump_trace),
+        ]:
+            ctk.CTkButton(bar, text=text, width=90, command=cmd).pack(side="left", padx=2)
+
+        self._status_label = ctk.CTkLabel(bar, text="", anchor="e", font=ctk.CTkFont(size=11))
+        self._status_label.pack(side="right")
+        self._stall_label = ctk.CTkLabel(bar, text="", anchor="e", font=ctk.CTkFont(size=11),
+                                         text_color="gray60")
+        self._stall_label.pack(side="right", padx=10)
+        self._watchdog = getattr(master, "_watchdog", None)
+
+        self._table = ctk.CTkScrollableFrame(self)
+        self._table.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+
+        self._last_count = None
+        self._refresh()
+
+    def _refresh(self):
+        if not self.winfo_exists():
+            return
+        # 只有产生新事件时才重建表格
+        count = perf.recorded()
+        if count != self._last_count:
+            self._last_count = count
+            self._render(perf.summary())
+        if self._watchdog is not None:
+            stalls = list(self._watchdog.stalls)
+            if stalls:
+                worst = max(s["duration_ms"] or s["lag_ms"] for s in stalls)
+                self._stall_label.configure(text=f"主线程卡顿 {len(stalls)} 次，最长 {worst} ms")
+        self.after(REFRESH_MS, self._refresh)
+
+    def _render(self, rows):
+        for w in self._table.winfo_children():
+            w.destroy()
+        for j, (title, _) in enumerate(COLUMNS):
+            ctk.CTkLabel(self._table, text=title,
+                         font=ctk.CTkFont(size=11, weight="bold")).grid(
+                row=0, column=j, padx=8, pady=2, sticky="w")
+        for i, r in enumerate(rows, start=1):
+            for j, (_, fmt) in enumerate(COLUMNS):
+                ctk.CTkLabel(self._table, text=fmt(r),
+                             font=ctk.CTkFont(size=11)).grid(
+                    row=i, column=j, padx=8, pady=1, sticky="w")
+        if not rows:
+            hint = "暂无数据" if perf.enabled else "采集未开启"
+            ctk.CTkLabel(self._table, text=hint, text_color="gray60").grid(
+                row=1, column=0, columnspan=len(COLUMNS), pady=20)
+
+    def _on_toggle(self):
+        perf.enable(self._enabled_var.get())
+        self._last_count = None
+
+    def _on_clear(self):
+        perf.clear()
+        self._last_count = None
+
+    def _dump(self, suffix, writer):
+        name = f"perf_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}"
+        try:
+            path = writer(EXPORTS_DIR / name)
+        except OSError as e:
+            self._status_label.configure(text=f"导出失败: {e}")
+            return
+        self._status_label.configure(text=f"已导出: {path.name}")
+
+    def _on_dump_json(self):
+        self._dump(".json", perf.dump_json)
+
+    def _on_dump_trace(self):
+        self._dump(".trace.json", perf.dump_chrome_trace)
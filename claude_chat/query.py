@@ -0,0 +1,212 @@
+"""搜索查询语言
+
+    role:user project:backend model:opus after:2026-09-01 "race condition" -flaky
+
+- 普通词 / "引号短语"：大小写不敏感的子串匹配，多个条件之间为 AND
+- a OR b：任意一个命中即可
+- -词 / -字段:值：排除
+- 字段：role（user / assistant）、project（项目路径或目录名子串）、model（模型名子串）、
+  session（会话 ID 前缀）、root 或 user（数据根名子串，多数据根时用于区分成员）、
+  after / before（日期 YYYY-MM-DD、ISO 时间或 7d 表示 7 天前；after 含当天，before 不含）。
+  同一字段出现多次时任意一个满足即可。
+
+parse_query 返回的 Query 同时提供三层过滤，供 db 按代价从低到高依次应用：
+文件级（project / session / 时间 / model，借助 zone map 和 mtime）→ 原始行预过滤 → 消息文本匹配。
+"""
+import re
+from datetime import datetime, timedelta
+
+FIELDS = ("role", "project", "model", "session", "root", "user", "after", "before")
+
+_TOKEN_RE = re.compile(r'(-?)(?:(\w+):)?(?:"([^"]*)"?|(\S+))')
+
+
+class QueryError(ValueError):
+    pass
+
+
+class Query:
+    def __init__(self):
+        self.clauses = []     # [[词, ...], ...]：每个子列表内为 OR，子列表之间为 AND（均已小写）
+        self.excluded = []    # 排除的词
+        self.fields = {}      # 字段 → [值, ...]（OR）
+        self.excluded_fields = {}
+        self.after = None     # datetime，含
+        self.before = None    # datetime，不含
+
+    def __repr__(self):
+        return (f"Query(clauses={self.clauses}, excluded={self.excluded}, fields={self.fields}, "
+                f"excluded_fields={self.excluded_fields}, after={self.after}, before={self.before})")
+
+    @property
+    def is_empty(self):
+        return not (self.clauses or self.excluded or self.fields or self.excluded_fields
+                    or self.after or self.before)
+
+    @property
+    def terms(self):
+        """所有正向匹配词，用于高亮和摘要"""
+        return [t for clause in self.clauses for t in clause]
+
+    # ── 文件级谓词 ──
+
+    def match_project(self, *names):
+        """项目谓词：names 为目录名、显示名等候选字符串"""
+        names = [n.lower() for n in names if n]
+        wanted = self.fields.get("project")
+        if wanted and not any(w in n for w in wanted for n in names):
+            return False
+        return not any(w in n for w in self.excluded_fields.get("project", ()) for n in names)
+
+    def match_session(self, session_id):
+        wanted = self.fields.get("session")
+        if wanted and not any(session_id.lower().startswith(w) for w in wanted):
+            return False
+        return not any(session_id.lower().startswith(w) for w in self.excluded_fields.get("session", ()))
+
+    def match_root(self, name):
+        """数据根谓词"""
+        name = name.lower()
+        wanted = self.fields.get("root")
+        if wanted and not any(w in name for w in wanted):
+            return False
+        return not any(w in name for w in self.excluded_fields.get("root", ()))
+
+    def match_models(self, models):
+        """model 谓词：models 为会话中出现过的模型集合"""
+        models = [m.lower() for m in models if m]
+        wanted = self.fields.get("model")
+        if wanted and not any(w in m for w in wanted for m in models):
+            return False
+        return not any(w in m for w in self.excluded_fields.get("model", ()) for m in models)
+
+    @property
+    def has_model_filter(self):
+        return bool(self.fields.get("model") or self.excluded_fields.get("model"))
+
+    # ── 行级预过滤 ──
+
+    def line_may_match(self, line_lower):
+        """原始 JSON 行的必要条件检查：每个 AND 子句至少有一个词出现在行中。
+
+        只对不会被 JSON 转义改写的词做判断；行中含 \\u 转义且词含非 ASCII 字符时无法判断，直接放行。
+        """
+        escaped = None
+        for clause in self.clauses:
+            for term in clause:
+                if not _prefilter_safe(term):
+                    break
+                if not term.isascii():
+                    if escaped is None:
+                        escaped = "\\u" in line_lower
+                    if escaped:
+                        break
+                if term in line_lower:
+                    break
+            else:
+                return False
+        return True
+
+    # ── 消息级匹配 ──
+
+    def match_role(self, role):
+        wanted = self.fields.get("role")
+        if wanted and role not in wanted:
+            return False
+        return role not in self.excluded_fields.get("role", ())
+
+    def match_text(self, text_lower):
+        for clause in self.clauses:
+            if not any(t in text_lower for t in clause):
+                return False
+        return not any(t in text_lower for t in self.excluded)
+
+    def match_spans(self, text_lower):
+        """所有正向词在文本中的出现位置 [(start, end)]，按位置排序，重叠的区间合并"""
+        spans = []
+        for term in set(self.terms):
+            i = text_lower.find(term)
+            while i != -1:
+                spans.append((i, i + len(term)))
+                i = text_lower.find(term, i + 1)
+        spans.sort()
+        merged = []
+        for start, end in spans:
+            if merged and start < merged[-1][1]:
+                if end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        return merged
+
+
+def _prefilter_safe(term):
+    return not any(c in term for c in '"\\') and all(c >= " " for c in term)
+
+
+def _parse_time(value, field):
+    m = re.fullmatch(r"(\d+)d", value)
+    if m:
+        day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return day - timedelta(days=int(m.group(1)))
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise QueryError(f"{field}: 无法识别的时间 {value!r}（应为 YYYY-MM-DD、ISO 时间或 7d）")
+
+
+def parse_query(text):
+    """把查询字符串解析为 Query，语法错误时抛出 QueryError"""
+    q = Query()
+    pending_or = False
+    for m in _TOKEN_RE.finditer(text):
+        neg, field, quoted, bare = m.groups()
+        value = quoted if quoted is not None else bare
+        if field and field.lower() not in FIELDS:
+            # 非字段前缀（如 http://...）按普通词处理
+            value = f"{field}:{value}"
+            field = None
+        if not field and not neg and quoted is None and value == "OR":
+            if not q.clauses:
+                raise QueryError("OR 前缺少搜索词")
+            pending_or = True
+            continue
+        if not value:
+            continue
+
+        if field:
+            field = field.lower()
+            if pending_or:
+                raise QueryError("OR 只能连接搜索词，不能连接字段条件")
+            if field in ("after", "before"):
+                if neg:
+                    raise QueryError(f"{field} 不支持取反")
+                setattr(q, field, _parse_time(value, field))
+                continue
+            v = value.lower()
+            if field == "user":
+                field = "root"
+            if field == "role":
+                v = {"you": "user", "claude": "assistant", "ai": "assistant"}.get(v, v)
+                if v not in ("user", "assistant"):
+                    raise QueryError(f"role 只能是 user 或 assistant，而不是 {value!r}")
+            target = q.excluded_fields if neg else q.fields
+            target.setdefault(field, []).append(v)
+            continue
+
+        term = value.lower()
+        if neg:
+            if pending_or:
+                raise QueryError("OR 之后不能跟排除词")
+            q.excluded.append(term)
+        elif pending_or:
+            q.clauses[-1].append(term)
+            pending_or = False
+        else:
+            q.clauses.append([term])
+
+    if pending_or:
+        raise QueryError("OR 后缺少搜索词")
+    if q.after and q.before and q.after >= q.before:
+        raise QueryError("after 必须早于 before")
+    return q
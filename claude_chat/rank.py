@@ -0,0 +1,72 @@
+"""搜索结果相关度排序：BM25 打分
+
+idf 需要整个命中集合的文档频率，只能在扫描结束后得到，扫描途中无法用有界堆按最终得分截断。
+因此扫描时每条命中只记下紧凑的排序键
+（各词的词频饱和部分、时间、所在文件序号与字节偏移，每条约 24 + 8 × 词数 字节，不含正文），
+扫描结束后乘上最终 idf 给全部命中打分，取出结果页后再回到文件读取这几条的正文。
+多词查询同样按完整 BM25 排序，不同 offset 的分页前后衔接。长度归一化使用固定的平均消息长度。
+"""
+import math
+from array import array
+
+K1 = 1.2
+B = 0.75
+AVG_DOC_LEN = 500  # 消息文本的平均长度（字符），用于长度归一化
+
+
+def term_counts(text_lower, terms):
+    return [text_lower.count(t) for t in terms]
+
+
+def tf_weights(tfs, length):
+    """BM25 中每个词的词频饱和部分"""
+    norm = K1 * (1 - B + B * length / AVG_DOC_LEN)
+    return [tf * (K1 + 1) / (tf + norm) if tf else 0.0 for tf in tfs]
+
+
+class BM25Stats:
+    """扫描过程中累积的语料统计"""
+
+    def __init__(self, terms):
+        self.docs = 0   # 语料中的消息数（按扫描过的行数近似）
+        self.df = [0] * len(terms)
+
+    def add(self, tfs):
+        for i, tf in enumerate(tfs):
+            if tf:
+                self.df[i] += 1
+
+    def merge(self, df, docs):
+        """合并另一部分语料（如另一个数据根）的统计"""
+        self.df = [a + b for a, b in zip(self.df, df)]
+        self.docs += docs
+
+    def idf(self):
+        n = max(self.docs, max(self.df, default=0), 1)
+        return [math.log(1 + (n - df + 0.5) / (df + 0.5)) for df in self.df]
+
+
+class Candidates:
+    """全部命中的紧凑排序键，按列存放在 array 中（可直接 pickle 回主进程）"""
+
+    def __init__(self, nterms):
+        self.nterms = nterms
+        self.weights = array("d")  # 每条命中 nterms 个词频权重
+        self.times = array("q")    # epoch 秒，缺失为 timebucket.NO_TIME；由调用方按文件批量解析后追加
+        self.docs = array("l")     # 命中所在文件的序号，由调用方解释
+        self.offsets = array("q")  # 命中行在文件中的字节偏移
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def add(self, doc, offset, weights):
+        self.docs.append(doc)
+        self.offsets.append(offset)
+        self.weights.extend(weights)
+
+    def scores(self, idf):
+        """每条命中的 BM25 得分"""
+        scores = [0.0] * len(self)
+        for j, w in enumerate(idf):
+            scores = [s + x * w for s, x in zip(scores, self.weights[j::self.nterms])]
+        return scores
@@ -0,0 +1,374 @@
+"""本地查询服务：常驻进程让 db 的索引与统计缓存保持预热，通过 HTTP/JSON 提供查询
+
+    python -m claude_chat serve [--port 8765]
+
+缓存只存在于单个进程的模块全局变量中，每次启动 GUI 或运行脚本都要重新冷扫描；
+常驻服务把缓存留在一个进程里，GUI 与命令行设置 CLAUDE_CHAT_SERVER 后通过它查询（见 claude_chat.client）。
+
+只监听 127.0.0.1，每个请求在独立线程中处理。列表类结果为 NDJSON（每行一条记录）；
+Host 不是 127.0.0.1:<端口> 或 localhost:<端口> 的请求、以及带 Origin 头（来自浏览器页面）的 POST 返回 403，
+防止网页借 DNS 重绑定读取会话内容或反复触发刷新。
+搜索、会话内容与导出分块传输、边产出边写出，搜索扫描到第一条命中时即开始返回。
+
+    GET  /health                                {"ok", "pid", "generation", "roots", "memory"}
+    GET  /projects
+    GET  /sessions?project=&root=
+    GET  /codex/sessions?since=&until=
+    GET  /search?q=&k=&offset=                  给出 k 时按 BM25 返回一页 {"hits", "total", "has_more"}
+    GET  /search?q=[&literal=1][&full=1]        流式返回全部命中（full 时带完整正文）
+    GET  /detail?session=                       首行为元信息，之后每行一条消息
+    GET  /detail?path=&source=codex
+    GET  /stats/tokens?since=&until=[&codex=1]
+    GET  /stats/activity?since=&until=[&codex=1]
+    GET  /export?session=                       Markdown，文件名见 Content-Disposition
+    POST /refresh                               清空缓存并在后台重新预热
+
+列表、统计与 BM25 结果页按请求参数缓存编码后的响应体，再次请求时直接写出。
+后台每 REFRESH_SECONDS 秒比较一次数据目录的指纹（会话文件数、总大小、最新 mtime），
+有变化时自动刷新，generation 随每次刷新递增。
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, quote, urlsplit
+
+from . import archive, db, fssnapshot, memory, perf
+from .cache import Cache
+from .config import ROOTS, SERVER_HOST, SERVER_PORT
+from .export import iter_markdown, markdown_filename
+from .query import QueryError, parse_query
+
+REFRESH_SECONDS = 30
+MEMO_SIZE = 64          # 服务进程中最多缓存的响应体个数
+_CHUNK_BYTES = 64 * 1024
+_FLUSH_SECONDS = 0.1    # 结果产出较慢时（如搜索），缓冲的记录最迟在这段时间后写出
+
+
+# ── 结果缓存 ──────────────────────────────────────────────
+
+
+def _json_line(record):
+    return json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+
+def _ndjson(fn):
+    return lambda *args: "".join(map(_json_line, fn(*args))).encode("utf-8")
+
+
+def _ranked(text, limit, offset):
+    page = db.search_ranked(parse_query(text), limit=limit, offset=offset)
+    return json.dumps(page, ensure_ascii=False, default=str).encode("utf-8")
+
+
+# 类别 → 返回响应体（bytes）的函数
+_LOADERS = {
+    "projects": _ndjson(db.list_projects),
+    "sessions": _ndjson(db.list_sessions),
+    "codex_sessions": _ndjson(db.list_codex_sessions),
+    "tokens": _ndjson(db.collect_token_stats),
+    "activity": _ndjson(db.collect_session_activity),
+    "codex_tokens": _ndjson(db.collect_codex_token_stats),
+    "codex_activity": _ndjson(db.collect_codex_activity),
+    "ranked": _ranked,
+}
+
+_memo = Cache(MEMO_SIZE, name="查询服务响应", spill=True)  # (类别, *参数) → 响应体，LRU
+
+
+def _cached(kind, *args):
+    """按 (kind, *args) 缓存响应体；并发的相同请求只计算一次，计算期间发生刷新时不缓存（结果可能已过期）"""
+    return _memo.get((kind,) + args, lambda: _LOADERS[kind](*args))
+
+
+def refresh():
+    """清空服务进程与 db 的缓存，在后台重新预热，返回新的 generation"""
+    generation = _memo.clear()
+    db.clear_caches()
+    threading.Thread(target=_warm, daemon=True).start()
+    return generation
+
+
+def _warm():
+    """预先计算 GUI 打开时和分析面板需要的结果"""
+    for kind, args in (("projects", ()), ("sessions", (None, None)), ("tokens", (None, None)),
+                       ("activity", (None, None)), ("codex_sessions", (None, None)),
+                       ("codex_tokens", (None, None)), ("codex_activity", (None, None))):
+        try:
+            _cached(kind, *args)
+        except OSError:
+            pass
+
+
+def _fingerprint():
+    """数据目录的指纹：(会话文件数, 总大小, 最新 mtime)，只 stat 不读取内容"""
+    count = size = latest = 0
+    for root in ROOTS:
+        # 与 db 相同的 scandir 遍历（fssnapshot），但每次都重新扫描，不使用 db 缓存的快照
+        for stat_file in [root.history_file.stat] + [f.stat for f in fssnapshot.scan(root).files()]:
+            try:
+                stat = stat_file()
+            except OSError:
+                continue
+            count += 1
+            size += stat.st_size
+            latest = max(latest, stat.st_mtime_ns)
+    return count, size, latest
+
+
+def _watch(interval):
+    last = _fingerprint()
+    while True:
+        time.sleep(interval)
+        current = _fingerprint()
+        if current != last:
+            last = current
+            refresh()
+
+
+# ── 请求处理 ──────────────────────────────────────────────
+
+
+class _BadRequest(ValueError):
+    pass
+
+
+def _date(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise _BadRequest(f"无效日期: {name}={value}")
+
+
+def _int(params, name, default):
+    value = params.get(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise _BadRequest(f"无效整数: {name}={value}")
+
+
+def _flag(params, name):
+    return params.get(name, "").lower() in ("1", "true", "yes")
+
+
+def _codex_path(value):
+    """只允许读取数据根 Codex 目录下的会话文件"""
+    path = Path(value).resolve()
+    for root in ROOTS:
+        if path.is_relative_to(root.codex_sessions_dir.resolve()) and path.is_file() \
+                and archive.is_session_file(path.name):
+            return path
+    return None
+
+
+def _message_records(index):
+    meta = dict(index.meta, path=str(index.path), message_count=len(index))
+    yield meta
+    for msg in index.iter_messages():
+        yield msg.to_dict()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # 分块传输与连接复用
+    server_version = "claude-chat"
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+    def do_GET(self):
+        self._dispatch(_GET_ROUTES)
+
+    def do_POST(self):
+        self._dispatch(_POST_ROUTES)
+
+    def _dispatch(self, routes):
+        if not self._allowed(routes):
+            self._send_json({"error": "禁止访问"}, 403)
+            return
+        url = urlsplit(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        route = routes.get(url.path.rstrip("/") or "/")
+        self._responded = False
+        try:
+            if route is None:
+                self._send_json({"error": f"未知接口: {url.path}"}, 404)
+            else:
+                with perf.span(f"server {url.path}"):
+                    route(self, params)
+        except (_BadRequest, QueryError) as e:
+            self._send_error(400, e)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # 客户端提前断开
+        except FileNotFoundError as e:
+            self._send_error(404, e)  # 请求期间会话文件被删除或归档
+        except Exception as e:
+            self.log_error("%s 处理失败: %r", self.path, e)
+            self._send_error(500, e)
+
+    def send_response(self, code, message=None):
+        self._responded = True
+        super().send_response(code, message)
+
+    def _send_error(self, status, error):
+        """响应头尚未发出时返回 JSON 错误；已开始流式输出时只能断开连接（客户端得到不完整的响应）"""
+        if self._responded:
+            self.close_connection = True
+            return
+        self._send_json({"error": str(error) or type(error).__name__}, status)
+
+    def _allowed(self, routes):
+        """只接受以本机地址访问的请求；POST 不接受浏览器发起的跨源请求"""
+        port = self.server.server_address[1]
+        host = (self.headers.get("Host") or "").lower()
+        if host not in {f"{name}:{port}" for name in (SERVER_HOST, "127.0.0.1", "localhost")}:
+            return False
+        return routes is not _POST_ROUTES or self.headers.get("Origin") is None
+
+    # ── 响应 ──
+
+    def _send_json(self, obj, status=200):
+        self._send_body(json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8"),
+                        "application/json; charset=utf-8", status)
+
+    def _send_body(self, body, content_type, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_cached(self, kind, *args):
+        content_type = "application/json" if kind == "ranked" else "application/x-ndjson"
+        self._send_body(_cached(kind, *args), content_type + "; charset=utf-8")
+
+    def _send_chunks(self, parts, content_type, headers=()):
+        """分块传输 parts（str 的可迭代对象）；按大小或时间合并成块写出"""
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        buf, size, flushed = [], 0, time.monotonic()
+        try:
+            for part in parts:
+                data = part.encode("utf-8")
+                buf.append(data)
+                size += len(data)
+                if size >= _CHUNK_BYTES or time.monotonic() - flushed >= _FLUSH_SECONDS:
+                    self._write_chunk(b"".join(buf))
+                    buf, size, flushed = [], 0, time.monotonic()
+        except Exception:
+            # 响应头已发出，无法再返回错误状态：不写结束块，客户端会得到不完整的响应
+            self.close_connection = True
+            raise
+        if buf:
+            self._write_chunk(b"".join(buf))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data):
+        self.wfile.write(b"%X\r\n%s\r\n" % (len(data), data))
+
+    def _send_records(self, records):
+        self._send_chunks(map(_json_line, records), "application/x-ndjson; charset=utf-8")
+
+    # ── 接口 ──
+
+    def _health(self, params):
+        self._send_json({"ok": True, "pid": os.getpid(), "generation": _memo.generation,
+                         "roots": [r.name for r in ROOTS],
+                         "memory": {"used": memory.total(), "budget": memory.budget(), "caches": memory.usage()}})
+
+    def _projects(self, params):
+        self._send_cached("projects")
+
+    def _sessions(self, params):
+        self._send_cached("sessions", params.get("project") or None, params.get("root") or None)
+
+    def _codex_sessions(self, params):
+        self._send_cached("codex_sessions", _date(params, "since"), _date(params, "until"))
+
+    def _search(self, params):
+        text = params.get("q", "")
+        if _flag(params, "literal"):
+            hits = db.iter_search_messages(text)
+        else:
+            query = parse_query(text)
+            if params.get("k"):
+                self._send_cached("ranked", text, _int(params, "k", 50), _int(params, "offset", 0))
+                return
+            hits = db.iter_query_messages(query)
+        if not _flag(params, "full"):
+            hits = ({k: v for k, v in h.items() if k != "content"} for h in hits)
+        self._send_records(hits)
+
+    def _detail(self, params):
+        if params.get("source") == "codex":
+            path = _codex_path(params.get("path", ""))
+            index = db.message_index(path, "codex") if path else None
+        else:
+            index = db.get_session_index(params.get("session", "")) if params.get("session") else None
+        if index is None:
+            self._send_json({"error": "未找到会话"}, 404)
+            return
+        self._send_records(_message_records(index))
+
+    def _stats(self, kind, params):
+        prefix = "codex_" if _flag(params, "codex") else ""
+        self._send_cached(prefix + kind, _date(params, "since"), _date(params, "until"))
+
+    def _export(self, params):
+        session_id = params.get("session", "")
+        index = db.get_session_index(session_id) if session_id else None
+        if index is None:
+            self._send_json({"error": "未找到会话"}, 404)
+            return
+        full_id = index.meta["session_id"]
+        filename = quote(markdown_filename(full_id, index.meta))
+        self._send_chunks(iter_markdown(index, full_id), "text/markdown; charset=utf-8",
+                          [("Content-Disposition", f"attachment; filename*=UTF-8''{filename}")])
+
+    def _refresh(self, params):
+        self._send_json({"generation": refresh()})
+
+
+_GET_ROUTES = {
+    "/health": _Handler._health,
+    "/projects": _Handler._projects,
+    "/sessions": _Handler._sessions,
+    "/codex/sessions": _Handler._codex_sessions,
+    "/search": _Handler._search,
+    "/detail": _Handler._detail,
+    "/stats/tokens": lambda h, p: h._stats("tokens", p),
+    "/stats/activity": lambda h, p: h._stats("activity", p),
+    "/export": _Handler._export,
+}
+_POST_ROUTES = {
+    "/refresh": _Handler._refresh,
+}
+
+
+def serve(port=SERVER_PORT, refresh_seconds=REFRESH_SECONDS, verbose=False, ready=None):
+    """在 127.0.0.1:port 上运行服务直到进程被中断；ready(地址) 在开始监听后调用"""
+    httpd = ThreadingHTTPServer((SERVER_HOST, port), _Handler)
+    httpd.daemon_threads = True
+    httpd.verbose = verbose
+    threading.Thread(target=_warm, daemon=True).start()
+    if refresh_seconds:
+        threading.Thread(target=_watch, args=(refresh_seconds,), daemon=True).start()
+    if ready:
+        ready(f"http://{SERVER_HOST}:{httpd.server_address[1]}")
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
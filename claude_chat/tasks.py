@@ -0,0 +1,144 @@
+"""GUI 后台任务调度
+
+固定数量的工作线程按优先级取任务执行，结果通过 after() 交回 Tk 主线程回调。
+同一个 key 的新任务取代旧任务：旧任务尚未开始时直接丢弃，已在执行的无法中断，但结果不再回调，
+例如快速连续点选会话时只有最后一次选择的详情会被渲染。
+预取、建索引等后台任务最多占用 workers - 1 个线程，总留一个线程给交互操作。
+"""
+import heapq
+import itertools
+import threading
+import tkinter as tk
+import traceback
+
+# 优先级：数值越小越先执行
+DETAIL = 0     # 交互加载：会话详情、侧边栏列表
+SEARCH = 1
+PREFETCH = 2   # 预取用户可能打开的内容
+INDEXING = 3   # 全量扫描、建立缓存
+
+WORKERS = 4
+
+
+class Task:
+    __slots__ = ("fn", "args", "priority", "key", "on_done", "on_error", "cancelled")
+
+    def __init__(self, fn, args, priority, key, on_done, on_error):
+        self.fn = fn
+        self.args = args
+        self.priority = priority
+        self.key = key
+        self.on_done = on_done
+        self.on_error = on_error
+        self.cancelled = False
+
+    def cancel(self):
+        """取消任务：未开始的不再执行，已在执行的结果不再回调"""
+        self.cancelled = True
+
+
+class Scheduler:
+    def __init__(self, root, workers=WORKERS):
+        self._root = root  # 用于 after() 的 Tk 控件
+        self._workers = max(workers, 2)
+        self._heap = []  # (优先级, 提交序号, Task)
+        self._seq = itertools.count()
+        self._latest = {}  # key → 最近提交的 Task
+        self._cond = threading.Condition()
+        self._threads = 0
+        self._idle = 0
+        self._background = 0  # 正在执行的 PREFETCH / INDEXING 任务数
+        self._closed = False
+
+    def submit(self, fn, *args, priority=DETAIL, key=None, on_done=None, on_error=None):
+        """在后台执行 fn(*args)，完成后在主线程调用 on_done(结果) 或 on_error(异常)，返回 Task
+
+        给出 key 时取消同一 key 的上一个任务。未给出 on_error 时异常的调用栈打印到 stderr。
+        """
+        task = Task(fn, args, priority, key, on_done, on_error)
+        with self._cond:
+            if self._closed:
+                task.cancel()
+                return task
+            if key is not None:
+                old = self._latest.get(key)
+                if old is not None:
+                    old.cancel()
+                self._latest[key] = task
+            heapq.heappush(self._heap, (priority, next(self._seq), task))
+            if self._idle == 0 and self._threads < self._workers:
+                self._threads += 1
+                threading.Thread(target=self._work, name=f"tasks-{self._threads}", daemon=True).start()
+            self._cond.notify()
+        return task
+
+    def cancel(self, key):
+        with self._cond:
+            task = self._latest.pop(key, None)
+            if task is not None:
+                task.cancel()
+
+    def shutdown(self):
+        """停止接受任务并取消所有未完成的任务（进行中的任务在后台自行结束）"""
+        with self._cond:
+            self._closed = True
+            for _, _, task in self._heap:
+                task.cancel()
+            for task in self._latest.values():
+                task.cancel()
+            self._heap.clear()
+            self._latest.clear()
+            self._cond.notify_all()
+
+    def _next(self):
+        """取出下一个可执行的任务；调度器关闭时返回 None"""
+        with self._cond:
+            while True:
+                if self._closed:
+                    return None
+                while self._heap and self._heap[0][2].cancelled:
+                    heapq.heappop(self._heap)
+                if self._heap:
+                    task = self._heap[0][2]
+                    background = task.priority >= PREFETCH
+                    if not background or self._background < self._workers - 1:
+                        heapq.heappop(self._heap)
+                        if background:
+                            self._background += 1
+                        return task
+                self._idle += 1
+                self._cond.wait()
+                self._idle -= 1
+
+    def _work(self):
+        while (task := self._next()) is not None:
+            try:
+                result, error = task.fn(*task.args), None
+            except Exception as e:
+                result, error = None, e
+            finally:
+                if task.priority >= PREFETCH:
+                    with self._cond:
+                        self._background -= 1
+                        self._cond.notify()
+            if not task.cancelled:
+                try:
+                    self._root.after(0, lambda t=task, r=result, e=error: self._deliver(t, r, e))
+                except (RuntimeError, tk.TclError):
+                    return  # 主窗口已销毁
+
+    def _deliver(self, task, result, error):
+        """在主线程回调；交付前被取代或取消的任务丢弃结果"""
+        if task.cancelled:
+            return
+        if task.key is not None:
+            with self._cond:
+                if self._latest.get(task.key) is task:
+                    del self._latest[task.key]
+        if error is not None:
+            if task.on_error is not None:
+                task.on_error(error)
+            else:
+                traceback.print_exception(type(error), error, error.__traceback__)
+        elif task.on_done is not None:
+            task.on_done(result)
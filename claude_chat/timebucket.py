@@ -0,0 +1,202 @@
+"""时间分桶：把记录的时间戳一次性解析为整数 epoch 秒列，再按指定时区批量分到 时 / 日 / 周 / 月
+
+Claude 与 Codex 的时间戳格式不同（ISO 8601 UTC 字符串、毫秒整数），解析后统一为 array('q') 中的
+epoch 秒，缺失或无法解析的记为 NO_TIME。分桶只做整数运算：UTC 偏移按 15 分钟时间片缓存
+（夏令时等偏移变化都发生在整刻钟），日期换算按天缓存，不再逐条创建 datetime 对象。
+
+桶的键为整数，可直接排序；标签按字符串排序也与时间顺序一致：
+  hour  本地时间自 1970-01-01 起的小时数      标签 "YYYY-MM-DD HH:00"
+  day   本地日期自 1970-01-01 起的天数        标签 "YYYY-MM-DD"
+  week  以周一为起点的周序号                  标签为该周周一 "YYYY-MM-DD"
+  month 年 * 12 + 月 - 1                      标签 "YYYY-MM"
+"""
+import time
+from array import array
+from datetime import date, datetime, timezone
+
+NO_TIME = -(2 ** 63)
+UNITS = ("hour", "day", "week", "month")
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_SLOT = 900  # UTC 偏移缓存的时间片（秒）
+
+
+def zone(name=None):
+    """按 IANA 名称（如 "Asia/Shanghai"、"UTC"）取时区；name 为空时返回 None，表示本机时区
+
+    名称无效时抛出 ValueError。
+    """
+    if not name:
+        return None
+    if name.upper() == "UTC":
+        return timezone.utc
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(name)
+    except (ImportError, ValueError, OSError, KeyError) as e:
+        # ZoneInfoNotFoundError 是 KeyError 的子类；Windows 上需要安装 tzdata 才有时区数据库
+        raise ValueError(f"未知时区: {name}") from e
+
+
+def zone_name(tz):
+    """时区的显示名称"""
+    if tz is None:
+        return time.strftime("%Z") or "本地时间"
+    return str(tz)
+
+
+# ── 解析 ─────────────────────────────────────────────────
+
+
+def parse_iso(values):
+    """ISO 8601 时间戳字符串序列 → epoch 秒列
+
+    "YYYY-MM-DDTHH:MM:SS[.fff]Z" 按固定位置切片解析，精确到分钟的前缀按分钟缓存
+    （同一会话的消息时间密集，命中率高），每条只需再解析秒数；
+    其它格式（带偏移量等）退回 datetime.fromisoformat，不带时区的按 UTC 处理。
+    """
+    minutes = {}
+    out = array("q")
+    append = out.append
+    for ts in values:
+        if not ts:
+            append(NO_TIME)
+            continue
+        try:
+            if len(ts) >= 20 and ts[-1] == "Z" and ts[10] == "T":
+                m = minutes.get(ts[:16])
+                if m is None:
+                    day = date.fromisoformat(ts[:10]).toordinal() - _EPOCH_ORDINAL
+                    m = minutes[ts[:16]] = day * 86400 + int(ts[11:13]) * 3600 + int(ts[14:16]) * 60
+                append(m + int(ts[17:19]))
+            else:
+                dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+                if dt.tzinfo is None:
+                    dt = dt.replace(tzinfo=timezone.utc)
+                append(int(dt.timestamp()))
+        except (ValueError, TypeError):
+            append(NO_TIME)
+    return out
+
+
+def parse_ms(values):
+    """毫秒时间戳序列 → epoch 秒列"""
+    return array("q", (v // 1000 if v else NO_TIME for v in values))
+
+
+def epochs(records, key="timestamp"):
+    """从记录中取出时间列：key 为 "timestamp_ms" 时按毫秒整数解析，否则按 ISO 字符串解析"""
+    if key == "timestamp_ms":
+        return parse_ms(r.get(key) for r in records)
+    return parse_iso(r.get(key) for r in records)
+
+
+# ── 分桶 ─────────────────────────────────────────────────
+
+
+class Bucketer:
+    """按一个时区分桶；UTC 偏移与日期换算的缓存随对象复用"""
+
+    def __init__(self, tz=None):
+        self.tz = tz
+        self._offsets = {}
+        self._dates = {}
+
+    def __repr__(self):
+        return f"Bucketer({zone_name(self.tz)!r})"
+
+    def _offset(self, slot):
+        t = slot * _SLOT
+        if self.tz is None:
+            off = time.localtime(t).tm_gmtoff
+        else:
+            off = int(datetime.fromtimestamp(t, self.tz).utcoffset().total_seconds())
+        self._offsets[slot] = off
+        return off
+
+    def local(self, column):
+        """epoch 秒列 → 本地时间秒数（自 1970-01-01 00:00 本地时间起）列表，缺失为 None"""
+        offsets = self._offsets
+        get, miss = offsets.get, self._offset
+        out = []
+        append = out.append
+        for t in column:
+            if t == NO_TIME:
+                append(None)
+                continue
+            slot = t // _SLOT
+            off = get(slot)
+            if off is None:
+                off = miss(slot)
+            append(t + off)
+        return out
+
+    def hours_of_day(self, column):
+        """每条记录的本地小时（0–23），缺失为 None"""
+        return [None if s is None else s // 3600 % 24 for s in self.local(column)]
+
+    def buckets(self, column, unit="day"):
+        """每条记录所在桶的整数键（见模块说明），缺失为 None"""
+        local = self.local(column)
+        if unit == "hour":
+            return [None if s is None else s // 3600 for s in local]
+        days = [None if s is None else s // 86400 for s in local]
+        if unit == "day":
+            return days
+        if unit == "week":
+            # 1970-01-01 是周四，第 0 周从 1969-12-29（周一）开始
+            return [None if d is None else (d + 3) // 7 for d in days]
+        if unit == "month":
+            months = {}
+            out = []
+            for d in days:
+                if d is None:
+                    out.append(None)
+                    continue
+                m = months.get(d)
+                if m is None:
+                    dt = self._date(d)
+                    m = months[d] = dt.year * 12 + dt.month - 1
+                out.append(m)
+            return out
+        raise ValueError(f"未知的分桶单位: {unit}")
+
+    def _date(self, day):
+        dt = self._dates.get(day)
+        if dt is None:
+            dt = self._dates[day] = date.fromordinal(day + _EPOCH_ORDINAL)
+        return dt
+
+    def key(self, when, unit="day"):
+        """datetime（不带时区时视为本时区）或 epoch 秒所在桶的键，用于按时间范围补齐空桶"""
+        if isinstance(when, datetime):
+            if when.tzinfo is None:
+                when = when.replace(tzinfo=self.tz) if self.tz else when.astimezone()
+            when = int(when.timestamp())
+        return self.buckets(array("q", [when]), unit)[0]
+
+    def label(self, key, unit="day"):
+        """桶键的显示标签"""
+        if key is None:
+            return "unknown"
+        if unit == "hour":
+            return f"{self._date(key // 24).isoformat()} {key % 24:02d}:00"
+        if unit == "day":
+            return self._date(key).isoformat()
+        if unit == "week":
+            return self._date(key * 7 - 3).isoformat()
+        if unit == "month":
+            return f"{key // 12:04d}-{key % 12 + 1:02d}"
+        raise ValueError(f"未知的分桶单位: {unit}")
+
+    def labels(self, column, unit="day"):
+        """每条记录所在桶的标签；同一个桶的标签只格式化一次"""
+        cache = {}
+        out = []
+        for k in self.buckets(column, unit):
+            s = cache.get(k)
+            if s is None:
+                s = cache[k] = self.label(k, unit)
+            out.append(s)
+        return out
+
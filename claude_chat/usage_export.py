@@ -0,0 +1,161 @@
+"""Token 用量与活动记录导出为 CSV / SQLite，供成本看板等外部工具使用
+
+记录由 db.iter_* 逐条产出，按 BATCH_SIZE 条一批写出（SQLite 用 executemany），
+内存占用与批大小成正比，不需要先把全部记录收集到内存。
+Claude 与 Codex 的记录写入同一张表，用 source 列区分，token 字段统一为 TABLES 中的列：
+Codex 的 cached_input_tokens 记为 cache_read_input_tokens，Claude 没有 reasoning_output_tokens（记为 0）。
+时间戳均为 UTC ISO 8601 字符串。
+
+增量导出（append=True）：从目标文件中读出每个 (来源, 数据根) 已导出的最大时间戳作为水位，
+只追加时间戳晚于水位的记录，并以水位为 since 让 db 借助 mtime / zone map 跳过旧文件。
+时间戳早于水位、但在上次导出之后才出现的记录（例如晚同步过来的旧会话）不会被追加，需要全量重新导出。
+"""
+import csv
+import sqlite3
+from datetime import datetime, timezone
+from itertools import islice
+
+from . import db
+from .config import ROOTS
+
+BATCH_SIZE = 1000
+
+TABLES = {
+    "token_usage": ("source", "root", "session_id", "project", "model", "timestamp",
+                    "input_tokens", "output_tokens", "cache_creation_input_tokens",
+                    "cache_read_input_tokens", "reasoning_output_tokens"),
+    "activity": ("source", "root", "session_id", "project", "timestamp"),
+}
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+
+def _claude_tokens(r):
+    return ("claude", r["root"], r["session_id"], r["project"], r["model"], r["timestamp"],
+            r["input_tokens"], r["output_tokens"], r["cache_creation_input_tokens"],
+            r["cache_read_input_tokens"], 0)
+
+
+def _codex_tokens(r):
+    return ("codex", r["root"], r["session_id"], r["project"], r["model"], r["timestamp"],
+            r["input_tokens"], r["output_tokens"], 0,
+            r["cached_input_tokens"], r["reasoning_output_tokens"])
+
+
+def _claude_activity(r):
+    ts = datetime.fromtimestamp(r["timestamp_ms"] / 1000, timezone.utc)
+    return ("claude", r["root"], r["session_id"], r["project"],
+            ts.isoformat(timespec="milliseconds").replace("+00:00", "Z"))
+
+
+def _codex_activity(r):
+    return ("codex", r["root"], r["session_id"], "", r["timestamp"])
+
+
+# 表 → [(来源, 逐条产出记录的函数, 记录 → 行)]
+_SOURCES = {
+    "token_usage": [("claude", db.iter_token_stats, _claude_tokens),
+                    ("codex", db.iter_codex_token_stats, _codex_tokens)],
+    "activity": [("claude", db.iter_session_activity, _claude_activity),
+                 ("codex", db.iter_codex_activity, _codex_activity)],
+}
+
+
+def _iter_rows(table, since, until, watermarks):
+    """产出表的所有行；watermarks 为 {(来源, 数据根名): 已导出的最大时间戳}"""
+    ts_col = TABLES[table].index("timestamp")
+    for source, iter_records, to_row in _SOURCES[table]:
+        for root in ROOTS:
+            mark = watermarks.get((source, root.name))
+            start = since
+            if mark:
+                mark_dt = datetime.fromisoformat(mark.replace("Z", "+00:00"))
+                start = mark_dt if since is None else max(since.astimezone(), mark_dt)
+            rows = map(to_row, iter_records(start, until, root=root.name))
+            if mark:
+                rows = (row for row in rows if row[ts_col] > mark)
+            yield from rows
+
+
+def _batches(rows):
+    while batch := list(islice(rows, BATCH_SIZE)):
+        yield batch
+
+
+# ── SQLite ───────────────────────────────────────────────
+
+
+def _sqlite_schema(conn, table):
+    columns = ", ".join(f"{c} {'INTEGER' if c.endswith('_tokens') else 'TEXT'}" for c in TABLES[table])
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_watermark ON {table} (source, root, timestamp)")
+
+
+def export_sqlite(path, tables=tuple(TABLES), since=None, until=None, append=False):
+    """导出到 SQLite 文件（表不存在时创建），返回 {表: 写入行数}
+
+    整个导出在一个事务中完成，中途失败时文件保持导出前的状态。append=False 时先清空表再全量写入。
+    """
+    counts = {}
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            for table in tables:
+                _sqlite_schema(conn, table)
+                if append:
+                    watermarks = {(s, r): ts for s, r, ts in conn.execute(
+                        f"SELECT source, root, MAX(timestamp) FROM {table} GROUP BY source, root")}
+                else:
+                    conn.execute(f"DELETE FROM {table}")
+                    watermarks = {}
+                sql = f"INSERT INTO {table} VALUES ({', '.join('?' * len(TABLES[table]))})"
+                n = 0
+                for batch in _batches(_iter_rows(table, since, until, watermarks)):
+                    conn.executemany(sql, batch)
+                    n += len(batch)
+                counts[table] = n
+    finally:
+        conn.close()
+    return counts
+
+
+# ── CSV ──────────────────────────────────────────────────
+
+
+def _csv_watermarks(path, table):
+    """逐行读取已有 CSV，返回 {(来源, 数据根名): 最大时间戳}；表头与 table 不一致时抛出 ValueError"""
+    columns = TABLES[table]
+    marks = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return marks
+        if tuple(header) != columns:
+            raise ValueError(f"{path} 的表头与 {table} 不一致，无法追加")
+        src, root, ts = columns.index("source"), columns.index("root"), columns.index("timestamp")
+        for row in reader:
+            key = (row[src], row[root])
+            if row[ts] > marks.get(key, ""):
+                marks[key] = row[ts]
+    return marks
+
+
+def export_csv(path, table="token_usage", since=None, until=None, append=False):
+    """导出一张表到 CSV 文件（UTF-8，带表头），返回写入行数
+
+    append=True 且文件已存在时只追加新记录；每批写出后刷新，下游可以边写边读。
+    """
+    watermarks = {}
+    exists = append and path.exists() and path.stat().st_size > 0
+    if exists:
+        watermarks = _csv_watermarks(path, table)
+    n = 0
+    with open(path, "a" if exists else "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if not exists:
+            writer.writerow(TABLES[table])
+        for batch in _batches(_iter_rows(table, since, until, watermarks)):
+            writer.writerows(batch)
+            f.flush()
+            n += len(batch)
+    return n
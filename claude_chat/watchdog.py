@@ -0,0 +1,93 @@
+"""Tk 主线程卡顿监测
+
+主线程通过 after() 定时发送心跳，后台线程检查心跳间隔；
+一旦超过阈值，立即抓取主线程当前调用栈并连同最近一次用户操作写入日志，
+卡顿结束时再补记总时长。用 @tracked 标记事件处理函数以记录“触发操作”。
+"""
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from functools import wraps
+from logging.handlers import RotatingFileHandler
+
+from claude_chat.config import STALL_LOG_FILE, STALL_THRESHOLD_MS
+
+log = logging.getLogger(__name__)
+
+_action = None  # (操作名, 开始时间)
+
+
+def tracked(fn):
+    """装饰器：记录当前正在执行的 UI 操作，卡顿日志据此标注触发来源"""
+    name = fn.__qualname__
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        global _action
+        _action = (name, time.monotonic())
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+class StallWatchdog:
+    def __init__(self, root, interval_ms=100, threshold_ms=STALL_THRESHOLD_MS):
+        self._root = root
+        self._interval = interval_ms / 1000
+        self._threshold = threshold_ms / 1000
+        self._main_ident = None
+        self._last_beat = time.monotonic()
+        self._current = None  # 进行中的卡顿记录
+        self._stop = threading.Event()
+        self.stalls = deque(maxlen=100)  # 最近的卡顿记录，供界面查看
+
+        if not log.handlers:
+            try:
+                handler = RotatingFileHandler(STALL_LOG_FILE, maxBytes=1 << 20, backupCount=2,
+                                              encoding="utf-8")
+            except OSError:
+                handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+            log.addHandler(handler)
+            log.setLevel(logging.INFO)
+
+    def start(self):
+        """须在 Tk 主线程调用"""
+        self._main_ident = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._root.after(int(self._interval * 1000), self._beat)
+        threading.Thread(target=self._watch, name="stall-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _beat(self):
+        now = time.monotonic()
+        stall = self._current
+        if stall is not None:
+            # 卡顿已结束，补记总时长
+            stall["duration_ms"] = round((now - self._last_beat - self._interval) * 1000)
+            log.warning("主线程卡顿结束: %d ms（操作: %s）", stall["duration_ms"], stall["action"] or "未知")
+            self._current = None
+        self._last_beat = now
+        if not self._stop.is_set():
+            self._root.after(int(self._interval * 1000), self._beat)
+
+    def _watch(self):
+        while not self._stop.wait(self._interval / 2):
+            lag = time.monotonic() - self._last_beat - self._interval
+            if lag < self._threshold or self._current is not None:
+                continue
+            frame = sys._current_frames().get(self._main_ident)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            action = None
+            if _action is not None:
+                name, started = _action
+                action = f"{name}（{(time.monotonic() - started) * 1000:.0f} ms 前触发）"
+            stall = {"time": time.time(), "lag_ms": round(lag * 1000), "duration_ms": None,
+                     "action": action, "stack": stack}
+            self._current = stall
+            self.stalls.append(stall)
+            log.warning("主线程卡顿 %d ms（操作: %s）\n%s", stall["lag_ms"], action or "未知", stack)
@@ -0,0 +1,264 @@
+"""敏感词监控：所有监控词编译成一个 Aho-Corasick 自动机，一次扫描统计全部词的命中
+
+扫描对象是 Claude Code 与 Codex 的会话文件原始行（包含工具调用与结果），不区分大小写。
+每个文件记录已扫描到的字节偏移，再次扫描时只读取新追加的完整行；
+文件被截断或改写时从头重扫。监控词变化时全部重扫。
+归档（压缩）的会话内容不会再变：只在首次遇到时解压扫描一次，之后按压缩文件大小识别，不再解压。
+"""
+import json
+import os
+import re
+import zlib
+from collections import deque
+
+from . import archive, perf
+from .config import ROOTS, WATCHLIST_FILE, WATCHLIST_STATE_FILE
+
+_HEAD_BYTES = 1024  # 用文件开头的校验和识别"同名文件被改写"
+
+
+class Automaton:
+    """Aho-Corasick 多模式匹配；terms 需已小写"""
+
+    def __init__(self, terms):
+        self.terms = list(terms)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for i, term in enumerate(self.terms):
+            state = 0
+            for ch in term:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = nxt
+            self._out[state] += (i,)
+        # BFS 计算失败指针，并把失败链上的输出合并进来
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] += self._out[self._fail[nxt]]
+        # 自动机处于根状态时没有进行中的部分匹配，可以用正则（C 实现）直接跳到下一个完整命中的起点，
+        # 只在命中附近逐字符推进自动机
+        self._start_re = re.compile("|".join(re.escape(t) for t in self.terms if t)) if any(self.terms) else None
+
+    def iter_matches(self, text):
+        """产出 (结束位置, 词下标)，包含重叠匹配"""
+        if self._start_re is None:
+            return
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        i, n = 0, len(text)
+        while i < n:
+            if state == 0:
+                m = self._start_re.search(text, i)
+                if m is None:
+                    return
+                i = m.start()
+            ch = text[i]
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for idx in out[state]:
+                yield i + 1, idx
+            i += 1
+
+    def count(self, text, counts):
+        """把 text 中各词的出现次数累加到 counts（列表，与 terms 对齐）"""
+        for _, idx in self.iter_matches(text):
+            counts[idx] += 1
+
+
+def normalize_terms(terms):
+    """去空白、转小写、去重，保持原有顺序"""
+    seen = []
+    for t in terms:
+        t = t.strip().lower()
+        if t and t not in seen:
+            seen.append(t)
+    return seen
+
+
+def load_terms():
+    try:
+        with open(WATCHLIST_FILE, encoding="utf-8") as f:
+            terms = json.load(f).get("terms", [])
+    except (OSError, ValueError, AttributeError):
+        return []
+    return normalize_terms(t for t in terms if isinstance(t, str))
+
+
+def save_terms(terms):
+    terms = normalize_terms(terms)
+    tmp = WATCHLIST_FILE.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"terms": terms}, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, WATCHLIST_FILE)
+    return terms
+
+
+# ── 扫描 ─────────────────────────────────────────────────
+
+_state = None  # {"terms": [...], "files": {路径: {"offset", "head", "counts"}}}
+
+
+def _load_state():
+    global _state
+    if _state is None:
+        try:
+            with open(WATCHLIST_STATE_FILE, encoding="utf-8") as f:
+                _state = json.load(f)
+        except (OSError, ValueError):
+            _state = {}
+        if not isinstance(_state.get("files"), dict):
+            _state = {"terms": [], "files": {}}
+    return _state
+
+
+def _save_state():
+    tmp = WATCHLIST_STATE_FILE.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(_state, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, WATCHLIST_STATE_FILE)
+
+
+def _iter_session_files():
+    """产出 (数据根名, 来源, 项目或日期目录, 文件路径)"""
+    for root in ROOTS:
+        if root.projects_dir.exists():
+            for proj_dir in root.projects_dir.iterdir():
+                if proj_dir.is_dir():
+                    for f in proj_dir.iterdir():
+                        if archive.is_session_file(f.name):
+                            yield root.name, "claude", proj_dir.name, f
+        sessions_dir = root.codex_sessions_dir
+        if sessions_dir.exists():
+            for f in sessions_dir.rglob("*.jsonl*"):
+                if archive.is_session_file(f.name):
+                    yield root.name, "codex", f.parent.relative_to(sessions_dir).as_posix(), f
+
+
+def _head_crc(fh, size):
+    fh.seek(0)
+    return zlib.crc32(fh.read(min(size, _HEAD_BYTES)))
+
+
+def _scan_archive(automaton, path, entry):
+    """归档文件整体扫描一次；条目记录压缩后的大小（"archived"），大小不变时不再读取"""
+    size = os.stat(path).st_size
+    if entry and entry.get("archived") == size:
+        return entry, 0
+    counts = [0] * len(automaton.terms)
+    read = 0
+    with archive.open_session(path) as fh:
+        for raw in fh:
+            read += len(raw)
+            _count_line(automaton, raw, counts)
+    if perf.enabled:
+        perf.count("files")
+        perf.count("bytes", size)
+    return {"offset": read, "head": None, "counts": counts, "archived": size}, read
+
+
+def _count_line(automaton, raw, counts):
+    line = raw.decode("utf-8", "replace")
+    if "\\u" in line:
+        # 非 ASCII 字符被 JSON 转义时先还原，避免漏掉中文等监控词
+        try:
+            line = json.dumps(json.loads(line), ensure_ascii=False)
+        except ValueError:
+            pass
+    automaton.count(line.lower(), counts)
+
+
+def _scan_file(automaton, path, entry):
+    """从 entry 记录的偏移继续扫描，返回 (新条目, 本次读取的字节数)；没有新内容时原样返回 entry"""
+    if archive.is_archived(path):
+        return _scan_archive(automaton, path, entry)
+    with open(path, "rb") as fh:
+        size = os.fstat(fh.fileno()).st_size
+        start = 0
+        if entry:
+            if size >= entry["offset"] and _head_crc(fh, entry["offset"]) == entry["head"]:
+                if size == entry["offset"]:
+                    return entry, 0
+                start = entry["offset"]
+            # 否则文件被截断或改写，从头重扫
+        counts = list(entry["counts"]) if start else [0] * len(automaton.terms)
+        offset = start
+        fh.seek(start)
+        lines = 0
+        for raw in fh:
+            if not raw.endswith(b"\n"):
+                break  # 末尾尚未写完的行留到下次
+            offset += len(raw)
+            lines += 1
+            _count_line(automaton, raw, counts)
+        if perf.enabled:
+            perf.count("files")
+            perf.count("lines", lines)
+            perf.count("bytes", offset - start)
+        if offset == start and (start or not entry):
+            return entry, 0  # 没有读到完整的新行
+        return {"offset": offset, "head": _head_crc(fh, offset), "counts": counts}, offset - start
+
+
+@perf.timed()
+def scan(terms=None):
+    """扫描全部会话文件（增量），返回每个词的命中次数与涉及的会话
+
+    返回 {"terms": [{"term", "hits", "sessions": [{"root", "source", "project", "session_id", "path", "hits"}]}],
+    "scanned_bytes": 本次实际读取的字节数}，sessions 按命中次数降序。
+    """
+    terms = normalize_terms(terms if terms is not None else load_terms())
+    state = _load_state()
+    if state.get("terms") != terms:
+        state["terms"] = terms
+        state["files"] = {}
+    files = state["files"]
+    result = [{"term": t, "hits": 0, "sessions": []} for t in terms]
+    if not terms:
+        return {"terms": result, "scanned_bytes": 0}
+
+    automaton = Automaton(terms)
+    seen = set()
+    scanned = 0
+    dirty = False
+    for root, source, project, path in _iter_session_files():
+        key = str(path)
+        seen.add(key)
+        old = files.get(key)
+        try:
+            entry, read = _scan_file(automaton, path, old)
+        except OSError:
+            continue
+        if entry is not old:
+            files[key] = entry
+            scanned += read
+            dirty = True
+        if not entry:
+            continue
+        for r, n in zip(result, entry["counts"]):
+            if n:
+                r["hits"] += n
+                r["sessions"].append({"root": root, "source": source, "project": project,
+                                      "session_id": archive.session_id(path), "path": key, "hits": n})
+    for key in set(files) - seen:
+        del files[key]
+        dirty = True
+    if dirty:
+        _save_state()
+    for r in result:
+        r["sessions"].sort(key=lambda s: s["hits"], reverse=True)
+    return {"terms": result, "scanned_bytes": scanned}
@@ -0,0 +1,109 @@
+import customtkinter as ctk
+from claude_chat import tasks, watchlist
+from claude_chat.config import MULTI_ROOT
+
+RESCAN_MS = 15000   # 窗口打开期间定时增量扫描新追加的内容
+MAX_SESSIONS = 10   # 每个词最多列出的会话数
+
+
+class WatchlistWindow(ctk.CTkToplevel):
+    """敏感词监控：编辑监控词，显示每个词的命中次数和涉及的会话"""
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.title("监控词")
+        self.geometry("820x560")
+        self.transient(master)
+        self.grid_columnconfigure(1, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+
+        left = ctk.CTkFrame(self, fg_color="transparent")
+        left.grid(row=0, column=0, sticky="ns", padx=(10, 4), pady=10)
+        ctk.CTkLabel(left, text="每行一个词（不区分大小写）", font=ctk.CTkFont(size=11)).pack(anchor="w")
+        self._terms_box = ctk.CTkTextbox(left, width=220, font=ctk.CTkFont(size=12))
+        self._terms_box.pack(fill="y", expand=True, pady=4)
+        self._terms_box.insert("1.0", "\n".join(watchlist.load_terms()))
+        ctk.CTkButton(left, text="保存并扫描", command=self._on_save).pack(fill="x")
+
+        self._results = ctk.CTkScrollableFrame(self)
+        self._results.grid(row=0, column=1, sticky="nsew", padx=(4, 10), pady=10)
+
+        self._status_label = ctk.CTkLabel(self, text="", anchor="w", font=ctk.CTkFont(size=11))
+        self._status_label.grid(row=1, column=0, columnspan=2, sticky="ew", padx=10, pady=(0, 6))
+
+        self._scanning = False
+        self._last_result = None
+        self._scan()
+
+    def _on_save(self):
+        terms = watchlist.save_terms(self._terms_box.get("1.0", "end").splitlines())
+        self._terms_box.delete("1.0", "end")
+        self._terms_box.insert("1.0", "\n".join(terms))
+        self._scan()
+
+    def _scan(self):
+        if self._scanning:
+            return
+        self._scanning = True
+        self._status_label.configure(text="扫描中...")
+        # key 按窗口区分：同一个 key 的新任务会取消旧任务，共用 key 时另一个窗口的扫描不再回调，
+        # 其 _scanning 一直为 True，定时重扫也随之停止
+        self.master.tasks.submit(watchlist.scan, priority=tasks.INDEXING, key=("watchlist", id(self)),
+                                 on_done=self._show, on_error=self._on_scan_error)
+
+    def _on_scan_error(self, error):
+        self._scanning = False
+        if self.winfo_exists():
+            self._status_label.configure(text=f"扫描失败: {error}")
+            self._schedule()
+
+    def _schedule(self):
+        self.after(RESCAN_MS, lambda: self.winfo_exists() and self._scan())
+
+    def _show(self, result):
+        self._scanning = False
+        if not self.winfo_exists():
+            return
+        terms = result["terms"]
+        total = sum(t["hits"] for t in terms)
+        self._status_label.configure(
+            text=f"{len(terms)} 个监控词，共命中 {total} 次（本次读取 {result['scanned_bytes'] / 1e6:.1f} MB）")
+        # 只有结果变化时才重建列表
+        if terms != self._last_result:
+            self._last_result = terms
+            self._render(terms)
+        self._schedule()
+
+    def _render(self, terms):
+        for w in self._results.winfo_children():
+            w.destroy()
+        if not terms:
+            ctk.CTkLabel(self._results, text="尚未设置监控词", text_color="gray60").pack(pady=20)
+            return
+        for t in terms:
+            color = ("red3", "tomato") if t["hits"] else ("gray40", "gray60")
+            ctk.CTkLabel(
+                self._results, anchor="w", text_color=color,
+                text=f"{t['term']}    {t['hits']} 次 / {len(t['sessions'])} 个会话",
+                font=ctk.CTkFont(size=12, weight="bold"),
+            ).pack(fill="x", padx=4, pady=(8, 2))
+            for s in t["sessions"][:MAX_SESSIONS]:
+                root = f"{s['root']}/" if MULTI_ROOT else ""
+                label = f"{s['hits']:>5}  [{root}{s['source']}] {s['session_id'][:8]}  {s['project']}"
+                ctk.CTkButton(
+                    self._results, text=label, anchor="w", height=22,
+                    fg_color="transparent", hover_color=("gray75", "gray30"),
+                    font=ctk.CTkFont(size=11),
+                    command=lambda s=s: self._open(s),
+                ).pack(fill="x", padx=(16, 4))
+            if len(t["sessions"]) > MAX_SESSIONS:
+                ctk.CTkLabel(self._results, text=f"... 另有 {len(t['sessions']) - MAX_SESSIONS} 个会话",
+                             anchor="w", text_color="gray60",
+                             font=ctk.CTkFont(size=11)).pack(fill="x", padx=(16, 4))
+
+    def _open(self, s):
+        """在主窗口中打开命中的会话"""
+        if s["source"] == "claude":
+            self.master._load_detail(s["session_id"])
+        else:
+            self.master._load_codex_detail(s["path"])
@@ -1,4 +1,8 @@
+import multiprocessing
+
 from claude_chat.gui import App
 
 if __name__ == "__main__":
+    # 多数据根时统计在子进程中并行扫描，打包后的可执行文件需要先处理子进程入口
+    multiprocessing.freeze_support()
     App().mainloop()
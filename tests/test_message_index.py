@@ -0,0 +1,47 @@
+"""消息偏移表（db.message_index）对文件末尾的处理
+
+    python -m unittest discover tests
+"""
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from claude_chat import db
+
+
+def _line(role, text):
+    return json.dumps({"type": role, "message": {"role": role, "content": text},
+                       "timestamp": "2026-09-01T00:00:00.000Z"})
+
+
+class TrailingNewlineTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmp.name) / "s1.jsonl"
+        db.clear_caches()
+
+    def tearDown(self):
+        db.clear_caches()
+        self._tmp.cleanup()
+
+    def test_last_line_without_newline_is_indexed(self):
+        self.path.write_text(_line("user", "hello") + "\n" + _line("assistant", "world"), encoding="utf-8")
+        index = db.message_index(self.path)
+        self.assertEqual(len(index), len(db._parse_session_file(self.path)["messages"]))
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.read(1).content, "world")
+
+    def test_partial_last_line_is_resumed_after_append(self):
+        full = _line("assistant", "world")
+        self.path.write_text(_line("user", "hello") + "\n" + full[:10], encoding="utf-8")
+        self.assertEqual(len(db.message_index(self.path)), 1)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(full[10:] + "\n")
+        index = db.message_index(self.path)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.read(1).content, "world")
+
+
+if __name__ == "__main__":
+    unittest.main()